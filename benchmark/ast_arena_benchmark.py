@@ -0,0 +1,114 @@
+"""
+Compares the dataclass AST (parser/ast_node.py) with the flat arena
+(parser/ast_arena.py) on a generated multi-MB Numera program.
+
+    python3 -m benchmark.ast_arena_benchmark [--mb N]
+
+Reports the memory retained by each AST after parsing, the time to parse
+into it, the time to visit every node and the time to count one node kind.
+"""
+import contextlib
+import io
+import sys
+import time
+import tracemalloc
+
+from tokenizer.scanner import Lexer
+from parser.parser import Parser
+from parser.ast_node import Node, BinaryOperation
+from parser.ast_arena import ArenaBuilder, BINARY
+
+BLOCK = """    var v{n} = {n};
+    while v{n} < {n} + 10 do
+        if v{n} > ({n} * 3 - 2) / 4 then
+            v{n} = v{n} + (v{n} * 3 - 2) / 1;
+        else
+            v{n} = v{n} + 1;
+        end
+        print(v{n});
+    end
+"""
+
+
+def make_source(megabytes):
+    blocks = []
+    size = 0
+    n = 0
+    while size < megabytes * 1024 * 1024:
+        block = BLOCK.format(n=n)
+        blocks.append(block)
+        size += len(block)
+        n += 1
+    return "procedure main is\nbegin\n" + "".join(blocks) + "end\n"
+
+
+def walk_tree(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        for name in reversed(node.__node_fields__):
+            value = getattr(node, name)
+            if isinstance(value, Node):
+                stack.append(value)
+            elif isinstance(value, list):
+                stack.extend(reversed(value))
+
+
+def count_tree(root, cls):
+    return sum(1 for node in walk_tree(root) if isinstance(node, cls))
+
+
+def measure(build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = build()
+    elapsed = time.perf_counter() - started
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained
+
+
+def main():
+    megabytes = 4
+    if len(sys.argv) == 3 and sys.argv[1] == "--mb":
+        megabytes = float(sys.argv[2])
+
+    source = make_source(megabytes)
+    with contextlib.redirect_stdout(io.StringIO()):
+        tokens = Lexer().scan(source)
+    print(f"source: {len(source) / 1024 / 1024:.1f} MB, {len(tokens)} tokens")
+
+    tree, tree_parse, tree_bytes = measure(lambda: Parser(tokens).parse())
+    builder = ArenaBuilder()
+    _, arena_parse, arena_bytes = measure(lambda: Parser(tokens, nodes=builder).parse())
+    arena = builder.arena
+
+    # walk: visit every node in pre-order; scan: count the binary operations
+    started = time.perf_counter()
+    tree_nodes = sum(1 for _ in walk_tree(tree))
+    tree_walk = time.perf_counter() - started
+    started = time.perf_counter()
+    arena_nodes = sum(1 for _ in arena.walk())
+    arena_walk = time.perf_counter() - started
+    assert tree_nodes == arena_nodes == len(arena)
+
+    started = time.perf_counter()
+    tree_binops = count_tree(tree, BinaryOperation)
+    tree_scan = time.perf_counter() - started
+    started = time.perf_counter()
+    arena_binops = arena.kind.count(BINARY)
+    arena_scan = time.perf_counter() - started
+    assert tree_binops == arena_binops
+
+    print(f"nodes: {tree_nodes}")
+    print(f"{'':>12} {'memory':>12} {'bytes/node':>11} {'parse':>9} {'walk':>9} {'scan':>9}")
+    for name, size, parse, walk, scan in (("dataclasses", tree_bytes, tree_parse, tree_walk, tree_scan),
+                                          ("arena", arena_bytes, arena_parse, arena_walk, arena_scan)):
+        print(f"{name:>12} {size / 1024 / 1024:>9.1f} MB {size / tree_nodes:>11.1f} "
+              f"{parse:>7.2f} s {walk:>7.3f} s {scan:>7.4f} s")
+
+
+if __name__ == "__main__":
+    main()
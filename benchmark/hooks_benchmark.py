@@ -0,0 +1,121 @@
+"""
+Measures what event hooks (executer/hooks.py) cost.
+
+    python3 -m benchmark.hooks_benchmark [--runs N]
+
+Runs one loop-heavy program, best of N runs taken in turns, with hot loop compilation off so that
+every instruction goes through the dispatch loop:
+
+- never hooked: run() as every normal run uses it;
+- hooks removed: after a hook and a breakpoint were added and removed again,
+  which must cost nothing either;
+- breakpoint: one breakpoint on a line that never runs, so every instruction
+  goes through the instrumented loop with no callback;
+- instruction hook, all hooks: a callback that does nothing on every
+  instruction, and on every event.
+
+Outputs are checked to be the same.
+"""
+import contextlib
+import io
+import sys
+import time
+
+from tokenizer.scanner import Lexer
+from parser.parser import Parser
+from generator.generator import CodeGenerator
+from executer.executer import Execute
+from executer.hooks import EVENTS
+
+RUNS = 5
+
+PROGRAM = """procedure main is
+    var i = 0;
+    var j = 0;
+    var s = 0;
+    var n[10];
+begin
+    while i < 100000 do
+        if i < 50000 then
+            s = s + i * 2;
+        else
+            s = s - i;
+        end
+        n[j] = s;
+        j = j + 1;
+        if j == 10 then
+            j = 0;
+        end
+        i = i + 1;
+    end
+    print(s);
+    print(n[9]);
+end
+"""
+
+
+def nothing(*args):
+    pass
+
+def never_hooked(executer):
+    pass
+
+def hooks_removed(executer):
+    executer.add_hook("instruction", nothing)
+    executer.add_breakpoint(line=1)
+    executer.remove_hook("instruction", nothing)
+    executer.remove_breakpoint(line=1)
+
+def breakpoint_only(executer):
+    executer.add_breakpoint(line=1)
+
+def instruction_hook(executer):
+    executer.add_hook("instruction", nothing)
+
+def all_hooks(executer):
+    for event in EVENTS:
+        executer.add_hook(event, nothing)
+
+SETUPS = (("never hooked", never_hooked), ("hooks removed", hooks_removed), ("breakpoint", breakpoint_only),
+          ("instruction hook", instruction_hook), ("all hooks", all_hooks))
+
+
+def compile_program():
+    with contextlib.redirect_stdout(io.StringIO()):
+        tree = Parser(Lexer().scan(PROGRAM)).parse()
+        generator = CodeGenerator(verbose=False)
+        generator.generate(tree)
+    return generator.get_code(), generator.source_map()
+
+def measure(code, source_map, setup):
+    # (output, seconds)
+    executer = Execute(code, source_map=source_map, jit_threshold=None)
+    setup(executer)
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        executer.run()
+    return output.getvalue(), time.perf_counter() - started
+
+
+def main():
+    runs = RUNS
+    if len(sys.argv) == 3 and sys.argv[1] == "--runs":
+        runs = int(sys.argv[2])
+    code, source_map = compile_program()
+    outputs, best = set(), {}
+    for _ in range(runs):
+        # in turns, so that a slower stretch of the machine does not fall on one setup only
+        for name, setup in SETUPS:
+            output, seconds = measure(code, source_map, setup)
+            outputs.add(output)
+            best[name] = min(best.get(name, seconds), seconds)
+    assert len(outputs) == 1, "outputs differ"
+    baseline = best["never hooked"]
+    print(f"{'hooks':<17} {'time':>10} {'vs never hooked':>16}")
+    for name, seconds in best.items():
+        print(f"{name:<17} {seconds * 1000:>7.1f} ms {seconds / baseline:>15.2f}x")
+
+
+if __name__ == "__main__":
+    main()
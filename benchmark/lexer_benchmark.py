@@ -0,0 +1,72 @@
+"""
+Measures how lexing a generated multi-MB Numera program scales with the number
+of worker processes (tokenizer/parallel.py).
+
+    python3 -m benchmark.lexer_benchmark [--mb N] [--workers 1,2,4]
+
+Workers default to the powers of two up to the CPU count. Every parallel scan
+is checked against the serial tokens; the table shows the time of each and
+its speedup over the serial scan.
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+from tokenizer.scanner import Lexer
+from tokenizer.parallel import scan_parallel
+from benchmark.ast_arena_benchmark import make_source
+
+
+def default_workers():
+    cpus = os.cpu_count() or 1
+    workers = [1]
+    while workers[-1] * 2 <= cpus:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != cpus:
+        workers.append(cpus)
+    return workers
+
+
+def parse_args(argv):
+    megabytes = 32
+    workers = default_workers()
+    args = iter(argv)
+    for arg in args:
+        if arg == "--mb":
+            megabytes = float(next(args))
+        elif arg == "--workers":
+            workers = [int(count) for count in next(args).split(",")]
+        else:
+            sys.exit(__doc__)
+    return megabytes, workers
+
+
+def fingerprint(tokens):
+    return [(token.type, token.value, token.line_num) for token in tokens]
+
+
+def main():
+    megabytes, workers = parse_args(sys.argv[1:])
+    source = make_source(megabytes)
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        tokens = Lexer(workers=1).scan(source)
+    serial = time.perf_counter() - started
+    expected = fingerprint(tokens)
+    print(f"source: {len(source) / 1024 / 1024:.1f} MB, {len(tokens)} tokens, {os.cpu_count()} CPUs")
+
+    print(f"{'workers':>8} {'time':>9} {'speedup':>8}")
+    print(f"{'serial':>8} {serial:>7.2f} s {1:>7.2f}x")
+    for count in workers:
+        started = time.perf_counter()
+        tokens = scan_parallel(source, count)
+        elapsed = time.perf_counter() - started
+        assert fingerprint(tokens) == expected, f"{count} workers produced different tokens"
+        print(f"{count:>8} {elapsed:>7.2f} s {serial / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Measures what separate compilation (pipeline/build.py, generator/linker.py)
+saves when a program split over many files is rebuilt after an edit.
+
+    python3 -m benchmark.link_benchmark [--units N]
+
+A project of N library units is written to a temporary directory. Unit i has
+PROCEDURES procedures and imports unit i - 1; the main program imports all of
+them. The table times compiling the same procedures as one file, a build with
+no saved objects, a rebuild with nothing changed, one after an edit to the body
+of a procedure and one after an edit that changes the interface of the first
+unit, which every other unit depends on. Outputs are checked against the
+single-file program.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from tokenizer.scanner import Lexer
+from parser.parser import Parser
+from generator.simplifier import Simplifier
+from generator.unroll import Unroller
+from generator.generator import CodeGenerator
+from generator.linker import link
+from pipeline.build import Build
+from executer.executer import Execute
+
+UNITS = 40
+PROCEDURES = 10
+
+PROCEDURE = """
+procedure p{unit}_{index}(n) is
+    var i = 0;
+    var s = {index};
+begin
+    while i < n do
+        if i < 3 then
+            s = s + i * {index};
+        else
+            s = s - {call};
+        end
+        i = i + 1;
+    end
+{effect}    return s;
+end
+"""
+
+
+def library(unit, effect=""):
+    procedures = []
+    for index in range(PROCEDURES):
+        # every procedure calls one of the unit it imports
+        call = f"p{unit - 1}_{index}(2)" if unit > 0 else "1"
+        procedures.append(PROCEDURE.format(unit=unit, index=index, call=call,
+                                           effect=effect if index == 0 else ""))
+    return "".join(procedures)
+
+def main_program(units):
+    calls = "".join(f"    total = total + p{unit}_{unit % PROCEDURES}(5);\n" for unit in range(units))
+    return f"procedure main is\n    var total = 0;\nbegin\n{calls}    print(total);\nend\n"
+
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+def compile_single(source):
+    simplifier = Simplifier()
+    tree = simplifier.simplify(Parser(Lexer().scan(source)).parse())
+    tree = Unroller(simplifier).unroll(tree)
+    generator = CodeGenerator(verbose=False)
+    generator.generate(tree)
+    return generator.get_code()
+
+def build(path):
+    with open(path) as f:
+        source = f.read()
+    parser = Parser(Lexer().scan(source))
+    program = parser.program()
+    builder = Build()
+    linked = link(builder.build(path, source, program, parser.imports))
+    return linked.code, len(builder.compiled)
+
+def run(code):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        Execute(code).run()
+    return output.getvalue()
+
+def timed(function, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    units = UNITS
+    if len(sys.argv) == 3 and sys.argv[1] == "--units":
+        units = int(sys.argv[2])
+    with tempfile.TemporaryDirectory() as directory:
+        for unit in range(units):
+            imports = f'import "unit{unit - 1}.num";\n' if unit > 0 else ""
+            write(os.path.join(directory, f"unit{unit}.num"), imports + library(unit))
+        imports = "".join(f'import "unit{unit}.num";\n' for unit in range(units))
+        path = os.path.join(directory, "main.num")
+        write(path, imports + main_program(units))
+
+        single = "".join(library(unit) for unit in range(units)) + main_program(units)
+        code, seconds = timed(compile_single, single)
+        expected = run(code)
+        print(f"{units} units of {PROCEDURES} procedures, {len(single.splitlines())} lines\n")
+        print(f"{'build':<34} {'compiled':>8} {'time':>10}")
+        print(f"{'one file':<34} {'-':>8} {seconds * 1000:>7.1f} ms")
+
+        def rebuild(label):
+            (code, compiled), seconds = timed(build, path)
+            assert run(code) == expected, f"{label}: wrong output"
+            print(f"{label:<34} {compiled:>8} {seconds * 1000:>7.1f} ms")
+
+        rebuild("no saved objects")
+        rebuild("nothing changed")
+        middle = units // 2
+        write(os.path.join(directory, f"unit{middle}.num"),
+              (f'import "unit{middle - 1}.num";\n' if middle > 0 else "")
+              + library(middle).replace(f"var s = 1;", "var s = 1 + 0;"))
+        rebuild(f"body of a procedure of unit{middle}")
+        # p0_0 now prints, so it and everything calling it is no longer pure
+        write(os.path.join(directory, "unit0.num"), library(0, effect="    print(s);\n"))
+        code, _ = timed(compile_single, "".join(library(unit, "    print(s);\n" if unit == 0 else "")
+                                                for unit in range(units)) + main_program(units))
+        expected = run(code)
+        rebuild("interface of unit0")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Measures what memoizing pure code regions (executer/memo.py) saves.
+
+    python3 -m benchmark.memo_benchmark [--runs N]
+
+Each program runs its pure branching arithmetic in a loop that calls an impure
+procedure, so the loop stays interpreted rather than compiled. The table shows
+the instructions executed and the best time of N runs without and with
+memoization, and the hits and misses of the memoized regions; outputs are
+checked to be the same. "repeating" reads a counter that cycles through five
+values, so nearly every lookup hits; "distinct" reads a new value every time,
+so its region is turned off after MEMO_PROBATION lookups.
+"""
+import contextlib
+import io
+import sys
+import time
+
+from tokenizer.scanner import Lexer
+from parser.parser import Parser
+from generator.simplifier import Simplifier
+from generator.unroll import Unroller
+from generator.generator import CodeGenerator
+from executer.executer import Execute
+
+RUNS = 5
+
+PROGRAM = """procedure note(v) is
+begin
+    print(v);
+    return 0;
+end
+procedure main is
+    var i = 0;
+    var c = 0;
+    var y = 0;
+    var s = 0;
+begin
+    while i < 20000 do
+        {step}
+        if c < 2 then
+            y = (c * 7 - 3) * (c + 11) - c;
+        else
+            if c < 4 then
+                y = (c + 4) * (c - 9) + 2 * c;
+            else
+                y = c * c * c - 5 * c + 1;
+            end
+        end
+        s = s + y;
+        i = i + 1 + note(s);
+    end
+end
+"""
+PROGRAMS = (("repeating", "c = c + 1;\n        if c == 5 then\n            c = 0;\n        end"),
+            ("distinct", "c = c + 1;"))
+
+
+def compile_program(source):
+    with contextlib.redirect_stdout(io.StringIO()):
+        tree = Parser(Lexer().scan(source)).parse()
+        simplifier = Simplifier()
+        tree = Unroller(simplifier).unroll(simplifier.simplify(tree))
+        generator = CodeGenerator(verbose=False)
+        generator.generate(tree)
+    return generator.get_code()
+
+def measure(code, memoize, runs):
+    # (output, instructions executed, best seconds, memo stats or None)
+    best = None
+    for _ in range(runs):
+        executer = Execute(code, count_instructions=True, memoize=memoize)
+        output = io.StringIO()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            executer.run()
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    stats = executer.memo.stats() if executer.memo is not None else None
+    return output.getvalue(), executer.executed, best, stats
+
+
+def main():
+    runs = RUNS
+    if len(sys.argv) == 3 and sys.argv[1] == "--runs":
+        runs = int(sys.argv[2])
+    print(f"{'program':<10} {'memoize':<8} {'executed':>10} {'time':>10} {'hits':>7} {'misses':>7}")
+    for name, step in PROGRAMS:
+        code = compile_program(PROGRAM.format(step=step))
+        plain = measure(code, False, runs)
+        memoized = measure(code, True, runs)
+        assert plain[0] == memoized[0], f"{name}: outputs differ"
+        stats = memoized[3]
+        print(f"{name:<10} {'no':<8} {plain[1]:>10} {plain[2] * 1000:>7.1f} ms")
+        print(f"{'':<10} {'yes':<8} {memoized[1]:>10} {memoized[2] * 1000:>7.1f} ms "
+              f"{stats['hits']:>7} {stats['misses']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Measures what profile-guided optimization (generator/pgo.py) gains on programs
+whose hot code it applies to.
+
+    python3 -m benchmark.pgo_benchmark [--repeat N]
+
+Every program is compiled without a profile, run once with
+Execute.record_profile, compiled again with the profile it recorded, and both
+builds are run with hot loop compilation on, as main.py runs them. The table
+shows the IR instructions each build dispatches and its best time out of N
+runs; outputs are checked to be the same.
+"""
+import contextlib
+import io
+import sys
+import time
+
+from tokenizer.scanner import Lexer
+from parser.parser import Parser
+from generator.simplifier import Simplifier
+from generator.pgo import Inliner
+from generator.unroll import Unroller
+from generator.generator import CodeGenerator
+from executer.executer import Execute
+
+PROGRAMS = {
+    # hot calls of small procedures keep the loop from being compiled
+    "calls in a loop": """
+procedure sq(x) is
+begin
+    return x * x;
+end
+procedure mix(a, b) is
+begin
+    return a * 3 - b;
+end
+procedure main is
+    var i = 0;
+    var s = 0;
+    var n = 100000;
+begin
+    while i < n do
+        s = s + mix(sq(i), i);
+        i = i + 1;
+    end
+    print(s);
+end
+""",
+    # the counter starts from a parameter, so it is not known to be an integer
+    "loop over a parameter": """
+procedure total(first) is
+    var i = first;
+    var s = 0;
+begin
+    while i < 400000 do
+        s = s + i * 2;
+        i = i + 1;
+    end
+    return s;
+end
+procedure main is
+begin
+    print(total(0));
+end
+""",
+    # a loop with a variable bound and a carried variable, only rotated
+    "loop with a variable bound": """
+procedure main is
+    var i = 0;
+    var s = 0;
+    var n = 400000;
+begin
+    while i < n do
+        if i < 10 then
+            s = s + 1;
+        else
+            s = i - s;
+        end
+        i = i + 1;
+    end
+    print(s);
+end
+""",
+}
+
+
+def compile_program(source, profile=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        simplifier = Simplifier()
+        tree = simplifier.simplify(Parser(Lexer().scan(source)).parse())
+        if profile is not None:
+            tree = Inliner(profile).inline(tree)
+        tree = Unroller(simplifier, profile=profile).unroll(tree)
+        generator = CodeGenerator(verbose=False, profile=profile)
+        generator.generate(tree)
+    return generator.get_code(), generator.source_map()
+
+def record(source, code, source_map):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Execute(code, source_map=source_map).record_profile(source)
+
+def run(code, source_map, repeat):
+    best = None
+    for _ in range(repeat):
+        output = io.StringIO()
+        executer = Execute(code, source_map=source_map, count_instructions=True)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            executer.run()
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return output.getvalue(), executer.executed, best
+
+
+def main():
+    repeat = 5
+    if len(sys.argv) == 3 and sys.argv[1] == "--repeat":
+        repeat = int(sys.argv[2])
+    print(f"{'program':<28} {'build':<10} {'instructions':>12} {'time':>10}")
+    for name, source in PROGRAMS.items():
+        code, source_map = compile_program(source)
+        profile = record(source, code, source_map)
+        optimized, optimized_map = compile_program(source, profile)
+        expected, executed, seconds = run(code, source_map, repeat)
+        output, optimized_executed, optimized_seconds = run(optimized, optimized_map, repeat)
+        assert output == expected, f"{name}: outputs differ"
+        print(f"{name:<28} {'plain':<10} {executed:>12} {seconds * 1000:>7.1f} ms")
+        print(f"{'':<28} {'profiled':<10} {optimized_executed:>12} {optimized_seconds * 1000:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measures what running the stages at the same time (pipeline/pipelined.py)
+saves on large generated programs.
+
+    python3 -m benchmark.pipelined_benchmark [--sizes N,N,...]
+
+For the programs of benchmark/stream_benchmark.py, the table shows the time
+from the source text until the program prints its first line and the total
+time, once for the usual build (lex, parse, simplify, unroll, generate,
+optimize, run), once streamed (lex and parse the whole source, then generate
+and run a chunk at a time) and once pipelined. Outputs are checked to be the
+same, and the smallest program is also run through Pipeline(...,
+pipelined=True), the path of main.py --pipelined.
+"""
+import contextlib
+import io
+import sys
+import time
+
+from tokenizer.scanner import Lexer
+from parser.parser import Parser
+from generator.stream import StreamingGenerator
+from executer.stream import StreamingExecute
+from pipeline.pipeline import Pipeline
+from pipeline.pipelined import PipelinedRun
+from .stream_benchmark import Output, optimized, program
+
+SIZES = (1000, 4000, 16000)
+
+
+def parse(source):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Parser(Lexer().scan(source)).parse()
+
+def sequential(source):
+    optimized(parse(source))
+
+def streamed(source):
+    tree = parse(source)
+    StreamingExecute(StreamingGenerator().chunks(tree)).run()
+
+def pipelined(source):
+    PipelinedRun(source).run()
+
+def measure(run, source):
+    # (output, seconds to the first line, seconds in all)
+    output = Output()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        run(source)
+    seconds = time.perf_counter() - started
+    return output.getvalue(), output.first - started, seconds
+
+
+def check_pipeline(source, expected):
+    # runs source end to end as main.py --pipelined does; fails unless it prints expected
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        Pipeline(source, pipelined=True).run()
+    printed = printed.getvalue()
+    assert "Pipeline Execution Complete!" in printed, printed[-500:]
+    output = printed.split("Executed Code:\n", 1)[1].split("Pipelined:", 1)[0]
+    assert output == expected, "Pipeline(pipelined=True) prints other output"
+
+
+def main():
+    sizes = SIZES
+    if len(sys.argv) == 3 and sys.argv[1] == "--sizes":
+        sizes = [int(size) for size in sys.argv[2].split(",")]
+    print(f"{'groups':>7} {'lines':>7} {'build':<10} {'first output':>13} {'total':>10}")
+    for index, groups in enumerate(sizes):
+        source = program(groups)
+        results = {}
+        for name, run in (("sequential", sequential), ("streamed", streamed), ("pipelined", pipelined)):
+            results[name] = measure(run, source)
+        outputs = {output for output, _, _ in results.values()}
+        assert len(outputs) == 1, f"{groups}: outputs differ"
+        if index == 0:
+            check_pipeline(source, outputs.pop())
+        for name, (_, first, seconds) in results.items():
+            label = f"{groups:>7} {len(source.splitlines()):>7}" if name == "sequential" else " " * 15
+            print(f"{label} {name:<10} {first * 1000:>10.1f} ms {seconds * 1000:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
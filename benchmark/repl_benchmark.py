@@ -0,0 +1,72 @@
+"""
+Measures the turnaround of entries in a warm interactive session
+(pipeline/repl.py) against running each as a program with main.py.
+
+    python3 -m benchmark.repl_benchmark [--repeat N]
+
+Every entry below is entered N times into one Session, after the setup
+entries; the table shows the median and worst time from submitting it to its
+output, compiling and running included. The last line is the median time of a
+fresh `python3 main.py` on a program of the same first statement, which pays
+for the interpreter, the imports, every stage and its printed output.
+"""
+import contextlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from pipeline.repl import Session
+
+REPEAT = 200
+
+SETUP = ("var x = 3;", "var total = 0;", "var i = 0;",
+         "procedure square(v) is\nbegin\n    return v * v;\nend")
+ENTRIES = (("assignment", "x = x + 1;"),
+           ("print", "print(x * 2 + 1);"),
+           ("call", "total = total + square(x);"),
+           ("if", "if x > 10 then\n    x = 0;\nelse\n    x = x + 2;\nend"),
+           ("loop of 100", "i = 0;\nwhile i < 100 do\n    total = total + i;\n    i = i + 1;\nend"))
+PROGRAM = "procedure main is\n    var x = 3;\nbegin\n    x = x + 1;\nend\n"
+
+
+def main_py_seconds(repeat):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.NamedTemporaryFile("w", suffix=".num", delete=False) as f:
+        f.write(PROGRAM)
+    try:
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, "main.py", f.name], cwd=root, stdout=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - started)
+    finally:
+        os.unlink(f.name)
+    return statistics.median(times)
+
+
+def main():
+    repeat = REPEAT
+    if len(sys.argv) == 3 and sys.argv[1] == "--repeat":
+        repeat = int(sys.argv[2])
+    session = Session()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for entry in SETUP:
+            session.enter(entry)
+    print(f"{'entry':<12} {'median':>10} {'worst':>10}")
+    for name, entry in ENTRIES:
+        times = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(repeat):
+                started = time.perf_counter()
+                session.enter(entry)
+                times.append(time.perf_counter() - started)
+        print(f"{name:<12} {statistics.median(times) * 1000:>7.3f} ms {max(times) * 1000:>7.3f} ms")
+    print(f"{'main.py':<12} {main_py_seconds(max(1, repeat // 20)) * 1000:>7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Measures how long snapshots of a paused run take to save and restore
+(executer/snapshot.py), and what time slicing with run_for costs.
+
+    python3 -m benchmark.snapshot_benchmark [--repeat N]
+
+The first table pauses a program holding an array of each size halfway through
+a call and times snapshot() and restore() into a fresh executer. The second
+runs several programs round-robin in slices of SLICE instructions and compares
+the total time with running them one after the other with run().
+"""
+import contextlib
+import io
+import sys
+import time
+
+from tokenizer.scanner import Lexer
+from parser.parser import Parser
+from generator.generator import CodeGenerator
+from executer.executer import Execute, DONE
+
+ARRAY_SIZES = (1000, 100000, 1000000)
+SLICE = 10000
+PROGRAMS = 4
+
+STATE = """
+procedure work(n) is
+    var k = 0;
+begin
+    while k < n do
+        k = k + 1;
+    end
+    return k;
+end
+procedure main is
+    var a[{size}];
+    var s = "state";
+begin
+    fill(a, 7);
+    print(work(1000));
+end
+"""
+
+JOB = """
+procedure main is
+    var i = 0;
+    var s = 0;
+begin
+    while i < {n} do
+        s = s + i * i;
+        i = i + 1;
+    end
+    print(s);
+end
+"""
+
+
+def compile_program(source):
+    with contextlib.redirect_stdout(io.StringIO()):
+        generator = CodeGenerator(verbose=False)
+        generator.generate(Parser(Lexer().scan(source)).parse())
+    return generator.get_code()
+
+
+def best_of(repeat, function):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def snapshots(repeat):
+    print(f"{'array':>9} {'snapshot':>10} {'save':>9} {'restore':>9}")
+    for size in ARRAY_SIZES:
+        code = compile_program(STATE.format(size=size))
+        executer = Execute(code)
+        with contextlib.redirect_stdout(io.StringIO()):
+            executer.run_for(2000)  # inside the loop of work()
+        assert executer.call_stack, "expected to pause inside the call"
+        data = executer.snapshot()
+        save = best_of(repeat, executer.snapshot)
+        restore = best_of(repeat, lambda: Execute(code).restore(data))
+        print(f"{size:>9} {len(data) / 1024:>7.0f} KB {save * 1000:>6.2f} ms {restore * 1000:>6.2f} ms")
+
+
+def time_slicing():
+    codes = [compile_program(JOB.format(n=50000 * (job + 1))) for job in range(PROGRAMS)]
+
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        for code in codes:
+            Execute(code).run()
+    serial = time.perf_counter() - started
+
+    sliced_output = io.StringIO()
+    executers = [Execute(code) for code in codes]
+    finished = []
+    slices = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sliced_output):
+        while executers:
+            for executer in list(executers):
+                slices += 1
+                if executer.run_for(SLICE) == DONE:
+                    executers.remove(executer)
+                    finished.append(time.perf_counter() - started)
+    interleaved = time.perf_counter() - started
+    assert sorted(sliced_output.getvalue().split()) == sorted(output.getvalue().split())
+
+    print(f"\n{PROGRAMS} programs, {slices} slices of {SLICE} instructions")
+    print(f"one after the other with run(): {serial:.2f} s")
+    print(f"round-robin with run_for():     {interleaved:.2f} s, programs finished at "
+          + ", ".join(f"{seconds:.2f}" for seconds in finished) + " s")
+
+
+def main():
+    repeat = 5
+    if len(sys.argv) == 3 and sys.argv[1] == "--repeat":
+        repeat = int(sys.argv[2])
+    snapshots(repeat)
+    time_slicing()
+
+
+if __name__ == "__main__":
+    main()
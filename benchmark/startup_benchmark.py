@@ -0,0 +1,85 @@
+"""
+Startup benchmark: measures the import time of `main.py` with `-X importtime`
+and fails when it exceeds the budget.
+
+    python3 -m benchmark.startup_benchmark [--repeat N]
+
+Only imports that the interpreter does not already perform for an empty
+program are counted, so the numbers track the compiler's own import cost.
+Bytecode caches are refreshed first, so source compilation is not measured.
+"""
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = os.path.join(ROOT, "test", "test_file.txt")
+
+# budgets in milliseconds of import time, roughly 2x the measured cost
+# (about 11 ms for --check-only and 14 ms for a full run)
+BUDGETS_MS = {
+    "check-only": 20.0,
+    "full": 28.0,
+}
+# stages that --check-only must never load
+CHECK_ONLY_FORBIDDEN = ("generator", "executer")
+
+
+def import_times(args):
+    # returns {top-level module: cumulative microseconds}
+    result = subprocess.run([sys.executable, "-X", "importtime"] + args,
+                            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            # one space after the bar, then two more per nesting level
+            name = name[1:].rstrip()
+            times[name] = times.get(name, 0) + int(cumulative)
+    return times
+
+
+def measure(args, baseline):
+    times = import_times(args)
+    own = {name: us for name, us in times.items() if name.strip() not in baseline}
+    top_level = sum(us for name, us in own.items() if not name.startswith(" "))
+    return top_level / 1000, own
+
+
+def main():
+    repeat = 5
+    if len(sys.argv) == 3 and sys.argv[1] == "--repeat":
+        repeat = int(sys.argv[2])
+
+    # measure warm bytecode caches, as a deployed install would have them
+    compileall.compile_dir(ROOT, quiet=1)
+    baseline = {name.strip() for name in import_times(["-c", "pass"])}
+    failed = False
+    for name, args in (("check-only", ["main.py", "--check-only", SAMPLE]),
+                       ("full", ["main.py", SAMPLE])):
+        samples = []
+        for _ in range(repeat):
+            total_ms, modules = measure(args, baseline)
+            samples.append(total_ms)
+        median = statistics.median(samples)
+        budget = BUDGETS_MS[name]
+        status = "ok" if median <= budget else "OVER BUDGET"
+        print(f"{name:>10}: {median:7.2f} ms import time (budget {budget:.0f} ms) {status}")
+        if median > budget:
+            failed = True
+        if name == "check-only":
+            loaded = [m.strip() for m in modules if m.strip().split(".")[0] in CHECK_ONLY_FORBIDDEN]
+            if loaded:
+                print(f"            --check-only imported {', '.join(loaded)}")
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
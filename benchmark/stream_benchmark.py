@@ -0,0 +1,144 @@
+"""
+Measures what streaming unoptimized code (generator/stream.py,
+executer/stream.py) saves on large generated programs.
+
+    python3 -m benchmark.stream_benchmark [--sizes N,N,...]
+
+For programs of N generated statement groups, the table shows, from the parsed
+tree on, the peak memory traced by tracemalloc while generating and running
+the code, the time until the program prints its first line and the total time,
+once for the usual optimized build (simplify, unroll, generate, optimize, run)
+and once streamed. Outputs are checked to be the same. Times are taken on a
+separate run, without tracemalloc. First, the smallest program is run through
+Pipeline(..., stream=True), the path of main.py --stream, to check that it
+prints the same output, and written with Pipeline(..., stream_out=file), the
+path of main.py --stream-out, to check that the written code runs to it too.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tokenizer.scanner import Lexer
+from parser.parser import Parser
+from generator.simplifier import Simplifier
+from generator.unroll import Unroller
+from generator.generator import CodeGenerator
+from generator.stream import StreamingGenerator
+from executer.executer import Execute
+from executer.stream import StreamingExecute
+from pipeline.pipeline import Pipeline
+
+SIZES = (1000, 4000, 16000)
+
+GROUP = """    x = x + {index};
+    if x > 1000 then
+        x = x - step(x);
+    end
+    print(x);
+"""
+LOOP = """    i = 0;
+    while i < 100 do
+        s = s + i * x;
+        i = i + 1;
+    end
+"""
+
+
+def program(groups):
+    body = "".join(GROUP.format(index=index) + (LOOP if index % 100 == 0 else "") for index in range(groups))
+    return ("procedure step(v) is\nbegin\n    return v / 2 + 1;\nend\n"
+            "procedure main is\n    var x = 0;\n    var i = 0;\n    var s = 0;\nbegin\n"
+            f"{body}    print(s);\nend\n")
+
+
+class Output(io.StringIO):
+    # remembers when the first line was printed
+    def __init__(self):
+        super().__init__()
+        self.first = None
+
+    def write(self, text):
+        if self.first is None:
+            self.first = time.perf_counter()
+        return super().write(text)
+
+
+def optimized(tree):
+    simplifier = Simplifier()
+    tree = simplifier.simplify(tree)
+    tree = Unroller(simplifier).unroll(tree)
+    generator = CodeGenerator(verbose=False)
+    generator.generate(tree)
+    Execute(generator.get_code(), source_map=generator.source_map()).run()
+
+def streamed(tree):
+    StreamingExecute(StreamingGenerator().chunks(tree)).run()
+
+def parse(source):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Parser(Lexer().scan(source)).parse()
+
+def measure(run, source):
+    # (output, peak bytes, seconds to the first line, seconds in all)
+    tree = parse(source)
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run(tree)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tree = parse(source)
+    output = Output()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        run(tree)
+    seconds = time.perf_counter() - started
+    return output.getvalue(), peak, output.first - started, seconds
+
+
+def check_pipeline(source, expected):
+    # runs source end to end as main.py --stream does, and the code main.py --stream-out
+    # writes of it; fails unless both print expected
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        Pipeline(source, stream=True).run()
+    printed = printed.getvalue()
+    assert "Pipeline Execution Complete!" in printed, printed[-500:]
+    output = printed.split("Executed Code:\n", 1)[1].split("Streamed:", 1)[0]
+    assert output == expected, "Pipeline(stream=True) prints other output"
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "streamed.ir")
+        with contextlib.redirect_stdout(io.StringIO()):
+            Pipeline(source, stream_out=path).run()
+        with open(path) as f:
+            code = f.read()
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        Execute(code).run()
+    assert printed.getvalue() == expected, "the code Pipeline(stream_out=...) writes prints other output"
+
+
+def main():
+    sizes = SIZES
+    if len(sys.argv) == 3 and sys.argv[1] == "--sizes":
+        sizes = [int(size) for size in sys.argv[2].split(",")]
+    print(f"{'groups':>7} {'lines':>7} {'build':<10} {'peak memory':>12} {'first output':>13} {'total':>10}")
+    for index, groups in enumerate(sizes):
+        source = program(groups)
+        results = {}
+        for name, run in (("optimized", optimized), ("streamed", streamed)):
+            results[name] = measure(run, source)
+        assert results["optimized"][0] == results["streamed"][0], f"{groups}: outputs differ"
+        if index == 0:
+            check_pipeline(source, results["streamed"][0])
+        for name, (_, peak, first, seconds) in results.items():
+            label = f"{groups:>7} {len(source.splitlines()):>7}" if name == "optimized" else " " * 15
+            print(f"{label} {name:<10} {peak / 1e6:>9.1f} MB {first * 1000:>10.1f} ms {seconds * 1000:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Measures what loop unrolling (generator/unroll.py) saves on a few loop shapes.
+
+    python3 -m benchmark.unroll_benchmark [--factors 0,2,4,8]
+
+Every program is compiled once per unroll factor (0 turns unrolling off) and
+run by the interpreter without compiled loops, so the dispatched instructions
+are the ones the IR asks for. The table shows the IR size, the instructions
+dispatched and the run time of each; outputs are checked against factor 0.
+"""
+import contextlib
+import io
+import sys
+import time
+
+from tokenizer.scanner import Lexer
+from parser.parser import Parser
+from generator.simplifier import Simplifier
+from generator.unroll import Unroller
+from generator.generator import CodeGenerator
+from executer.executer import Execute
+
+PROGRAMS = {
+    # full unrolling of an inner loop of 8
+    "short inner loop": """
+procedure main is
+    var a[8];
+    var i = 0;
+    var r = 0;
+begin
+    while r < 20000 do
+        i = 0;
+        while i < 8 do
+            a[i] = a[i] + i * r;
+            i = i + 1;
+        end
+        r = r + 1;
+    end
+    print(sum(a));
+end
+""",
+    # partial unrolling with a remainder loop
+    "long loop": """
+procedure main is
+    var i = 0;
+    var s = 0;
+begin
+    while i < 200003 do
+        s = s + i * i;
+        i = i + 1;
+    end
+    print(s);
+end
+""",
+    # a counter stepping down by 3 in a procedure
+    "strided loop in a procedure": """
+procedure total(n) is
+    var i = 0;
+    var s = 0;
+begin
+    i = 300000;
+    while i > 0 do
+        s = s + i * n;
+        i = i - 3;
+    end
+    return s;
+end
+procedure main is
+begin
+    print(total(2));
+end
+""",
+}
+
+
+def parse_args(argv):
+    factors = [0, 2, 4, 8]
+    args = iter(argv)
+    for arg in args:
+        if arg == "--factors":
+            factors = [int(factor) for factor in next(args).split(",")]
+        else:
+            sys.exit(__doc__)
+    return factors
+
+
+def compile_program(source, factor):
+    with contextlib.redirect_stdout(io.StringIO()):
+        simplifier = Simplifier()
+        tree = simplifier.simplify(Parser(Lexer().scan(source)).parse())
+        tree = Unroller(simplifier, factor).unroll(tree)
+        generator = CodeGenerator(verbose=False)
+        generator.generate(tree)
+        return generator.get_code(), len(generator.instructions)
+
+
+def run(code):
+    executer = Execute(code, jit_threshold=None, count_instructions=True)
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        executer.run()
+    return executer.executed, time.perf_counter() - started, output.getvalue()
+
+
+def main():
+    factors = parse_args(sys.argv[1:])
+    print(f"{'program':<28} {'factor':>6} {'IR':>5} {'dispatched':>11} {'time':>9} {'saved':>6}")
+    for name, source in PROGRAMS.items():
+        baseline = None
+        for factor in factors:
+            code, size = compile_program(source, factor)
+            executed, elapsed, output = run(code)
+            if baseline is None:
+                baseline = executed, output
+            assert output == baseline[1], f"{name}: factor {factor} printed {output!r}"
+            saved = 1 - executed / baseline[0]
+            print(f"{name:<28} {factor:>6} {size:>5} {executed:>11} {elapsed:>7.2f} s {saved:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
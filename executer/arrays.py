@@ -0,0 +1,66 @@
+"""
+Runtime storage of Numera arrays.
+
+An array is an array.array: one contiguous buffer of machine numbers rather
+than a list of Python objects. It holds 64-bit integers ('q') until a float is
+stored in it, when it is converted to 64-bit floats ('d') once. No other
+reference to an array exists than its variable, so every helper that may
+convert an array returns the array to store back.
+"""
+from array import array
+
+ZERO = bytes(8)
+REDUCERS = {"len": len, "sum": sum, "min": min, "max": max}
+
+
+def new_array(size):
+    return array('q', ZERO * size)
+
+def expect_array(values, name):
+    if type(values) is not array:
+        raise ValueError(f"{name} is not an array")
+    return values
+
+def check_index(values, index, name):
+    expect_array(values, name)
+    if type(index) is not int:
+        raise ValueError(f"Index of {name} must be an integer, got {index!r}")
+    if not 0 <= index < len(values):
+        raise IndexError(f"Index {index} out of bounds for {name}[{len(values)}]")
+    return index
+
+def in_range(values, first, last):
+    # whether every index from first to last can be used unchecked; true for an empty range
+    return (type(values) is array and type(first) is int and type(last) is int
+            and (first > last or (first >= 0 and last < len(values))))
+
+def load(values, index, name):
+    return values[check_index(values, index, name)]
+
+def store(values, index, value):
+    try:
+        values[index] = value
+    except TypeError:
+        if type(value) is not float:
+            raise ValueError(f"Arrays hold numbers, got {value!r}") from None
+        values = array('d', values)
+        values[index] = value
+    except OverflowError:
+        raise ValueError(f"{value} does not fit in an array element") from None
+    return values
+
+def store_checked(values, index, value, name):
+    return store(values, check_index(values, index, name), value)
+
+def fill(values, value, name):
+    expect_array(values, name)
+    typecode = 'd' if type(value) is float else values.typecode
+    try:
+        return array(typecode, [value]) * len(values)
+    except TypeError:
+        raise ValueError(f"Arrays hold numbers, got {value!r}") from None
+    except OverflowError:
+        raise ValueError(f"{value} does not fit in an array element") from None
+
+def reduce_array(function, values, name):
+    return REDUCERS[function](expect_array(values, name))
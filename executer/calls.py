@@ -0,0 +1,74 @@
+"""
+Call frames and the result cache of pure procedures.
+
+A Frame holds the locals and temps of one procedure activation together with
+what RET needs to resume the caller. Frames come from a FramePool that is
+filled when the executer is created and only grows when calls nest deeper than
+ever before; a frame returned to the pool keeps its dicts, which the next call
+clears and refills, so a call allocates nothing.
+"""
+from collections import OrderedDict
+
+FRAME_POOL_SIZE = 32
+MAX_CALL_DEPTH = 10000
+CALL_CACHE_SIZE = 1024
+
+MISSING = object()
+
+
+class Frame:
+    __slots__ = ("variables", "temps", "return_pc", "dest", "memo_key",
+                 "caller_variables", "caller_temps")
+
+    def __init__(self):
+        self.variables = {}
+        self.temps = {}
+        self.return_pc = 0
+        self.dest = None
+        self.memo_key = None
+        self.caller_variables = None
+        self.caller_temps = None
+
+
+class FramePool:
+    def __init__(self, size=FRAME_POOL_SIZE):
+        self.free = [Frame() for _ in range(size)]
+        self.depth = 0
+
+    def acquire(self):
+        if self.depth >= MAX_CALL_DEPTH:
+            raise RecursionError(f"Call depth exceeds {MAX_CALL_DEPTH}")
+        self.depth += 1
+        frame = self.free.pop() if self.free else Frame()
+        frame.variables.clear()
+        frame.temps.clear()
+        return frame
+
+    def release(self, frame):
+        self.depth -= 1
+        frame.caller_variables = frame.caller_temps = None
+        self.free.append(frame)
+
+
+class CallCache:
+    # bounded LRU of pure procedure results, keyed by procedure name and typed argument values
+    def __init__(self, size=CALL_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
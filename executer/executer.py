@@ -1,52 +1,356 @@
+import os
 import re
+from collections import deque
+from generator.literals import parse_literal
+from . import arrays, strings
+from .execution_error import ExecutionError
+from .calls import MISSING, CallCache, FramePool
+from .jit import JIT_THRESHOLD
+
+# what run_for returns
+PAUSED = "paused"  # the instruction budget ran out
+WAITING_FOR_INPUT = "input"  # the next instruction reads input and none is queued
+DONE = "done"
+
+def parse_input(user_input):
+    # value of a line typed in for in()
+    try:
+        return int(user_input)
+    except ValueError:
+        try:
+            return float(user_input)
+        except ValueError:
+            return user_input.strip('"')
 
 class Execute:
-    def __init__(self, code):
-        self.instructions = code.split('\n')
+    def __init__(self, code, source_map=None, jit_threshold=JIT_THRESHOLD,
+                 parallel_loops=None, parallel_workers=None, count_instructions=False, inputs=None,
+                 memoize=False):
+        self.code = code
+        # source_map[i] is the Numera line of instruction i (after the constant pool), 0 if unknown
+        self.source_map = source_map
+        self.instructions = []
+        self.constants = {}
+        for line in code.split('\n'):
+            # CONST k, value lines form the constant pool and are not executed
+            if line.startswith('CONST '):
+                name, value = re.findall(r'"[^"]*"|[^\s,]+', line)[1:]
+                self.constants[name] = parse_literal(value)
+            else:
+                self.instructions.append(line)
         self.variables = {}
+        self.globals = self.variables  # main program variables, visible from procedures
         self.temp_vars = {}
         self.labels = {}
+        self.procedures = {}  # name -> (index of PROC, pure, parameter names)
+        self.call_stack = []
+        self.frames = None
+        self.call_cache = None
         self.pc = 0
+        # hot loop compilation: None disables it
+        self.jit_threshold = jit_threshold
+        self.back_edges = {}
+        self.compiled = {}
+        # start label -> generator.parallel.ParallelLoop, loops whose iterations may run in parallel
+        self.parallel_loops = parallel_loops or {}
+        self.parallel_workers = parallel_workers or os.cpu_count() or 1
+        self.parallel_report = {}  # start label -> how the loop last ran
+        # instructions executed so far, None when not counted (counting slows the dispatch loop)
+        self.executed = 0 if count_instructions else None
+        # values in() returns, in order; None reads them from stdin
+        self.inputs = deque(inputs) if inputs is not None else None
+        self.sliced_program = None  # program run_for dispatches, built on first use
+        self.slice_left = None  # instructions left in the slice run_for is running, else None
+        self.hooks = None  # hooks.Hooks while any hook or breakpoint is registered, see add_hook
 
         self._scan_labels()
+        self._decode()
+        # memo.BlockMemo caching the results of pure regions, None when not memoizing
+        self.memo = None
+        if memoize:
+            from .memo import BlockMemo
+            self.memo = BlockMemo(self)
+            self.memo.install()
 
-    def _scan_labels(self):
-        for index, instruction in enumerate(self.instructions):
+    def _scan_labels(self, first=0):
+        # from instruction first on
+        for index in range(first, len(self.instructions)):
+            instruction = self.instructions[index]
             parts = instruction.strip().split()
             if parts and parts[0] == 'LABEL':
                 label = parts[1]
                 self.labels[label] = index
+            elif parts and parts[0] == 'PROC':
+                parts = re.findall(r'"[^"]*"|[^\s,]+', instruction)
+                self.procedures[parts[1]] = (index, parts[2] == 'pure', parts[3:])
+        if self.procedures and self.frames is None:
+            self.frames = FramePool()
+            self.call_cache = CallCache()
+
+    def _decode(self):
+        # split every instruction and resolve its handler once, instead of on every execution
+        decoded = [self._split(instruction) for instruction in self.instructions]
+        # variables APPEND may leave a StringBuilder in, whose reads must join it
+        self.appended = {parts[1] for parts in decoded if parts and parts[0] == 'APPEND'}
+        self.program = [self._bind(parts) for parts in decoded]
+
+    def _split(self, instruction):
+        instruction = instruction.strip()
+        if not instruction or instruction.startswith('#'):
+            return None
+        parts = re.findall(r'"[^"]*"|[^\s,]+', instruction)
+        if parts[0] == 'LOAD_CONST':
+            parts[1] = parse_literal(parts[1])
+        return parts
+
+    def _bind(self, parts):
+        # (handler, parts) of a split instruction, None for a blank line or comment
+        if parts is None:
+            return None
+        if parts[0] == 'LABEL' and parts[1] in self.parallel_loops:
+            method = self._execute_parallel_label
+        elif parts[0] == 'LOAD' and parts[1] in self.appended:
+            method = self._execute_load_text
+        else:
+            method = getattr(self, f'_execute_{parts[0].lower()}', None)
+        return method, parts
+
+    def extend(self, instructions, lines):
+        # appends instructions, without a constant pool, and their source lines to the
+        # program; returns the index of the first
+        first = len(self.instructions)
+        self.instructions.extend(instructions)
+        self.source_map.extend(lines)
+        self._scan_labels(first)
+        self.program.extend(self._bind(self._split(instruction)) for instruction in instructions)
+        self.sliced_program = None
+        return first
 
     def run(self):
-        while self.pc < len(self.instructions):
-            instruction = self.instructions[self.pc].strip()
-            if not instruction or instruction.startswith('#'):
+        if self.hooks is not None:
+            return self.hooks.run(self)
+        if self.executed is not None:
+            return self._run_counted()
+        program = self.program
+        try:
+            while self.pc < len(program):
+                decoded = program[self.pc]
+                if decoded is not None:
+                    method, parts = decoded
+                    if method:
+                        method(parts)
+                    else:
+                        raise ValueError(f"Unknown method: {parts[0]}")
+
                 self.pc += 1
-                continue
+            return DONE
+        except Exception as e:
+            raise ExecutionError(e, self.pc, self.source_line(self.pc)) from e
 
-            parts = re.findall(r'"[^"]*"|[^\s,]+', instruction)
-            opcode = parts[0]
+    def _run_counted(self):
+        # run() that also counts the instructions executed; compiled loops and
+        # parallel workers add theirs to self.executed themselves
+        program = self.program
+        try:
+            while self.pc < len(program):
+                decoded = program[self.pc]
+                if decoded is not None:
+                    method, parts = decoded
+                    if method:
+                        self.executed += 1
+                        method(parts)
+                    else:
+                        raise ValueError(f"Unknown method: {parts[0]}")
 
-            method_name = f'_execute_{opcode.lower()}'
-            method = getattr(self, method_name, None)
-            if method:
-                method(parts)
-            else:
-                raise ValueError(f"Unknown method: {opcode}")
+                self.pc += 1
+            return DONE
+        except Exception as e:
+            raise ExecutionError(e, self.pc, self.source_line(self.pc)) from e
 
-            self.pc += 1
+    def run_for(self, max_instructions):
+        # runs about max_instructions instructions and returns PAUSED, WAITING_FOR_INPUT
+        # or DONE; the next call carries on where this one stopped, and in between the
+        # state can be saved with snapshot(). A compiled loop checks the budget once per
+        # iteration, so a slice can end up to an iteration late. Loops do not run in
+        # parallel here, which would run the whole loop at once.
+        if self.sliced_program is None:
+            self.sliced_program = [(self._execute_label, decoded[1])
+                                   if decoded is not None and decoded[0] == self._execute_parallel_label
+                                   else decoded for decoded in self.program]
+        program = self.sliced_program
+        queued = self.inputs is not None
+        self.slice_left = max_instructions
+        ran = 0  # interpreted here; compiled loops count their own
+        try:
+            while self.pc < len(program):
+                decoded = program[self.pc]
+                if decoded is not None:
+                    if self.slice_left <= 0:
+                        return PAUSED
+                    method, parts = decoded
+                    if queued and not self.inputs and parts[0] == 'INPUT':
+                        return WAITING_FOR_INPUT
+                    if method:
+                        ran += 1
+                        self.slice_left -= 1
+                        method(parts)
+                    else:
+                        raise ValueError(f"Unknown method: {parts[0]}")
+
+                self.pc += 1
+        except Exception as e:
+            raise ExecutionError(e, self.pc, self.source_line(self.pc)) from e
+        finally:
+            self.slice_left = None
+            if self.executed is not None:
+                self.executed += ran
+        return DONE
+
+    def provide_input(self, *values):
+        # queues lines for in() to return, switching from stdin to the queue
+        if self.inputs is None:
+            self.inputs = deque()
+        self.inputs.extend(values)
+
+    def snapshot(self):
+        # the state of a run paused by run_for, as bytes that restore() takes
+        from .snapshot import save
+        return save(self)
+
+    def restore(self, data):
+        # continues the run a snapshot() of an executer of the same code saved
+        from .snapshot import load
+        load(self, data)
+
+    def add_hook(self, event, callback):
+        # calls callback on every event of the kind event (see executer/hooks.py) from the next run() on
+        from .hooks import EVENTS, Hooks
+        if event not in EVENTS:
+            raise ValueError(f"Unknown event: {event}")
+        if self.hooks is None:
+            self.hooks = Hooks()
+        self.hooks.callbacks[event].append(callback)
+
+    def remove_hook(self, event, callback):
+        if self.hooks is None or callback not in self.hooks.callbacks.get(event, ()):
+            raise ValueError(f"No {event} hook registered for {callback!r}")
+        self.hooks.callbacks[event].remove(callback)
+        self._drop_hooks()
+
+    def add_breakpoint(self, pc=None, line=None):
+        # stops run() before the instruction at index pc, or on entering source line line
+        from .hooks import Hooks
+        if (pc is None) == (line is None):
+            raise ValueError("A breakpoint needs either an instruction index or a source line")
+        if line is not None and self.source_map is None:
+            raise ValueError("Breakpoints on source lines need a source map")
+        if self.hooks is None:
+            self.hooks = Hooks()
+        (self.hooks.pcs if pc is not None else self.hooks.lines).add(pc if pc is not None else line)
+
+    def remove_breakpoint(self, pc=None, line=None):
+        if self.hooks is None:
+            return
+        (self.hooks.pcs if pc is not None else self.hooks.lines).discard(pc if pc is not None else line)
+        self._drop_hooks()
+
+    def _drop_hooks(self):
+        # back to the uninstrumented loop once nothing is registered
+        if self.hooks.empty():
+            self.hooks = None
+
+    def profile(self):
+        # runs like run(), timing every instruction; returns the LineProfiler
+        from .profiler import LineProfiler
+        profiler = LineProfiler(len(self.program))
+        # compiled loops would hide their lines from the profiler
+        jit_threshold, self.jit_threshold = self.jit_threshold, None
+        try:
+            profiler.run(self)
+        except Exception as e:
+            raise ExecutionError(e, self.pc, self.source_line(self.pc)) from e
+        finally:
+            self.jit_threshold = jit_threshold
+        return profiler
+
+    def record_profile(self, source):
+        # runs like run(), recording the feedback.Profile the next compile of source can use
+        from .feedback import ProfileRecorder
+        return ProfileRecorder(self).run(source)
+
+    def source_line(self, pc):
+        if self.source_map is None or pc >= len(self.source_map):
+            return None
+        return self.source_map[pc] or None
 
     def _execute_alloc(self, parts):
         # ALLOC var_name
         var_name = parts[1]
         self.variables[var_name] = 0
 
+    def _execute_alloc_array(self, parts):
+        # ALLOC_ARRAY var_name, size
+        self.variables[parts[1]] = arrays.new_array(int(parts[2]))
+
+    def _find_array(self, name):
+        # (the dict holding variable name, its value); procedures see main program arrays too
+        variables = self.variables
+        if name not in variables:
+            variables = self.globals
+            if name not in variables:
+                raise ValueError(f"Variable not declared: {name}")
+        return variables, variables[name]
+
+    def _execute_load_elem(self, parts):
+        # LOAD_ELEM array, index, temp
+        _, values = self._find_array(parts[1])
+        self.temp_vars[parts[3]] = arrays.load(values, self._get_value(parts[2]), parts[1])
+
+    def _execute_load_elem_unchecked(self, parts):
+        # LOAD_ELEM_UNCHECKED array, index, temp: CHECK_RANGE has checked the index
+        name = parts[1]
+        values = self.variables[name] if name in self.variables else self.globals[name]
+        self.temp_vars[parts[3]] = values[self._get_value(parts[2])]
+
+    def _execute_store_elem(self, parts):
+        # STORE_ELEM temp, array, index
+        variables, values = self._find_array(parts[2])
+        variables[parts[2]] = arrays.store_checked(values, self._get_value(parts[3]),
+                                                   self._get_value(parts[1]), parts[2])
+
+    def _execute_store_elem_unchecked(self, parts):
+        # STORE_ELEM_UNCHECKED temp, array, index: CHECK_RANGE has checked the index
+        name = parts[2]
+        variables = self.variables if name in self.variables else self.globals
+        variables[name] = arrays.store(variables[name], self._get_value(parts[3]), self._get_value(parts[1]))
+
+    def _execute_check_range(self, parts):
+        # CHECK_RANGE array, first, last, label: jumps to label unless all indexes first..last are in bounds
+        name = parts[1]
+        values = self.variables.get(name, self.globals.get(name))
+        if not arrays.in_range(values, self._get_value(parts[2]), self._get_value(parts[3])):
+            self.pc = self.labels[parts[4]]
+
+    def _execute_array_reduce(self, parts):
+        # ARRAY_REDUCE len|sum|min|max, array, temp
+        _, values = self._find_array(parts[2])
+        self.temp_vars[parts[3]] = arrays.reduce_array(parts[1], values, parts[2])
+
+    def _execute_array_fill(self, parts):
+        # ARRAY_FILL array, temp
+        variables, values = self._find_array(parts[1])
+        variables[parts[1]] = arrays.fill(values, self._get_value(parts[2]), parts[1])
+
     def _execute_store(self, parts):
         # STORE temp, var_name
         temp = parts[1]
         var_name = parts[2]
         value = self._get_value(temp)
-        self.variables[var_name] = value
+        variables = self.variables
+        if var_name not in variables and var_name in self.globals:
+            # a procedure writing a main program variable
+            variables = self.globals
+        variables[var_name] = value
 
     def _execute_print(self, parts):
         # PRINT temp
@@ -61,7 +365,23 @@ class Execute:
         value = self._get_value(temp)
         if not value:
             if label in self.labels:
-                self.pc = self.labels[label]
+                target = self.labels[label]
+                if target < self.pc and self.jit_threshold is not None:
+                    # the back edge of a loop with its test at the bottom (generator.generate_loop)
+                    target = self._enter_loop(target)
+                self.pc = target
+            else:
+                raise ValueError(f"Unknown label: {label}")
+
+    def _execute_jump_if_true(self, parts):
+        # JUMP_IF_TRUE temp, label
+        if self._get_value(parts[1]):
+            label = parts[2]
+            if label in self.labels:
+                target = self.labels[label]
+                if target < self.pc and self.jit_threshold is not None:
+                    target = self._enter_loop(target)
+                self.pc = target
             else:
                 raise ValueError(f"Unknown label: {label}")
 
@@ -69,26 +389,109 @@ class Execute:
         # JUMP label
         label = parts[1]
         if label in self.labels:
-            self.pc = self.labels[label]
+            target = self.labels[label]
+            if target < self.pc and self.jit_threshold is not None:
+                target = self._enter_loop(target)
+            self.pc = target
         else:
             raise ValueError(f"Label not found: {label}")
 
+    def _enter_loop(self, start):
+        # called on a back edge to the loop header at start; once the loop is hot it runs
+        # compiled until it exits, and the index of the label it left through is returned
+        count = self.back_edges.get(start, 0) + 1
+        self.back_edges[start] = count
+        if count < self.jit_threshold:
+            return start
+        loop = self.compiled.get(start, MISSING)
+        if loop is MISSING or (loop is not None and loop.sliced != (self.slice_left is not None)):
+            # not compiled yet, or compiled for the other of run and run_for
+            from .jit import compile_loop
+            loop = self.compiled[start] = compile_loop(self, start, self.pc)
+        if loop is None:
+            return start
+        if not loop.guard(self.variables):
+            self.invalidate(start)
+            return start
+        return loop(self)
+
+    def invalidate(self, start=None):
+        # drops compiled loops (all of them by default), which are recompiled once hot again
+        for key in ([start] if start is not None else list(self.compiled)):
+            self.compiled.pop(key, None)
+            self.back_edges.pop(key, None)
+
     def _execute_label(self, parts):
         # LABEL label_name
         pass 
 
+    def _execute_parallel_label(self, parts):
+        # LABEL start_label of a parallel loop, only executed when the loop is entered
+        from .parallel import run_parallel
+        end = run_parallel(self, parts[1], self.parallel_loops[parts[1]])
+        if end is not None:
+            self.pc = end
+
+    def _execute_proc(self, parts):
+        # PROC name, pure|impure, parameters...: entry point of a procedure, only reached by CALL
+        raise ValueError(f"Fell through into procedure {parts[1]}")
+
+    def _execute_call(self, parts):
+        # CALL name, temp, arguments...
+        name = parts[1]
+        if name not in self.procedures:
+            raise ValueError(f"Unknown procedure: {name}")
+        index, pure, parameters = self.procedures[name]
+        values = [self._get_value(argument) for argument in parts[3:]]
+        key = None
+        if pure:
+            # typed, so that f(1) and f(1.0) are cached apart
+            key = (name,) + tuple((type(value), value) for value in values)
+            result = self.call_cache.get(key)
+            if result is not MISSING:
+                self.temp_vars[parts[2]] = result
+                return
+        frame = self.frames.acquire()
+        frame.return_pc = self.pc
+        frame.dest = parts[2]
+        frame.memo_key = key
+        frame.caller_variables = self.variables
+        frame.caller_temps = self.temp_vars
+        frame.variables.update(zip(parameters, values))
+        self.variables = frame.variables
+        self.temp_vars = frame.temps
+        self.call_stack.append(frame)
+        self.pc = index
+
+    def _execute_ret(self, parts):
+        # RET [temp]; returning from the main program ends it
+        value = self._get_value(parts[1]) if len(parts) > 1 else 0
+        if not self.call_stack:
+            self.pc = len(self.program)
+            return
+        frame = self.call_stack.pop()
+        self.variables = frame.caller_variables
+        self.temp_vars = frame.caller_temps
+        self.temp_vars[frame.dest] = value
+        if frame.memo_key is not None:
+            self.call_cache.put(frame.memo_key, value)
+        self.pc = frame.return_pc
+        self.frames.release(frame)
+
+    def report_parallel(self, label, outcome):
+        self.parallel_report[label] = outcome
+
     def _execute_input(self, parts):
         # INPUT temp
         temp = parts[1]
-        user_input = input()
-        try:
-            value = int(user_input)
-        except ValueError:
-            try:
-                value = float(user_input)
-            except ValueError:
-                value = user_input.strip('"')
-        self.temp_vars[temp] = value
+        self.temp_vars[temp] = self._read_input()
+
+    def _read_input(self):
+        if self.inputs is not None:
+            if not self.inputs:
+                raise ValueError("No input left for in()")
+            return parse_input(self.inputs.popleft())
+        return parse_input(input())
 
     def _execute_binop(self, parts):
         # BINOP operator, left, right, temp
@@ -111,17 +514,8 @@ class Execute:
         self.temp_vars[temp] = result
 
     def _execute_load_const(self, parts):
-        # LOAD_CONST value, temp
-        value = parts[1].strip('"')
-        temp = parts[2]
-        if value.isdigit():
-            value = int(value)
-        else:
-            try:
-                value = float(value)
-            except ValueError:
-                pass
-        self.temp_vars[temp] = value
+        # LOAD_CONST value, temp (the value is parsed once by _decode)
+        self.temp_vars[parts[2]] = parts[1]
 
     def _execute_load(self, parts):
         # LOAD var_name, temp
@@ -129,9 +523,30 @@ class Execute:
         temp = parts[2]
         if var_name in self.variables:
             self.temp_vars[temp] = self.variables[var_name]
+        elif var_name in self.globals:
+            self.temp_vars[temp] = self.globals[var_name]
         else:
             raise ValueError(f"Variable not declared: {var_name}")
 
+    def _execute_load_text(self, parts):
+        # LOAD var_name, temp of a variable APPEND writes
+        self._execute_load(parts)
+        self.temp_vars[parts[2]] = strings.text(self.temp_vars[parts[2]])
+
+    def _execute_append(self, parts):
+        # APPEND var_name, temp: var_name = var_name + temp, without copying var_name when both are strings
+        name = parts[1]
+        variables = self.variables
+        if name not in variables:
+            if name not in self.globals:
+                raise ValueError(f"Variable not declared: {name}")
+            variables = self.globals
+        variables[name] = strings.append(variables[name], self._get_value(parts[2]))
+
+    def _execute_is_int(self, parts):
+        # IS_INT operand, temp: 1 if the operand holds an integer, a type guard (generator/unroll.py)
+        self.temp_vars[parts[2]] = 1 if type(self._get_value(parts[1])) is int else 0
+
     def _execute_shift_left(self, parts):
         # SHIFT_LEFT src, shift_amount, dest
         src = parts[1]
@@ -153,8 +568,10 @@ class Execute:
                 return self.temp_vars[operand]
             else:
                 raise ValueError(f"Operand not declared: {operand}")
+        elif operand in self.constants:
+            return self.constants[operand]
         elif operand in self.variables:
-            return self.variables[operand]
+            return strings.text(self.variables[operand])
         else:
             # Attempt to parse as constant
             try:
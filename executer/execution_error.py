@@ -0,0 +1,11 @@
+class ExecutionError(Exception):
+    def __init__(self, message, pc, line=None):
+        location = f"line {line}" if line else f"instruction {pc}"
+        super().__init__(f"ExecutionError: {message} ({location})")
+        self.message = message
+        self.pc = pc
+        self.line = line
+
+    def __reduce__(self):
+        # picklable, so that errors raised in worker processes reach the parent
+        return (type(self), (str(self.message), self.pc, self.line))
@@ -0,0 +1,178 @@
+"""
+Execution profiles for profile-guided optimization.
+
+ProfileRecorder runs a program like Execute.run and records, at every
+conditional jump, CALL and BINOP it executes, what the generator can use on the
+next compile of the same source (see "Profile-Guided Optimization" in
+generator/README.md). The counts are folded onto source lines through the
+source map, as IR indexes and label numbers change from one compile to the
+next:
+
+    branches  line -> [conditional jumps executed, times their operand was true],
+              [0, 0] for the lines whose conditional jumps never ran
+    calls     line -> CALLs executed
+    types     line -> {(operator, left operand type, right operand type)} of its BINOPs
+
+For a while loop whose condition has no and / or, the branch counts of its line
+give the trip counts: the condition was true once per iteration and false once
+per entry. Hot loops are interpreted while recording, so that every iteration is
+counted, and parallel loops run serially.
+
+A profile belongs to the source it was recorded from, whose fingerprint it
+holds. Profiles of the same source can be merged, to train on several inputs.
+The format is MAGIC, one VERSION byte, then a marshal dump of
+(source fingerprint, branches, calls, types), types as sorted lists.
+"""
+import marshal
+import zlib
+
+MAGIC = b"NUMERA-PROFILE"
+VERSION = 1
+
+
+def fingerprint(source):
+    return len(source), zlib.crc32(source.encode())
+
+
+class Profile:
+    def __init__(self, source, branches=None, calls=None, types=None):
+        self.source = source  # fingerprint of the source it was recorded from
+        self.branches = branches or {}
+        self.calls = calls or {}
+        self.types = types or {}
+        self.key = None  # checksum of the saved profile, set by load()
+
+    def report(self):
+        return (f"Profile: {len(self.branches)} lines with branches, {len(self.calls)} with calls, "
+                f"{len(self.types)} with operand types")
+
+    def matches(self, source):
+        return self.source == fingerprint(source)
+
+    def loop(self, line):
+        # (entries, iterations) of the while loop at line, None if the code run had no
+        # conditional jump there (a loop unrolled completely, say)
+        if line not in self.branches:
+            return None
+        executed, true = self.branches[line]
+        return executed - true, true
+
+    def calls_at(self, line):
+        return self.calls.get(line, 0)
+
+    def types_at(self, line, operator):
+        # {(left type, right type)} seen by the BINOPs of operator at line
+        return {(left, right) for seen, left, right in self.types.get(line, ()) if seen == operator}
+
+    def merge(self, other):
+        for line, (executed, true) in other.branches.items():
+            counts = self.branches.setdefault(line, [0, 0])
+            counts[0] += executed
+            counts[1] += true
+        for line, count in other.calls.items():
+            self.calls[line] = self.calls.get(line, 0) + count
+        for line, seen in other.types.items():
+            self.types.setdefault(line, set()).update(seen)
+
+
+def save(profile):
+    return MAGIC + bytes([VERSION]) + marshal.dumps(
+        (profile.source, profile.branches, profile.calls,
+         {line: sorted(seen) for line, seen in profile.types.items()}))
+
+def load(data):
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a Numera profile")
+    version = data[len(MAGIC)]
+    if version != VERSION:
+        raise ValueError(f"Unsupported profile version {version}, expected {VERSION}")
+    source, branches, calls, types = marshal.loads(data[len(MAGIC) + 1:])
+    profile = Profile(source, branches, calls, {line: set(seen) for line, seen in types.items()})
+    profile.key = zlib.crc32(data)
+    return profile
+
+
+class ProfileRecorder:
+    def __init__(self, executer):
+        self.executer = executer
+        self.branches = {}  # pc -> [executed, true]
+        self.calls = {}  # pc -> [executed]
+        self.types = {}  # pc -> {(operator, left type, right type)}
+
+    def branch(self, pc, method):
+        counts = self.branches[pc] = [0, 0]
+        get_value = self.executer._get_value
+
+        def record(parts):
+            counts[0] += 1
+            if get_value(parts[1]):
+                counts[1] += 1
+            method(parts)
+        return record
+
+    def call(self, pc, method):
+        counts = self.calls[pc] = [0]
+
+        def record(parts):
+            counts[0] += 1
+            method(parts)
+        return record
+
+    def binop(self, pc, method):
+        seen = self.types[pc] = set()
+        get_value = self.executer._get_value
+
+        def record(parts):
+            seen.add((parts[1], type(get_value(parts[2])).__name__, type(get_value(parts[3])).__name__))
+            method(parts)
+        return record
+
+    def instrument(self, pc, decoded):
+        if decoded is None:
+            return None
+        method, parts = decoded
+        if method == self.executer._execute_parallel_label:
+            return self.executer._execute_label, parts
+        if parts[0] in ("JUMP_IF_FALSE", "JUMP_IF_TRUE"):
+            return self.branch(pc, method), parts
+        if parts[0] == "CALL":
+            return self.call(pc, method), parts
+        if parts[0] == "BINOP":
+            return self.binop(pc, method), parts
+        return decoded
+
+    def run(self, source):
+        # runs the program to its end and returns its Profile
+        executer = self.executer
+        program = executer.program
+        jit_threshold, executer.jit_threshold = executer.jit_threshold, None
+        executer.program = [self.instrument(pc, decoded) for pc, decoded in enumerate(program)]
+        try:
+            executer.run()
+        finally:
+            executer.program = program
+            executer.jit_threshold = jit_threshold
+        return self.profile(source)
+
+    def profile(self, source):
+        source_map = self.executer.source_map
+        profile = Profile(fingerprint(source))
+
+        def line_of(pc):
+            return source_map[pc] if source_map is not None and pc < len(source_map) else 0
+
+        for pc, (executed, true) in self.branches.items():
+            line = line_of(pc)
+            if line:
+                counts = profile.branches.setdefault(line, [0, 0])
+                counts[0] += executed
+                counts[1] += true
+        for pc, (executed,) in self.calls.items():
+            line = line_of(pc)
+            if line and executed:
+                profile.calls[line] = profile.calls.get(line, 0) + executed
+        for pc, seen in self.types.items():
+            line = line_of(pc)
+            if line and seen:
+                profile.types.setdefault(line, set()).update(seen)
+        return profile
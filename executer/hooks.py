@@ -0,0 +1,118 @@
+"""
+Event hooks and breakpoints, for tracing and debugging a run.
+
+    executer.add_hook("store", lambda executer, pc, name, value: print(name, "=", value))
+    executer.add_breakpoint(line=12)
+    while executer.run() == BREAKPOINT:
+        print(executer.source_line(executer.pc), executer.variables)
+
+Callbacks get the executer and the index of the instruction, then:
+
+- "instruction": its split parts, before it runs;
+- "branch": whether a JUMP_IF_FALSE or JUMP_IF_TRUE jumped, after it ran;
+- "store": the variable or array element ("a[3]") written and its value, after
+  a STORE, an element store, an APPEND (the whole string) or a fill (the whole
+  array) ran;
+- "print": the value a PRINT prints, before it runs;
+- "back_edge": the index a jump went back to, after it ran.
+
+A breakpoint on an instruction index stops the run before that instruction, one
+on a source line before the first instruction of every run of instructions of
+that line. run() then returns BREAKPOINT with the pc at the instruction, and
+the next run() carries on from there; at the end of the program it returns DONE.
+
+Execute.run only checks once whether hooks are registered: when none are, it
+runs its usual loop, and hooks cost nothing. While some are, Hooks.run runs the
+program instead, one instruction at a time and without compiling loops or
+running them in parallel, so that every instruction is seen; a memoized
+region (executer/memo.py) runs as its first instruction.
+"""
+from .execution_error import ExecutionError
+from .executer import DONE
+from .strings import text
+
+EVENTS = ("instruction", "branch", "store", "print", "back_edge")
+BREAKPOINT = "breakpoint"  # what run() returns when it stopped at a breakpoint
+
+BRANCHES = ("JUMP_IF_FALSE", "JUMP_IF_TRUE")
+JUMPS = ("JUMP", "JUMP_IF_FALSE", "JUMP_IF_TRUE")
+ELEMENT_STORES = ("STORE_ELEM", "STORE_ELEM_UNCHECKED")
+STORES = ("STORE", "APPEND", "ARRAY_FILL") + ELEMENT_STORES
+
+
+class Hooks:
+    def __init__(self):
+        self.callbacks = {event: [] for event in EVENTS}
+        self.pcs = set()  # instruction indexes to break at
+        self.lines = set()  # source lines to break at
+        self.resuming = False  # run() was stopped at a breakpoint: the next instruction runs
+
+    def empty(self):
+        return not (self.pcs or self.lines or any(self.callbacks.values()))
+
+    def run(self, executer):
+        program = executer.program
+        callbacks = self.callbacks
+        on_instruction, on_branch, on_store, on_print, on_back_edge = (callbacks[event] for event in EVENTS)
+        pcs, lines = self.pcs, self.lines
+        source_map = executer.source_map
+        last_line = None
+        counted = executer.executed is not None
+        # compiled loops and parallel workers would run instructions the hooks do not see
+        jit_threshold, executer.jit_threshold = executer.jit_threshold, None
+        try:
+            while executer.pc < len(program):
+                pc = executer.pc
+                decoded = program[pc]
+                if decoded is not None:
+                    method, parts = decoded
+                    if lines:
+                        line = source_map[pc] if pc < len(source_map) else 0
+                        entered = line != last_line
+                        last_line = line
+                    if self.resuming:
+                        self.resuming = False
+                    elif pc in pcs or (lines and entered and line in lines):
+                        self.resuming = True
+                        return BREAKPOINT
+                    if not method:
+                        raise ValueError(f"Unknown method: {parts[0]}")
+                    if method == executer._execute_parallel_label:
+                        method = executer._execute_label
+                    op = parts[0]
+                    for callback in on_instruction:
+                        callback(executer, pc, parts)
+                    if op == "PRINT" and on_print:
+                        value = executer._get_value(parts[1])
+                        for callback in on_print:
+                            callback(executer, pc, value)
+                    if counted:
+                        executer.executed += 1
+                    method(parts)
+                    if op in JUMPS:
+                        if op in BRANCHES:
+                            for callback in on_branch:
+                                callback(executer, pc, executer.pc != pc)
+                        if executer.pc < pc:
+                            for callback in on_back_edge:
+                                callback(executer, pc, executer.pc)
+                    elif on_store and op in STORES:
+                        self.stored(executer, pc, parts)
+                executer.pc += 1
+            return DONE
+        except Exception as e:
+            raise ExecutionError(e, executer.pc, executer.source_line(executer.pc)) from e
+        finally:
+            executer.jit_threshold = jit_threshold
+
+    def stored(self, executer, pc, parts):
+        op = parts[0]
+        if op in ELEMENT_STORES:
+            name = f"{parts[2]}[{executer._get_value(parts[3])}]"
+            value = executer._get_value(parts[1])
+        else:
+            name = parts[2] if op == "STORE" else parts[1]  # APPEND and ARRAY_FILL name it first
+            variables = executer.variables if name in executer.variables else executer.globals
+            value = text(variables[name])  # APPEND leaves a StringBuilder
+        for callback in self.callbacks["store"]:
+            callback(executer, pc, name, value)
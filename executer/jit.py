@@ -0,0 +1,293 @@
+"""
+Tier-two execution of hot loops.
+
+Execute counts the backward JUMPs taken to every loop header. Once a loop has
+been entered JIT_THRESHOLD times, compile_loop translates the instructions
+between its header label and the back edge into the source of one Python
+function, compiles it with compile() and caches it on the executer. The
+function keeps variables and temps in Python locals, runs until control leaves
+the region and returns the index of the label it left through, so the
+interpreter carries on from there.
+
+    LABEL start_label_1          def loop(ex, variables, temps):
+    LOAD i, t1                       v0 = variables['i']
+    BINOP <, t1, k1, t1              block = 0
+    JUMP_IF_FALSE t1, end_label_1    while True:
+    ...                                  if block == 0:
+    JUMP start_label_1                       t1 = v0
+    LABEL end_label_1                        t1 = 1 if t1 < 10 else 0
+                                             if not t1:
+                                                 return 9
+                                             ...
+
+A compiled loop assumes that every variable it reads has been declared; it is
+checked on every entry, and a loop whose guard fails is dropped from the cache
+and interpreted again. Regions using an instruction or operator the
+interpreter would reject are never compiled.
+"""
+from . import arrays, strings
+
+JIT_THRESHOLD = 50
+
+BINARY = {"+": "{l} + {r}", "-": "{l} - {r}", "*": "{l} * {r}", "/": "{l} / {r}",
+          "==": "1 if {l} == {r} else 0", "!=": "1 if {l} != {r} else 0",
+          "<": "1 if {l} < {r} else 0", "<=": "1 if {l} <= {r} else 0",
+          ">": "1 if {l} > {r} else 0", ">=": "1 if {l} >= {r} else 0"}
+UNARY = {"-": "-{x}", "!": "1 if not {x} else 0", "not": "1 if not {x} else 0"}
+SUPPORTED = {"ALLOC", "LOAD", "LOAD_CONST", "STORE", "BINOP", "UNARY", "PRINT", "INPUT",
+             "JUMP", "JUMP_IF_FALSE", "JUMP_IF_TRUE", "LABEL", "SHIFT_LEFT", "ALLOC_ARRAY",
+             "LOAD_ELEM", "LOAD_ELEM_UNCHECKED", "STORE_ELEM", "STORE_ELEM_UNCHECKED",
+             "ARRAY_REDUCE", "ARRAY_FILL", "CHECK_RANGE", "APPEND", "IS_INT"}
+# helpers the generated code calls
+NAMESPACE = {"new_array": arrays.new_array, "load": arrays.load, "store": arrays.store,
+             "store_checked": arrays.store_checked, "in_range": arrays.in_range,
+             "fill": arrays.fill, "reduce_array": arrays.reduce_array,
+             "text": strings.text, "append": strings.append}
+
+
+class Unsupported(Exception):
+    # an instruction of the region that the translator cannot compile
+    pass
+
+
+class CompiledLoop:
+    def __init__(self, function, names, source, sliced):
+        self.function = function
+        self.names = names  # variables that must exist on entry
+        self.source = source
+        self.sliced = sliced  # compiled for run_for: gives control back when the slice is used up
+
+    def guard(self, variables):
+        return self.names <= variables.keys()
+
+    def __call__(self, executer):
+        return self.function(executer, executer.variables, executer.temp_vars)
+
+
+def shift_left(value, bits):
+    if not isinstance(value, int):
+        raise TypeError(f"SHIFT_LEFT operation requires integer operands, got {type(value)}")
+    return value << bits
+
+def operand_literal(operand):
+    # the value _get_value gives an operand that is neither a temp, a constant nor a variable
+    try:
+        if '.' in operand:
+            return float(operand)
+        return int(operand)
+    except ValueError:
+        return operand.strip('"')
+
+
+class LoopTranslator:
+    def __init__(self, executer, start, end):
+        self.executer = executer
+        self.start = start
+        self.end = end  # index of the back edge
+        self.variables = {}
+        self.temps = set()
+        self.writes = set()
+
+    def variable(self, name, write=False):
+        if name not in self.variables:
+            self.variables[name] = f"v{len(self.variables)}"
+        if write:
+            self.writes.add(name)
+        return self.variables[name]
+
+    def temp(self, name):
+        if not name.isidentifier():
+            raise Unsupported(f"temp {name}")
+        self.temps.add(name)
+        return f"_{name}"
+
+    def operand(self, text):
+        # mirrors Execute._get_value
+        if text.startswith('t'):
+            return self.temp(text)
+        if text in self.executer.constants:
+            return repr(self.executer.constants[text])
+        if text in self.executer.variables:
+            if text in self.executer.appended:
+                return f"text({self.variable(text)})"
+            return self.variable(text)
+        return repr(operand_literal(text))
+
+    def target(self, label):
+        index = self.executer.labels.get(label)
+        if index is None:
+            raise Unsupported(f"unknown label {label}")
+        return index
+
+    def statement(self, parts):
+        op = parts[0]
+        if op not in SUPPORTED:
+            raise Unsupported(op)
+        if op == "ALLOC":
+            return [f"{self.variable(parts[1], write=True)} = 0"]
+        if op == "LOAD":
+            if parts[1] in self.executer.appended:
+                return [f"{self.temp(parts[2])} = text({self.variable(parts[1])})"]
+            return [f"{self.temp(parts[2])} = {self.variable(parts[1])}"]
+        if op == "LOAD_CONST":
+            return [f"{self.temp(parts[2])} = {parts[1]!r}"]
+        if op == "STORE":
+            value = self.operand(parts[1])
+            return [f"{self.variable(parts[2], write=True)} = {value}"]
+        if op == "BINOP":
+            if parts[1] not in BINARY:
+                raise Unsupported(f"operator {parts[1]}")
+            expr = BINARY[parts[1]].format(l=self.operand(parts[2]), r=self.operand(parts[3]))
+            return [f"{self.temp(parts[4])} = {expr}"]
+        if op == "UNARY":
+            if parts[1] not in UNARY:
+                raise Unsupported(f"operator {parts[1]}")
+            expr = UNARY[parts[1]].format(x=self.operand(parts[2]))
+            return [f"{self.temp(parts[3])} = {expr}"]
+        if op == "SHIFT_LEFT":
+            return [f"{self.temp(parts[3])} = shift_left({self.operand(parts[1])}, {int(parts[2])})"]
+        if op == "IS_INT":
+            return [f"{self.temp(parts[2])} = 1 if type({self.operand(parts[1])}) is int else 0"]
+        if op == "PRINT":
+            return [f"print({self.operand(parts[1])})"]
+        if op == "INPUT":
+            return [f"{self.temp(parts[1])} = ex._read_input()"]
+        if op == "ALLOC_ARRAY":
+            return [f"{self.variable(parts[1], write=True)} = new_array({int(parts[2])})"]
+        if op == "LOAD_ELEM":
+            return [f"{self.temp(parts[3])} = load({self.variable(parts[1])}, {self.operand(parts[2])}, {parts[1]!r})"]
+        if op == "LOAD_ELEM_UNCHECKED":
+            return [f"{self.temp(parts[3])} = {self.variable(parts[1])}[{self.operand(parts[2])}]"]
+        if op == "STORE_ELEM":
+            values = self.variable(parts[2], write=True)
+            return [f"{values} = store_checked({values}, {self.operand(parts[3])}, {self.operand(parts[1])}, {parts[2]!r})"]
+        if op == "STORE_ELEM_UNCHECKED":
+            values = self.variable(parts[2], write=True)
+            value, index = self.operand(parts[1]), self.operand(parts[3])
+            # a number the array holds as it is needs no conversion; store() converts
+            # it for a float, and fails as the interpreter does for anything else
+            return ["try:", f"    {values}[{index}] = {value}",
+                    "except (TypeError, OverflowError):", f"    {values} = store({values}, {index}, {value})"]
+        if op == "APPEND":
+            value = self.operand(parts[2])
+            target = self.variable(parts[1], write=True)
+            return [f"{target} = append({target}, {value})"]
+        if op == "ARRAY_REDUCE":
+            return [f"{self.temp(parts[3])} = reduce_array({parts[1]!r}, {self.variable(parts[2])}, {parts[2]!r})"]
+        if op == "ARRAY_FILL":
+            values = self.variable(parts[1], write=True)
+            return [f"{values} = fill({values}, {self.operand(parts[2])}, {parts[1]!r})"]
+        return []
+
+    def translate(self):
+        program = self.executer.program
+        start, end = self.start, self.end
+        leaders = {start}
+        for index in range(start, end + 1):
+            decoded = program[index]
+            if decoded is None:
+                continue
+            op = decoded[1][0]
+            if op == "LABEL":
+                leaders.add(index)
+            elif op in ("JUMP", "JUMP_IF_FALSE", "JUMP_IF_TRUE", "CHECK_RANGE"):
+                leaders.add(index + 1)
+        starts = sorted(leader for leader in leaders if leader <= end)
+        block_of = {index: block for block, index in enumerate(starts)}
+
+        # when the executer counts instructions, every block adds the ones it ran
+        # before each exit to ex.executed; under run_for it also takes them from
+        # ex.slice_left, and a backward jump leaves the region once that is used up
+        counting = self.executer.executed is not None
+        slicing = self.executer.slice_left is not None
+        pending = 0
+
+        def goto(index, indent, backward=False):
+            # jump to the block at index, or leave the region through the label there
+            if index in block_of and start <= index <= end:
+                lines = [f"{indent}if ex.slice_left <= 0:", f"{indent}    return {index}"] if slicing and backward else []
+                return lines + [f"{indent}block = {block_of[index]}", f"{indent}continue"]
+            return [f"{indent}return {index}"]
+
+        def count(indent):
+            nonlocal pending
+            lines = []
+            if pending:
+                if counting:
+                    lines.append(f"{indent}ex.executed += {pending}")
+                if slicing:
+                    lines.append(f"{indent}ex.slice_left -= {pending}")
+            pending = 0
+            return lines
+
+        body = []
+        for block, first in enumerate(starts):
+            last = starts[block + 1] if block + 1 < len(starts) else end + 1
+            body.append(f"            {'if' if block == 0 else 'elif'} block == {block}:")
+            body.append("                pc = " + str(first))
+            falls_through = True
+            for index in range(first, last):
+                decoded = program[index]
+                if decoded is None:
+                    continue
+                parts = decoded[1]
+                # the interpreter only executes a label it falls through to, not one it jumps to
+                if not (index == first and parts[0] == "LABEL"):
+                    pending += 1
+                if parts[0] in ("JUMP", "JUMP_IF_FALSE", "JUMP_IF_TRUE", "CHECK_RANGE"):
+                    body.extend(count("                "))
+                if parts[0] == "JUMP":
+                    target = self.target(parts[1])
+                    body.extend(goto(target, "                ", target <= first))
+                    falls_through = False
+                elif parts[0] == "JUMP_IF_FALSE":
+                    target = self.target(parts[2])
+                    body.append(f"                if not {self.operand(parts[1])}:")
+                    body.extend(goto(target, "                    ", target <= first))
+                elif parts[0] == "JUMP_IF_TRUE":
+                    target = self.target(parts[2])
+                    body.append(f"                if {self.operand(parts[1])}:")
+                    body.extend(goto(target, "                    ", target <= first))
+                elif parts[0] == "CHECK_RANGE":
+                    values = self.variable(parts[1])
+                    target = self.target(parts[4])
+                    body.append(f"                if not in_range({values}, {self.operand(parts[2])}, "
+                                f"{self.operand(parts[3])}):")
+                    body.extend(goto(target, "                    ", target <= first))
+                else:
+                    body.extend("                " + line for line in self.statement(parts))
+            if falls_through and last <= end and program[last] is not None and program[last][1][0] == "LABEL":
+                pending += 1
+            body.extend(count("                "))
+            if falls_through:
+                # past a conditional back edge: carry on after it, in the interpreter
+                body.extend(goto(last, "                ") if last <= end else [f"                return {end}"])
+
+        # variables only written in the region still get their old value in case
+        # the region is left before the write
+        names = sorted(self.variables.items(), key=lambda item: item[1])
+        prologue = [f"    {local} = variables[{name!r}]" for name, local in names]
+        prologue += [f"    _{temp} = temps.get({temp!r})" for temp in sorted(self.temps)]
+        epilogue = [f"        variables[{name!r}] = {self.variables[name]}" for name in sorted(self.writes)]
+        epilogue += [f"        temps[{temp!r}] = _{temp}" for temp in sorted(self.temps)]
+        lines = (["def loop(ex, variables, temps):"] + prologue +
+                 ["    block = 0", "    pc = " + str(start), "    try:", "        while True:"] +
+                 body +
+                 ["    except Exception:", "        ex.pc = pc", "        raise",
+                  "    finally:"] + (epilogue or ["        pass"]))
+        return "\n".join(lines) + "\n"
+
+
+def compile_loop(executer, start, end):
+    # returns a CompiledLoop for the region [start, end], or None if it cannot be compiled
+    translator = LoopTranslator(executer, start, end)
+    try:
+        source = translator.translate()
+    except Unsupported:
+        return None
+    names = set(translator.variables)
+    if not names <= executer.variables.keys():
+        return None
+    namespace = dict(NAMESPACE, shift_left=shift_left)
+    exec(compile(source, f"<loop {start}-{end}>", "exec"), namespace)
+    return CompiledLoop(namespace["loop"], names, source, executer.slice_left is not None)
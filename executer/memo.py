@@ -0,0 +1,276 @@
+"""
+Memoization of pure code regions, for Execute(code, memoize=True).
+
+A region is a run of basic blocks (generator/cfg.basic_blocks) that only loads,
+stores and computes: no PRINT, INPUT, CALL, RET, array or string building
+instruction. Control enters it only at its first block and leaves it only for
+the instruction after its last one, and it has no back edge, so what it does
+is decided by the values it reads: the variables and temps some path through
+it reads before writing them (a must-write analysis over its blocks). Regions
+of at least MEMO_MIN_INSTRUCTIONS instructions inside a loop or a procedure are
+memoized:
+
+- the first instruction of the region is replaced by a handler that looks the
+  values it reads up in the region's LRU of MEMO_CACHE_SIZE entries;
+- on a hit, the variable writes of that run are replayed in order, the temps it
+  wrote get their values and the run carries on where it left the region;
+- on a miss, the region is interpreted as usual while its writes are recorded.
+
+Only ints, floats and strings are looked up, typed so that 1 and 1.0 are
+cached apart; anything else runs the region uncached. Every MEMO_PROBATION
+lookups the hit rate of the region is checked, and a region below
+MEMO_MIN_HIT_RATE gets its original instruction back and its cache dropped.
+Loops the JIT compiles run their own code and do not use the regions, and
+run_for interprets them uncached so that each instruction counts against its
+slice.
+"""
+from generator.cfg import basic_blocks, is_temp, temp_def, use_positions
+from .calls import MISSING, CallCache
+
+MEMO_CACHE_SIZE = 256
+MEMO_MIN_INSTRUCTIONS = 8
+MEMO_PROBATION = 64
+MEMO_MIN_HIT_RATE = 0.5
+
+PURE_OPS = {"ALLOC", "LOAD", "LOAD_CONST", "STORE", "BINOP", "UNARY", "IS_INT", "SHIFT_LEFT",
+            "LABEL", "JUMP", "JUMP_IF_FALSE", "JUMP_IF_TRUE"}
+VALUE_TYPES = (int, float, str)
+
+
+class Region:
+    __slots__ = ("start", "end", "size", "variables", "temps", "method", "cache", "window", "active")
+
+    def __init__(self, start, end, size, variables, temps, method):
+        self.start = start
+        self.end = end  # index of the instruction after the region
+        self.size = size  # instructions, without labels
+        self.variables = variables  # variables the region may read before writing them
+        self.temps = temps  # the same for temps
+        self.method = method  # handler of its first instruction
+        self.cache = CallCache(MEMO_CACHE_SIZE)  # key -> (variable writes, temp values, pc after the region)
+        self.window = [0, 0]  # lookups and hits since the hit rate was last checked
+        self.active = True
+
+    def key(self, executer):
+        # the typed values the region reads, None if one of them cannot be cached
+        variables, globals_, temps = executer.variables, executer.globals, executer.temp_vars
+        values = []
+        for name in self.variables:
+            value = variables[name] if name in variables else globals_.get(name, MISSING)
+            if value is not MISSING and type(value) not in VALUE_TYPES:
+                return None
+            values.append((type(value), value))
+        for temp in self.temps:
+            value = temps.get(temp, MISSING)
+            if value is not MISSING and type(value) not in VALUE_TYPES:
+                return None
+            values.append((type(value), value))
+        return tuple(values)
+
+
+def operand_reads(parts, constants):
+    # (variables, temps) an instruction reads
+    variables, temps = [], []
+    if parts[0] == "LOAD":
+        variables.append(parts[1])
+    for index in use_positions(parts):
+        operand = parts[index]
+        if is_temp(operand):
+            temps.append(operand)
+        elif operand not in constants and operand.isidentifier():
+            variables.append(operand)  # as _get_value reads it
+    return variables, temps
+
+def operand_writes(parts):
+    # (variable, temp) an instruction writes, either None
+    variable = parts[2] if parts[0] == "STORE" else parts[1] if parts[0] == "ALLOC" else None
+    return variable, temp_def(parts)
+
+
+def find_regions(executer):
+    # [(start, end, size, variables read, temps read)] of the regions worth memoizing
+    program = executer.program
+    parsed = [decoded[1] if decoded is not None else None for decoded in program]
+    blocks, successors = basic_blocks(parsed)
+    predecessors = [[] for _ in blocks]
+    for block, targets in enumerate(successors):
+        for target in targets:
+            predecessors[target].append(block)
+
+    def pure(block):
+        start, end = blocks[block]
+        for parts in parsed[start:end]:
+            if parts is None:
+                continue
+            if parts[0] not in PURE_OPS or (parts[0] == "LOAD" and parts[1] in executer.appended):
+                return False
+        return all(target > block for target in successors[block])
+
+    # instructions inside a loop (between a back edge and its target) or a procedure
+    repeated = bytearray(len(parsed))
+    for block, targets in enumerate(successors):
+        for target in targets:
+            if target <= block:
+                repeated[blocks[target][0]:blocks[block][1]] = b"\1" * (blocks[block][1] - blocks[target][0])
+    first_procedure = next((index for index, parts in enumerate(parsed) if parts and parts[0] == "PROC"),
+                           len(parsed))
+    repeated[first_procedure:] = b"\1" * (len(parsed) - first_procedure)
+
+    regions = []
+    first = 0
+    while first < len(blocks):
+        last = None  # last block of the largest region starting at first
+        reach = first  # furthest successor of the blocks so far
+        block = first
+        while block < len(blocks) and pure(block):
+            if block > first and any(source < first or source > block for source in predecessors[block]):
+                break
+            reach = max([reach] + successors[block])
+            if reach <= block + 1:
+                last = block
+            block += 1
+        if last is None:
+            first += 1
+            continue
+        start, end = blocks[first][0], blocks[last][1]
+        while start < end and (parsed[start] is None or parsed[start][0] == "LABEL"):
+            start += 1
+        size = sum(1 for parts in parsed[start:end] if parts is not None and parts[0] != "LABEL")
+        if size >= MEMO_MIN_INSTRUCTIONS and repeated[start]:
+            regions.append((start, end, size) + region_reads(parsed, blocks, predecessors, first, last,
+                                                             executer.constants))
+        first = last + 1
+    return regions
+
+def region_reads(parsed, blocks, predecessors, first, last, constants):
+    # (variables, temps) some path through blocks first..last reads before writing them
+    written = {}  # block -> (variables, temps) written on every path to its end
+    variables, temps = {}, {}  # in the order first read, as dict keys
+    for block in range(first, last + 1):
+        if block == first:
+            known_variables, known_temps = set(), set()
+        else:
+            incoming = [written[source] for source in predecessors[block]]
+            known_variables = set.intersection(*[set(v) for v, _ in incoming]) if incoming else set()
+            known_temps = set.intersection(*[set(t) for _, t in incoming]) if incoming else set()
+        start, end = blocks[block]
+        for parts in parsed[start:end]:
+            if parts is None:
+                continue
+            read_variables, read_temps = operand_reads(parts, constants)
+            for name in read_variables:
+                if name not in known_variables:
+                    variables[name] = None
+            for temp in read_temps:
+                if temp not in known_temps:
+                    temps[temp] = None
+            variable, temp = operand_writes(parts)
+            if variable is not None:
+                known_variables.add(variable)
+            if temp is not None:
+                known_temps.add(temp)
+        written[block] = (known_variables, known_temps)
+    return tuple(variables), tuple(temps)
+
+
+class BlockMemo:
+    def __init__(self, executer):
+        self.executer = executer
+        self.regions = []
+        self.turned_off = 0
+
+    def install(self):
+        # replaces the first instruction of every region found by its handler
+        program = self.executer.program
+        for start, end, size, variables, temps in find_regions(self.executer):
+            method, parts = program[start]
+            region = Region(start, end, size, variables, temps, method)
+            self.regions.append(region)
+            program[start] = (self.handler(region), parts)
+
+    def stats(self):
+        return {"regions": len(self.regions), "hits": sum(region.cache.hits for region in self.regions),
+                "misses": sum(region.cache.misses for region in self.regions), "turned_off": self.turned_off}
+
+    def report(self):
+        stats = self.stats()
+        return (f"Memoized blocks: {stats['regions']} regions, {stats['hits']} hits, "
+                f"{stats['misses']} misses, {stats['turned_off']} turned off for a low hit rate")
+
+    def handler(self, region):
+        executer = self.executer
+
+        def enter(parts):
+            if not region.active or executer.slice_left is not None:
+                return region.method(parts)  # run_for counts each instruction against its slice
+            key = region.key(executer)
+            entry = region.cache.get(key) if key is not None else MISSING
+            window = region.window
+            window[0] += 1
+            if entry is not MISSING:
+                window[1] += 1
+                self.replay(entry)
+            else:
+                if key is None:
+                    region.cache.misses += 1
+                entry = self.interpret(region, parts)
+                if key is not None:
+                    region.cache.put(key, entry)
+            if window[0] >= MEMO_PROBATION:
+                self.check(region)
+            executer.pc = entry[2] - 1  # run() moves on to the next instruction
+        return enter
+
+    def interpret(self, region, parts):
+        # runs the region from its first instruction; returns what a hit replays
+        executer = self.executer
+        program = executer.program
+        end = region.end
+        writes = []  # (variable, value, whether ALLOC declared it)
+        temps = {}
+        method = region.method
+        ran = 0
+        while True:
+            method(parts)
+            ran += 1
+            op = parts[0]
+            if op == "STORE":
+                writes.append((parts[2], executer._get_value(parts[1]), False))
+            elif op == "ALLOC":
+                writes.append((parts[1], 0, True))
+            else:
+                _, temp = operand_writes(parts)
+                if temp is not None:
+                    temps[temp] = None
+            # jumps only lead forward, to the region or the instruction after it
+            executer.pc += 1
+            while executer.pc < end and program[executer.pc] is None:
+                executer.pc += 1
+            if executer.pc >= end:
+                break
+            method, parts = program[executer.pc]
+        if executer.executed is not None:
+            executer.executed += ran - 1  # run() counts the first
+        values = executer.temp_vars
+        return writes, [(temp, values[temp]) for temp in temps], executer.pc
+
+    def replay(self, entry):
+        executer = self.executer
+        writes, temps, _ = entry
+        for name, value, declared in writes:
+            variables = executer.variables
+            if not declared and name not in variables and name in executer.globals:
+                variables = executer.globals  # as _execute_store
+            variables[name] = value
+        executer.temp_vars.update(temps)
+
+    def check(self, region):
+        # turns a region whose recent hits do not pay for its lookups off
+        lookups, hits = region.window
+        if hits < lookups * MEMO_MIN_HIT_RATE:
+            region.active = False
+            region.cache.entries.clear()
+            program = self.executer.program
+            program[region.start] = (region.method, program[region.start][1])
+            self.turned_off += 1
+        region.window = [0, 0]
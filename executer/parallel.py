@@ -0,0 +1,118 @@
+"""
+Chunked execution of loops that generator/parallel.py found free of
+loop-carried dependencies.
+
+When the executer reaches the header label of such a loop it computes the trip
+count from the current counter and bound. Large loops are split into one
+contiguous range of iterations per worker process. Each worker runs the
+unchanged loop code for its range: its copy of the header comparison is
+retargeted to the end of the range, and reductions start from their identity.
+The parent then folds the partial results in range order, so the outcome does
+not depend on scheduling, and resumes after the loop.
+
+Anything unexpected (a worker error, a non-integer counter or reduction) makes
+the loop run serially instead; the reason is kept in Execute.parallel_report.
+Float reductions are rejected because splitting a sum reorders its additions.
+"""
+PARALLEL_MIN_TRIPS = 100000
+IDENTITIES = {"+": 0, "*": 1}
+STOP = "_stop"  # operand the retargeted header compares the counter with
+
+
+def trip_count(first, bound, operator, step):
+    # iterations of for (i = first; i <operator> bound; i += step)
+    if operator in ("<=", ">="):
+        bound += 1 if step > 0 else -1
+    distance = bound - first
+    if distance * step <= 0:
+        return 0
+    return -(-abs(distance) // abs(step))
+
+def find_header(executer, start):
+    # (index of the comparison, index of the end label) of the loop whose header is at start
+    program = executer.program
+    for index in range(start + 1, len(program)):
+        decoded = program[index]
+        if decoded is None:
+            continue
+        parts = decoded[1]
+        if parts[0] == "JUMP_IF_FALSE":
+            previous = program[index - 1]
+            if previous is None or previous[1][0] != "BINOP" or previous[1][4] != parts[1]:
+                return None
+            return index - 1, executer.labels[parts[2]]
+        if parts[0] not in ("LOAD", "LOAD_CONST", "BINOP", "UNARY"):
+            return None
+    return None
+
+def run_chunk(code, start, compare, end, first, stop, step, variables, temps, loop, counted):
+    # worker: runs the iterations from first up to (not including) stop
+    from .executer import Execute
+    executer = Execute(code, count_instructions=counted)
+    method, parts = executer.program[compare]
+    executer.program[compare] = (method, ["BINOP", "<" if step > 0 else ">", parts[2], STOP, parts[4]])
+    executer.constants[STOP] = stop
+    executer.variables = executer.globals = variables
+    executer.temp_vars = temps
+    variables[loop.counter] = first
+    for name, operator in loop.reductions.items():
+        variables[name] = IDENTITIES[operator]
+    if end + 1 < len(executer.program):
+        # stop where the loop exits; calls jump past it, so no index bound would do
+        executer.program[end + 1] = (executer._execute_ret, ["RET"])
+    executer.pc = start
+    executer.run()
+    return ({name: variables[name] for name in loop.reductions},
+            {name: variables[name] for name in loop.privates if name in variables},
+            executer.executed)
+
+
+def run_parallel(executer, label, loop):
+    # returns the index of the loop's end label once it has run, None to run it serially
+    variables = executer.variables
+    first = variables.get(loop.counter)
+    bound = loop.bound if isinstance(loop.bound, int) else variables.get(loop.bound)
+    if type(first) is not int or type(bound) is not int:
+        return executer.report_parallel(label, "counter or bound is not an integer")
+    trips = trip_count(first, bound, loop.operator, loop.step)
+    if trips < PARALLEL_MIN_TRIPS:
+        return executer.report_parallel(label, f"{trips} iterations, fewer than {PARALLEL_MIN_TRIPS}")
+    workers = min(executer.parallel_workers, trips)
+    if workers < 2:
+        return executer.report_parallel(label, "only one worker available")
+    start = executer.labels[label]
+    header = find_header(executer, start)
+    if header is None:
+        return executer.report_parallel(label, "loop header not recognized")
+    compare, end = header
+
+    # imported here: concurrent.futures takes longer to load than most loops take to run
+    from concurrent.futures import ProcessPoolExecutor
+    bounds = [trips * worker // workers for worker in range(workers + 1)]
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(run_chunk, executer.code, start, compare, end,
+                                   first + bounds[i] * loop.step, first + bounds[i + 1] * loop.step,
+                                   loop.step, dict(variables), dict(executer.temp_vars), loop,
+                                   executer.executed is not None)
+                       for i in range(workers)]
+            results = [future.result() for future in futures]
+    except Exception as e:
+        return executer.report_parallel(label, f"a worker failed ({e})")
+
+    merged = {}
+    for name, operator in loop.reductions.items():
+        values = [variables[name]] + [partials[name] for partials, _, _ in results]
+        if any(type(value) is not int for value in values):
+            return executer.report_parallel(label, f"reduction {name} is not an integer")
+        total = values[0]
+        for value in values[1:]:
+            total = total + value if operator == "+" else total * value
+        merged[name] = total
+    variables.update(merged)
+    if executer.executed is not None:
+        executer.executed += sum(executed for _, _, executed in results)
+    variables.update(results[-1][1])
+    variables[loop.counter] = first + trips * loop.step
+    executer.report_parallel(label, f"{trips} iterations in {workers} processes")
+    return end
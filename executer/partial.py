@@ -0,0 +1,188 @@
+"""
+Partial evaluation of generated code at compile time.
+
+PartialEvaluator runs the code like Execute, with the values of --bind-input
+as the answers to the first in() calls, and stops before the first instruction
+whose result is not known yet: an INPUT with no bound value left. It also
+stops when PARTIAL_EVAL_BUDGET instructions have run, or before an instruction
+that fails, so that the failure happens when the program runs. The residual
+code it leaves is
+
+    PRINT k8                    the output printed so far
+    STORE k9, x                 the variables and temps at the stopping point
+    LOAD_CONST 3, t2
+    JUMP resume_label
+    ...                         the original code that can still run, with
+    LABEL resume_label          a label where evaluation stopped
+    INPUT t1
+    ...
+
+The JUMP is left out when none of the code before the label can still run.
+A program that runs to its end within the budget compiles to its output
+alone. Evaluation only stops in the main program: if it would stop inside a
+procedure call, the call is undone and the residual code starts with it.
+"""
+from array import array
+from collections import deque
+
+from generator.literals import format_literal
+from .executer import Execute
+from .strings import StringBuilder, text
+from .calls import FramePool
+
+PARTIAL_EVAL_BUDGET = 1000000
+RESUME_LABEL = "resume_label"
+
+
+def copy_value(value):
+    # a copy of a variable's value that later writes to the original do not change
+    if type(value) is array:
+        return array(value.typecode, value)
+    if type(value) is StringBuilder:
+        return text(value)
+    return value
+
+
+class Residual:
+    def __init__(self, code, source_map, output, executed, stopped):
+        self.code = code
+        self.source_map = source_map
+        self.output = output  # lines printed at compile time
+        self.executed = executed  # instructions run at compile time
+        self.stopped = stopped  # why evaluation stopped, None if the program ran to its end
+
+    def report(self):
+        instructions = len(self.source_map)
+        outcome = f"stopped: {self.stopped}" if self.stopped else "ran to its end"
+        return (f"Partially evaluated: {self.executed} instructions run at compile time, "
+                f"{len(self.output)} output lines precomputed, {outcome}, "
+                f"{instructions} residual instructions")
+
+
+class PartialEvaluator(Execute):
+    def __init__(self, code, inputs=(), budget=PARTIAL_EVAL_BUDGET):
+        # no compiled or parallel loops: evaluation has to be able to stop at any instruction
+        super().__init__(code, jit_threshold=None, inputs=inputs)
+        self.budget = budget
+        self.output = []
+        self.evaluated = 0
+        self.before_call = None  # state before the call the main program is in
+
+    def _execute_print(self, parts):
+        self.output.append(str(self._get_value(parts[1])))
+
+    def evaluate(self):
+        # runs until the program ends or the next instruction cannot be evaluated;
+        # returns why it stopped, None if it ended
+        program = self.program
+        while self.pc < len(program):
+            decoded = program[self.pc]
+            if decoded is None:
+                self.pc += 1
+                continue
+            method, parts = decoded
+            if parts[0] == "INPUT" and not self.inputs:
+                return self.stop("needs input")
+            if self.evaluated >= self.budget:
+                return self.stop(f"budget of {self.budget} instructions used")
+            if method is None:
+                return self.stop(f"unknown instruction {parts[0]}")
+            if parts[0] == "CALL" and not self.call_stack:
+                self.save_call_state()
+            try:
+                method(parts)
+            except Exception as e:
+                return self.stop(f"fails at run time ({e})")
+            self.evaluated += 1
+            self.pc += 1
+        return None
+
+    def save_call_state(self):
+        self.before_call = (self.pc, {name: copy_value(value) for name, value in self.variables.items()},
+                         dict(self.temp_vars), len(self.output), deque(self.inputs))
+
+    def stop(self, reason):
+        if self.call_stack:
+            # back to before the outermost call
+            self.pc, variables, self.temp_vars, printed, inputs = self.before_call
+            self.variables = self.globals = variables
+            del self.output[printed:]
+            self.inputs = inputs
+            self.call_stack = []
+            self.frames = FramePool()
+        return reason
+
+
+def reachable(parsed):
+    # indexes of the instructions control can reach from the first one
+    from generator.cfg import basic_blocks
+    blocks, successors = basic_blocks(parsed)
+    block_of = {start: block for block, (start, _) in enumerate(blocks)}
+    procedures = {tokens[1]: block_of[index] for index, tokens in enumerate(parsed)
+                  if tokens and tokens[0] == "PROC"}
+    seen = {0} if blocks else set()
+    stack = list(seen)
+    while stack:
+        block = stack.pop()
+        start, end = blocks[block]
+        targets = list(successors[block])
+        targets += [procedures[tokens[1]] for tokens in parsed[start:end]
+                    if tokens and tokens[0] == "CALL" and tokens[1] in procedures]
+        for target in targets:
+            if target not in seen:
+                seen.add(target)
+                stack.append(target)
+    return {index for block in seen for index in range(*blocks[block])}
+
+
+def partial_evaluate(code, source_map=None, inputs=(), budget=PARTIAL_EVAL_BUDGET):
+    # returns the Residual of code with inputs bound to its first in() calls
+    evaluator = PartialEvaluator(code, inputs, budget)
+    stopped = evaluator.evaluate()
+
+    pool = [line for line in code.split("\n") if line.startswith("CONST ")]
+    constant_ids = {}
+    for name, value in evaluator.constants.items():
+        constant_ids.setdefault((type(value), value), name)
+
+    def constant(value):
+        key = (type(value), value)
+        if key not in constant_ids:
+            constant_ids[key] = f"k{len(pool)}"
+            pool.append(f"CONST {constant_ids[key]}, {format_literal(value)}")
+        return constant_ids[key]
+
+    prelude = [f"PRINT {constant(line)}" for line in evaluator.output]
+    body, body_lines = [], []
+    if stopped is not None:
+        for name, value in evaluator.variables.items():
+            if type(value) is array:
+                prelude.append(f"ALLOC_ARRAY {name}, {len(value)}")
+                if value.typecode == "d":
+                    prelude.append(f"ARRAY_FILL {name}, {constant(0.0)}")
+                prelude += [f"STORE_ELEM_UNCHECKED {constant(element)}, {name}, {index}"
+                            for index, element in enumerate(value) if element]
+            else:
+                prelude.append(f"STORE {constant(text(value))}, {name}")
+        prelude += [f"LOAD_CONST {format_literal(value)}, {temp}"
+                    for temp, value in evaluator.temp_vars.items()]
+        prelude.append(f"JUMP {RESUME_LABEL}")
+
+        from generator.generator import tokenize_instruction
+        instructions = list(evaluator.instructions)
+        lines = list(source_map) if source_map is not None else [0] * len(instructions)
+        instructions.insert(evaluator.pc, f"LABEL {RESUME_LABEL}")
+        lines.insert(evaluator.pc, lines[evaluator.pc] if evaluator.pc < len(lines) else 0)
+        parsed = [tokenize_instruction(instruction) for instruction in prelude + instructions]
+        keep = reachable(parsed)
+        for index, (instruction, line) in enumerate(zip(instructions, lines), len(prelude)):
+            if index in keep:
+                body.append(instruction)
+                body_lines.append(line)
+        if body and body[0] == f"LABEL {RESUME_LABEL}":
+            # none of the code before the stopping point is left: the prelude falls through to it
+            prelude.pop()
+
+    source_map = array('i', [0] * len(prelude) + body_lines)
+    residual = "\n".join(pool + prelude + body)
+    return Residual(residual, source_map, evaluator.output, evaluator.evaluated, stopped)
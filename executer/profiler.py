@@ -0,0 +1,55 @@
+from time import perf_counter
+
+class LineProfiler:
+    """
+    Counting profiler for Execute.profile: records how often each IR instruction
+    runs and the time spent in it, then folds both onto Numera source lines
+    through the generator's source map.
+    """
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.times = [0.0] * size
+        self.total = 0.0
+
+    def run(self, executer):
+        program = executer.program
+        counts, times = self.counts, self.times
+        start = perf_counter()
+        while executer.pc < len(program):
+            pc = executer.pc
+            decoded = program[pc]
+            if decoded is not None:
+                method, parts = decoded
+                if not method:
+                    raise ValueError(f"Unknown method: {parts[0]}")
+                before = perf_counter()
+                method(parts)
+                times[pc] += perf_counter() - before
+                counts[pc] += 1
+            executer.pc += 1
+        self.total = perf_counter() - start
+
+    def line_stats(self, source_map):
+        # {source line: [instructions executed, seconds]}, line 0 collects unmapped code
+        stats = {}
+        for pc, count in enumerate(self.counts):
+            if count:
+                line = source_map[pc] if source_map is not None and pc < len(source_map) else 0
+                entry = stats.setdefault(line, [0, 0.0])
+                entry[0] += count
+                entry[1] += self.times[pc]
+        return stats
+
+    def report(self, source_map, source=None, limit=10):
+        stats = self.line_stats(source_map)
+        source_lines = source.split('\n') if source is not None else []
+        measured = sum(seconds for _, seconds in stats.values()) or 1.0
+        rows = [f"{'line':>6} {'instrs':>10} {'ms':>10} {'%':>6}  source"]
+        hottest = sorted(stats.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        for line, (count, seconds) in hottest:
+            text = source_lines[line - 1].strip() if 0 < line <= len(source_lines) else ""
+            label = line if line else "-"
+            rows.append(f"{label:>6} {count:>10} {seconds * 1000:>10.3f} "
+                        f"{seconds / measured * 100:>6.1f}  {text}")
+        rows.append(f"total {self.total * 1000:.3f} ms")
+        return "\n".join(rows)
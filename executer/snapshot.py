@@ -0,0 +1,142 @@
+"""
+Snapshots of a run paused by Execute.run_for.
+
+A snapshot holds everything a run needs to carry on the way it would have
+without the pause: the pc, the variables and temps of the main program and of
+every active call, the results of pure calls cached so far, the instructions
+executed so far (when counted) and the queued input. Compiled loops and the
+parallel loop report are not saved; they are rebuilt as the run goes on. The
+format is
+
+    MAGIC, one VERSION byte, then a marshal dump of
+    (fingerprint of the code, pc, executed, main variables, main temps,
+     [(variables, temps, return pc, result temp, cache key) of every call,
+      outermost first], [(cache key, result)] of the pure call cache,
+     queued input or None, [(typecode, bytes) of every array])
+
+Arrays are stored once as raw buffers and referred to as (index,) wherever
+they are held, and string builders as the string they hold, so saving and
+restoring is a handful of dict copies and one marshal call. A snapshot can only
+be restored into an executer of the same code: its fingerprint is checked.
+"""
+import marshal
+import os
+import zlib
+from array import array
+from collections import deque
+
+from .calls import CallCache, FramePool
+from .executer import PAUSED
+from .strings import text
+
+MAGIC = b"NUMERA-SNAPSHOT"
+VERSION = 1
+CHECKPOINT_INTERVAL = 1000000  # instructions between the snapshots of run_checkpointed
+
+
+TYPES = {int: "int", float: "float", str: "str"}
+TYPE_NAMES = {name: kind for kind, name in TYPES.items()}
+
+
+def fingerprint(code):
+    return zlib.crc32(code.encode())
+
+def encode_key(key):
+    # a pure call cache key, (name, (type, value)...), with the types by name
+    return None if key is None else (key[0],) + tuple((TYPES[kind], value) for kind, value in key[1:])
+
+def decode_key(key):
+    return None if key is None else (key[0],) + tuple((TYPE_NAMES[kind], value) for kind, value in key[1:])
+
+
+class Encoder:
+    def __init__(self):
+        self.arrays = []
+        self.indexes = {}  # id of an array -> its index in arrays
+
+    def values(self, values):
+        return {name: self.value(value) for name, value in values.items()}
+
+    def value(self, value):
+        if type(value) is array:
+            index = self.indexes.get(id(value))
+            if index is None:
+                index = self.indexes[id(value)] = len(self.arrays)
+                self.arrays.append((value.typecode, value.tobytes()))
+            return (index,)
+        return text(value)
+
+
+def decode(values, arrays):
+    return {name: arrays[value[0]] if type(value) is tuple else value for name, value in values.items()}
+
+
+def save(executer):
+    encoder = Encoder()
+    frames = executer.call_stack
+    main_temps = frames[0].caller_temps if frames else executer.temp_vars
+    state = (fingerprint(executer.code), executer.pc, executer.executed,
+             encoder.values(executer.globals), encoder.values(main_temps),
+             [(encoder.values(frame.variables), encoder.values(frame.temps), frame.return_pc, frame.dest,
+               encode_key(frame.memo_key)) for frame in frames],
+             [(encode_key(key), encoder.value(result)) for key, result in executer.call_cache.entries.items()]
+             if executer.call_cache is not None else [],
+             list(executer.inputs) if executer.inputs is not None else None,
+             encoder.arrays)
+    return MAGIC + bytes([VERSION]) + marshal.dumps(state)
+
+
+def load(executer, data):
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a Numera snapshot")
+    version = data[len(MAGIC)]
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}, expected {VERSION}")
+    (code_fingerprint, pc, executed, variables, temps, frames, cached, inputs,
+     buffers) = marshal.loads(data[len(MAGIC) + 1:])
+    if code_fingerprint != fingerprint(executer.code):
+        raise ValueError("Snapshot was taken from a different program")
+
+    arrays = []
+    for typecode, buffer in buffers:
+        values = array(typecode)
+        values.frombytes(buffer)
+        arrays.append(values)
+
+    executer.pc = pc
+    if executer.executed is not None:
+        executer.executed = executed or 0
+    executer.variables = executer.globals = decode(variables, arrays)
+    executer.temp_vars = decode(temps, arrays)
+    executer.call_stack = []
+    if executer.procedures:
+        executer.frames = FramePool()
+        executer.call_cache = CallCache()
+        for key, result in cached:
+            executer.call_cache.put(decode_key(key), arrays[result[0]] if type(result) is tuple else result)
+    for frame_variables, frame_temps, return_pc, dest, key in frames:
+        frame = executer.frames.acquire()
+        frame.variables.update(decode(frame_variables, arrays))
+        frame.temps.update(decode(frame_temps, arrays))
+        frame.return_pc = return_pc
+        frame.dest = dest
+        frame.memo_key = decode_key(key)
+        frame.caller_variables = executer.variables
+        frame.caller_temps = executer.temp_vars
+        executer.variables = frame.variables
+        executer.temp_vars = frame.temps
+        executer.call_stack.append(frame)
+    executer.inputs = deque(inputs) if inputs is not None else None
+    executer.invalidate()
+
+
+def run_checkpointed(executer, path, interval=CHECKPOINT_INTERVAL):
+    # runs to the end, saving a snapshot to path after every interval instructions;
+    # the file is replaced atomically, and removed once the run has ended
+    while executer.run_for(interval) == PAUSED:
+        partial = path + ".tmp"
+        with open(partial, "wb") as f:
+            f.write(save(executer))
+        os.replace(partial, path)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,66 @@
+"""
+Running code while it is generated.
+
+StreamingExecute runs the chunks generator/stream.StreamingGenerator yields,
+loading each one when the code loaded before it has run, so the program starts
+before the rest of it is generated. The first chunk, the procedures, stays
+loaded; every main program chunk is loaded in place of the one before it, whose
+labels, temps and compiled loops are dropped. Control never passes back into
+an earlier main program chunk, so what is held at a time is the procedures and
+one chunk, however long the program.
+
+The code of a chunk that fails to generate is only reported when the run gets
+there, after the output of the chunks before it. Loops do not run in parallel,
+and run_for, profile() and snapshots are not supported.
+"""
+from array import array
+
+from .executer import Execute
+from .jit import JIT_THRESHOLD
+
+
+class StreamingExecute(Execute):
+    def __init__(self, chunks, jit_threshold=JIT_THRESHOLD, count_instructions=False, inputs=None):
+        super().__init__("", source_map=array('i'), jit_threshold=jit_threshold,
+                         count_instructions=count_instructions, inputs=inputs)
+        self.instructions.clear()
+        self.program.clear()
+        self.chunks = iter(chunks)
+        self.base = None  # index the main program chunks are loaded at, once the procedures are
+        self.finished = False  # the main program returned
+        self.loaded = 0  # chunks loaded so far
+
+    def run(self):
+        while not self.finished and self.load():
+            super().run()
+
+    def load(self):
+        # loads the next chunk and points the pc at its start; False once there is none
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            return False
+        instructions, lines = chunk
+        if self.base is None:
+            self.base = len(self.instructions) + len(instructions)
+        else:
+            self.drop()
+        self.pc = self.extend(instructions, lines)
+        self.loaded += 1
+        return True
+
+    def drop(self):
+        # unloads the main program chunk that has run
+        base = self.base
+        for label in [label for label, index in self.labels.items() if index >= base]:
+            del self.labels[label]
+        for start in [start for start in self.back_edges if start >= base]:
+            self.invalidate(start)
+        del self.instructions[base:]
+        del self.program[base:]
+        del self.source_map[base:]
+        self.temp_vars.clear()
+
+    def _execute_ret(self, parts):
+        if not self.call_stack:
+            self.finished = True
+        super()._execute_ret(parts)
@@ -0,0 +1,40 @@
+"""
+Runtime support of APPEND, the instruction the generator emits for s = s + e
+when s only ever holds strings.
+
+Concatenating onto a Python string copies it, so a loop growing a string one
+piece at a time is quadratic. APPEND instead keeps the pieces of the variable
+in a StringBuilder and the string is joined only when the variable is read
+(LOAD), after which the builder holds the joined string as its only piece and
+carries on appending to it. A builder never leaves the variable it belongs to:
+every read gets a str.
+"""
+
+
+class StringBuilder:
+    __slots__ = ("parts",)
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def build(self):
+        parts = self.parts
+        if len(parts) > 1:
+            parts[:] = ["".join(parts)]
+        return parts[0]
+
+
+def text(value):
+    # the value a read of a variable gives
+    return value.build() if type(value) is StringBuilder else value
+
+def append(current, value):
+    # current + value, appended in place when both are strings; returns the new value of the variable
+    if type(value) is str:
+        if type(current) is StringBuilder:
+            current.parts.append(value)
+            return current
+        if type(current) is str:
+            return StringBuilder([current, value])
+    # the error (or result) plain + gives
+    return text(current) + value
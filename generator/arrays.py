@@ -0,0 +1,162 @@
+"""
+The loop analysis that hoists array bounds checks.
+
+Every element access a[i] is bounds checked when it runs. In a counted loop
+
+    while i < n do       (or <=, >, >=; n an integer constant or a variable
+        ... a[i + k] ...  the loop does not write)
+        i = i + 1;       (exactly once, unconditionally, in the loop body)
+    end
+
+the indexes an access of the form a[i], a[i + k] or a[i - k] can reach are
+known when the loop is entered: from the first counter value to the last one
+the bound allows, shifted by k (and by the step for accesses after the
+increment). The generator checks that whole range once, before the loop, and
+emits a copy of the loop whose accesses of that form are not checked. When the
+range check fails the original loop runs instead, so an out of bounds access
+still fails at the same iteration, after the same output.
+
+The loop must not call procedures that are not pure, which could change the
+counter or the bound, nor declare the arrays it accesses.
+
+Versioning doubles the code of a loop. Loops nested in the original copy are
+not versioned again, as it only runs when the range check failed, so nested
+loops grow with their depth instead of doubling at every level. As in
+unroll.py, a versioned loop is at most MAX_VERSIONED_SIZE statements and
+expression nodes, and versioning adds at most MAX_VERSIONING_GROWTH of them to
+the program; other loops keep their checks.
+"""
+from parser.ast_node import *
+from .parallel import DIRECTIONS, Unsupported
+from .procedures import BUILTINS, expression_nodes
+from .unroll import size
+
+READ_ONLY_BUILTINS = frozenset(name for name, writes in BUILTINS.items() if not writes)
+MAX_VERSIONED_SIZE = 400
+MAX_VERSIONING_GROWTH = 4000
+
+
+def is_int_constant(expr):
+    return isinstance(expr, Constant) and type(expr.value) is int
+
+def counter_offset(index, counter):
+    # k when index is counter, counter + k or counter - k, else None
+    if isinstance(index, Identifier):
+        return 0 if index.name == counter else None
+    if not (isinstance(index, BinaryOperation) and index.operator in ("+", "-")):
+        return None
+    left, right = index.left, index.right
+    if isinstance(left, Identifier) and left.name == counter and is_int_constant(right):
+        return right.value if index.operator == "+" else -right.value
+    if (index.operator == "+" and is_int_constant(left)
+            and isinstance(right, Identifier) and right.name == counter):
+        return left.value
+    return None
+
+def shifted(expr, offset):
+    if offset == 0:
+        return expr
+    if is_int_constant(expr):
+        return Constant(expr.value + offset)
+    return BinaryOperation(expr, "+" if offset > 0 else "-", Constant(abs(offset)))
+
+
+class BoundsAnalysis:
+    def __init__(self, counter, pure_procedures):
+        self.counter = counter
+        self.pure_procedures = pure_procedures
+        self.writes = {}  # variable or array -> number of statements writing or declaring it
+        self.offsets = {}  # array -> counter offsets of its accesses
+        self.step = None
+        self.stepped = False  # past the counter increment
+
+    def write(self, name):
+        self.writes[name] = self.writes.get(name, 0) + 1
+
+    def expression(self, expr):
+        for node in expression_nodes(expr):
+            if isinstance(node, Call) and node.name not in BUILTINS and node.name not in self.pure_procedures:
+                raise Unsupported(f"calls {node.name}, which is not pure")
+            if isinstance(node, ArrayElement):
+                offset = counter_offset(node.index, self.counter)
+                if offset is not None:
+                    if self.stepped:
+                        offset += self.step
+                    self.offsets.setdefault(node.name, []).append(offset)
+
+    def block(self, statements, top_level):
+        for statement in statements:
+            if isinstance(statement, (Declaration, ArrayDeclaration)):
+                if isinstance(statement, Declaration) and statement.initial_value is not None:
+                    self.expression(statement.initial_value)
+                self.write(statement.name)
+            elif isinstance(statement, AssignmentStatement):
+                self.expression(statement.value)
+                self.write(statement.target.name)
+                if top_level and statement.target.name == self.counter and not self.stepped:
+                    self.increment(statement.value)
+            elif isinstance(statement, ArrayAssignment):
+                self.expression(statement.target)
+                self.expression(statement.value)
+            elif isinstance(statement, IfStatement):
+                self.expression(statement.condition)
+                self.block(statement.then_block, False)
+                self.block(statement.else_block or [], False)
+            elif isinstance(statement, WhileStatement):
+                self.expression(statement.condition)
+                self.block(statement.body, False)
+            elif isinstance(statement, PrintStatement):
+                self.expression(statement.expression)
+            elif isinstance(statement, CallStatement):
+                self.expression(statement.call)
+            elif isinstance(statement, ReturnStatement):
+                if statement.value is not None:
+                    self.expression(statement.value)
+            else:
+                raise Unsupported(f"contains {type(statement).__name__}")
+
+    def increment(self, value):
+        offset = counter_offset(value, self.counter)
+        if isinstance(value, BinaryOperation) and offset:
+            self.step = offset
+            self.stepped = True
+
+
+def hoisted_checks(node, pure_procedures=()):
+    # returns (counter, {array: (first index, last index)}) for a while loop whose
+    # counter-relative accesses can be checked before it runs, the indexes as
+    # expressions to evaluate at loop entry; None if there are none
+    condition = node.condition
+    if not (isinstance(condition, BinaryOperation) and condition.operator in DIRECTIONS
+            and isinstance(condition.left, Identifier)):
+        return None
+    counter = condition.left.name
+    bound = condition.right
+    if not (is_int_constant(bound) or (isinstance(bound, Identifier) and bound.name != counter)):
+        return None
+
+    analysis = BoundsAnalysis(counter, pure_procedures)
+    try:
+        analysis.block(node.body, True)
+    except Unsupported:
+        return None
+    direction = DIRECTIONS[condition.operator]
+    if analysis.writes.get(counter) != 1 or analysis.step is None or analysis.step * direction < 0:
+        return None
+    if isinstance(bound, Identifier) and bound.name in analysis.writes:
+        return None
+
+    # counter values the body runs with
+    if direction > 0:
+        first = condition.left
+        last = shifted(bound, -1) if condition.operator == "<" else bound
+    else:
+        first = shifted(bound, 1) if condition.operator == ">" else bound
+        last = condition.left
+    checks = {}
+    for name, offsets in analysis.offsets.items():
+        if name not in analysis.writes:
+            checks[name] = (shifted(first, min(offsets)), shifted(last, max(offsets)))
+    if not checks:
+        return None
+    return counter, checks
@@ -0,0 +1,129 @@
+# Control flow and temp liveness over tokenized IR (lists of tokens from tokenize_instruction)
+
+# position of the destination operand of instructions that define a temp
+DEST_INDEX = {"LOAD_CONST": 2, "LOAD": 2, "BINOP": 4, "UNARY": 3, "INPUT": 1, "SHIFT_LEFT": 3,
+              "CALL": 2, "LOAD_ELEM": 3, "LOAD_ELEM_UNCHECKED": 3, "ARRAY_REDUCE": 3, "IS_INT": 2}
+# positions of the operands an instruction reads (CALL reads all operands after its destination)
+USE_INDEX = {"STORE": (1,), "PRINT": (1,), "JUMP_IF_FALSE": (1,), "JUMP_IF_TRUE": (1,),
+             "BINOP": (2, 3), "UNARY": (2,), "SHIFT_LEFT": (1,), "RET": (1,), "LOAD_ELEM": (2,),
+             "LOAD_ELEM_UNCHECKED": (2,), "STORE_ELEM": (1, 3), "STORE_ELEM_UNCHECKED": (1, 3),
+             "ARRAY_FILL": (2,), "CHECK_RANGE": (2, 3), "APPEND": (2,), "IS_INT": (1,)}
+# instructions that neither read nor write temps
+NO_TEMPS = {"ALLOC", "ALLOC_ARRAY", "LABEL", "JUMP", "PROC"}
+# position of the label of conditional jumps
+BRANCH_LABEL = {"JUMP_IF_FALSE": 2, "JUMP_IF_TRUE": 2, "CHECK_RANGE": 4}
+KNOWN_OPS = set(DEST_INDEX) | set(USE_INDEX) | NO_TEMPS
+
+def is_temp(token):
+    return token[:1] == "t" and token[1:].isdigit()
+
+def use_positions(tokens):
+    if tokens[0] == "CALL":
+        return range(3, len(tokens))
+    return [i for i in USE_INDEX.get(tokens[0], ()) if i < len(tokens)]
+
+def temp_def(tokens):
+    index = DEST_INDEX.get(tokens[0])
+    return tokens[index] if index is not None else None
+
+def temp_uses(tokens):
+    return [tokens[i] for i in use_positions(tokens) if is_temp(tokens[i])]
+
+def temp_positions(tokens):
+    # indexes of the operands that name temps
+    positions = [i for i in use_positions(tokens) if is_temp(tokens[i])]
+    if tokens[0] in DEST_INDEX:
+        positions.append(DEST_INDEX[tokens[0]])
+    return positions
+
+def basic_blocks(parsed):
+    # returns [(start, end)] half-open instruction ranges and the successor block ids of each
+    leaders = {0}
+    labels = {}
+    for index, tokens in enumerate(parsed):
+        if not tokens:
+            continue
+        if tokens[0] == "LABEL":
+            leaders.add(index)
+            labels[tokens[1]] = index
+        elif tokens[0] == "PROC":
+            leaders.add(index)
+        elif tokens[0] in ("JUMP", "RET") or tokens[0] in BRANCH_LABEL:
+            leaders.add(index + 1)
+    starts = sorted(leader for leader in leaders if leader < len(parsed))
+    block_of = {start: block for block, start in enumerate(starts)}
+    blocks = [(start, starts[i + 1] if i + 1 < len(starts) else len(parsed))
+              for i, start in enumerate(starts)]
+
+    successors = []
+    for block, (start, end) in enumerate(blocks):
+        last = parsed[end - 1] if end > start else None
+        succ = []
+        if last and last[0] == "JUMP":
+            succ.append(block_of[labels[last[1]]])
+        elif last and last[0] == "RET":
+            pass
+        else:
+            if last and last[0] in BRANCH_LABEL:
+                succ.append(block_of[labels[last[BRANCH_LABEL[last[0]]]]])
+            if block + 1 < len(blocks):
+                succ.append(block + 1)
+        successors.append(succ)
+    return blocks, successors
+
+def live_ranges(parsed):
+    # returns {temp: (first, last)}: the instruction range over which each temp may be live
+    blocks, successors = basic_blocks(parsed)
+    gen = []
+    kill = []
+    for start, end in blocks:
+        used, defined = set(), set()
+        for tokens in parsed[start:end]:
+            if not tokens:
+                continue
+            for temp in temp_uses(tokens):
+                if temp not in defined:
+                    used.add(temp)
+            dest = temp_def(tokens)
+            if dest is not None:
+                defined.add(dest)
+        gen.append(used)
+        kill.append(defined)
+
+    live_in = [set() for _ in blocks]
+    live_out = [set() for _ in blocks]
+    changed = True
+    while changed:
+        changed = False
+        for block in reversed(range(len(blocks))):
+            out = set()
+            for succ in successors[block]:
+                out |= live_in[succ]
+            new_in = gen[block] | (out - kill[block])
+            if out != live_out[block] or new_in != live_in[block]:
+                live_out[block] = out
+                live_in[block] = new_in
+                changed = True
+
+    ranges = {}
+    def touch(temp, index):
+        first, last = ranges.get(temp, (index, index))
+        ranges[temp] = (min(first, index), max(last, index))
+
+    for block, (start, end) in enumerate(blocks):
+        live = set(live_out[block])
+        for temp in live:
+            touch(temp, end - 1)
+        for index in range(end - 1, start - 1, -1):
+            tokens = parsed[index]
+            if not tokens:
+                continue
+            dest = temp_def(tokens)
+            if dest is not None:
+                touch(dest, index)
+                live.discard(dest)
+            for temp in temp_uses(tokens):
+                live.add(temp)
+            for temp in live:
+                touch(temp, index)
+    return ranges
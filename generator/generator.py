@@ -1,13 +1,35 @@
 # CodeGenerator.py
+import heapq
 import re
+from array import array
 from parser.ast_node import *
+from .cfg import BRANCH_LABEL, DEST_INDEX, KNOWN_OPS, live_ranges, temp_positions
+from .arrays import (MAX_VERSIONED_SIZE, MAX_VERSIONING_GROWTH, READ_ONLY_BUILTINS, counter_offset,
+                     hoisted_checks)
+from .literals import format_literal, parse_literal
+from .parallel import analyze_loop
+from .pgo import hot_loop
+from .procedures import BUILTINS, analyze_procedures, expression_nodes
+from .simplifier import infer_strings
+from .unroll import size
 
 def tokenize_instruction(instr):
     return re.findall(r'"[^"]*"|[^\s,]+', instr)
 
+def format_instruction(tokens):
+    return f"{tokens[0]} {', '.join(str(token) for token in tokens[1:])}"
+
+# instructions after which a variable may be read elsewhere
+BLOCK_ENDS = {"LABEL", "JUMP", "CALL", "RET", "PROC"} | set(BRANCH_LABEL)
+
+
 class CodeGenerator:
-    def __init__(self):
+    def __init__(self, verbose=True, profile=None):
+        self.verbose = verbose
+        self.profile = profile  # executer.feedback.Profile of a previous run, see generator/pgo.py
         self.instructions = []
+        self.lines = []  # source line of every instruction, kept in step by all passes
+        self.current_line = 0
         self.temp_counter = 0
         self.start_label_counter = 0
         self.end_label_counter = 0  
@@ -15,6 +37,24 @@ class CodeGenerator:
         self.var_usage = {}
         self.var_assignments = {}
         self.expr_cache = {}  # Cache for common subexpressions
+        self.loaded_from = {}  # temp -> variable it was loaded from
+        self.expr_dependents = {}  # variable -> cached expression keys that read it
+        self.constants = []  # constant pool, entry i is the operand k<i>
+        self.constant_ids = {}
+        self.register_pressure = 0
+        self.unoptimized_size = None  # instructions before optimize()
+        self.parallel_loops = {}  # start label -> ParallelLoop, for Execute
+        self.parallel_report = []  # (line, start label, reason the loop runs serially or None)
+        self.procedures = {}  # name -> procedures.ProcedureInfo
+        self.pure_procedures = set()
+        self.scope = None  # ProcedureInfo of the procedure being generated
+        self.pinned_vars = set()  # main program variables used by procedures, kept by dead store removal
+        self.arrays = {}  # main program array -> size
+        self.local_arrays = {}  # array -> size, in the procedure being generated
+        self.unchecked = {}  # loop counter -> arrays whose accesses relative to it were checked before the loop
+        self.versioning = True  # off in the copy of a loop that runs when its range check failed
+        self.versioned_size = 0  # statements and expression nodes loop versioning copied
+        self.string_vars = {}  # None or procedure name -> variables visible there that only hold strings
 
     def new_temp(self):
         self.temp_counter += 1
@@ -34,48 +74,191 @@ class CodeGenerator:
 
     def add_instruction(self, instruction):
         self.instructions.append(instruction)
+        self.lines.append(self.current_line)
+
+    def filter_instructions(self, to_remove):
+        self.instructions = [
+            instr for idx, instr in enumerate(self.instructions)
+            if idx not in to_remove
+        ]
+        self.lines = [line for idx, line in enumerate(self.lines) if idx not in to_remove]
+
+    def source_map(self):
+        # compact side table: source line of each instruction of get_code() after the pool, 0 if unknown
+        return array('i', self.lines)
 
     def get_expr_key(self, operator, operands):
-        commutative_ops = {'+', '*', '==', '!=', '<=', '>=', 'and', 'or'}
+        commutative_ops = {'+', '*', '==', '!='}
         if operator in commutative_ops:
             operands = sorted(operands)
         return (operator, tuple(operands))
 
+    # node class -> generate_* method name; looked up by exact type instead of an
+    # isinstance chain, subclasses (such as the ast_arena views) are resolved once
+    GENERATORS = {
+        Program: "generate_program",
+        Declaration: "generate_declaration",
+        ArrayDeclaration: "generate_array_declaration",
+        AssignmentStatement: "generate_assignment",
+        ArrayAssignment: "generate_array_assignment",
+        PrintStatement: "generate_print",
+        IfStatement: "generate_if",
+        WhileStatement: "generate_while",
+        Procedure: "generate_procedure",
+        CallStatement: "generate_call_statement",
+        ReturnStatement: "generate_return",
+        Call: "generate_call",
+        Input: "generate_input",
+        BinaryOperation: "generate_binary_operation",
+        UnaryOperation: "generate_unary_operation",
+        Constant: "generate_constant",
+        Identifier: "generate_identifier",
+        ArrayElement: "generate_array_element",
+        IsInt: "generate_is_int",
+    }
+
     def generate(self, node):
-        if isinstance(node, Program):
-            self.generate_program(node)
-        elif isinstance(node, Declaration):
-            self.generate_declaration(node)
-        elif isinstance(node, AssignmentStatement):
-            self.generate_assignment(node)
-        elif isinstance(node, PrintStatement):
-            self.generate_print(node)
-        elif isinstance(node, IfStatement):
-            self.generate_if(node)
-        elif isinstance(node, WhileStatement):
-            self.generate_while(node)
-        elif isinstance(node, Input):
-            return self.generate_input(node)
-        elif isinstance(node, BinaryOperation):
-            return self.generate_binary_operation(node)
-        elif isinstance(node, UnaryOperation):
-            return self.generate_unary_operation(node)
-        elif isinstance(node, Constant):
-            return self.generate_constant(node)
-        elif isinstance(node, Identifier):
-            return self.generate_identifier(node)
-        else:
-            raise ValueError(f"Unknown AST node type: {type(node)}")
+        name = self.GENERATORS.get(type(node))
+        if name is None:
+            for cls in type(node).__mro__:
+                if cls in self.GENERATORS:
+                    name = self.GENERATORS[type(node)] = self.GENERATORS[cls]
+                    break
+            else:
+                raise ValueError(f"Unknown AST node type: {type(node)}")
+        if node.line is None:
+            return getattr(self, name)(node)
+        # code generated for a statement is attributed to its line, nested statements to theirs
+        outer_line = self.current_line
+        self.current_line = node.line
+        result = getattr(self, name)(node)
+        self.current_line = outer_line
+        return result
+
+    def generate_arena(self, arena):
+        # generates code straight from a parser.ast_arena.AstArena
+        self.generate(arena.view(arena.root))
 
     def generate_program(self, node):
+        self.prepare_program(node)
+        self.string_vars = infer_strings(node)
         for decl in node.declarations:
             self.generate(decl)
         for stmt in node.statements:
             self.generate(stmt)
+        if node.procedures:
+            # the main program ends here, the procedure bodies follow it
+            self.add_instruction("RET")
+            for procedure in node.procedures:
+                self.generate(procedure)
         # Optimize
         self.optimize()
 
+    def prepare_program(self, node):
+        # checks the procedures of the program node and finds out what they do and use
+        procedures = node.procedures or []
+        names = [procedure.name for procedure in procedures]
+        for name in names:
+            if names.count(name) > 1:
+                raise ValueError(f"Procedure {name} is defined more than once")
+            if name in (node.imported or ()):
+                raise ValueError(f"Procedure {name} is also imported")
+            if name in BUILTINS:
+                raise ValueError(f"Procedure {name} would hide the builtin {name}")
+        self.procedures, self.pure_procedures = analyze_procedures(procedures, node.imported)
+        for info in self.procedures.values():
+            self.pinned_vars |= info.globals
+
+    def generate_procedure(self, node):
+        purity = "pure" if node.name in self.pure_procedures else "impure"
+        self.add_instruction(format_instruction(
+            ["PROC", node.name, purity] + [parameter.name for parameter in node.parameters]))
+        # locals live in the call frame: they get their own usage records, which
+        # dead store removal does not look at, and no expression is shared with the caller
+        outer = self.var_usage, self.var_assignments
+        self.var_usage, self.var_assignments = {}, {}
+        self.clear_expr_cache()
+        self.scope = self.procedures[node.name]
+        self.local_arrays = {}
+        for stmt in node.body:
+            self.generate(stmt)
+        self.add_instruction("RET")
+        self.scope = None
+        self.clear_expr_cache()
+        self.var_usage, self.var_assignments = outer
+
+    def generate_call(self, node):
+        if node.name in BUILTINS:
+            return self.generate_builtin(node)
+        info = self.procedures.get(node.name)
+        if info is None:
+            raise ValueError(f"Unknown procedure: {node.name}")
+        expected = len(info.procedure.parameters)
+        if len(node.arguments) != expected:
+            raise ValueError(f"Procedure {node.name} takes {expected} arguments, got {len(node.arguments)}")
+        arguments = [self.generate(argument) for argument in node.arguments]
+        temp = self.new_temp()
+        self.add_instruction(format_instruction(["CALL", node.name, temp] + arguments))
+        if node.name not in self.pure_procedures:
+            # the callee may have written main program variables
+            self.clear_expr_cache()
+        return temp
+
+    def generate_call_statement(self, node):
+        if node.call.name == "fill":
+            self.generate_fill(node.call)
+        else:
+            self.generate(node.call)
+
+    def builtin_array(self, node, count):
+        if len(node.arguments) != count:
+            raise ValueError(f"{node.name} takes {count} argument{'s' if count > 1 else ''}, got {len(node.arguments)}")
+        array = node.arguments[0]
+        if not isinstance(array, Identifier):
+            raise ValueError(f"The first argument of {node.name} must name an array")
+        self.var_usage[array.name] = self.var_usage.get(array.name, 0) + 1
+        return array.name
+
+    def generate_builtin(self, node):
+        if node.name == "fill":
+            raise ValueError("fill does not return a value")
+        name = self.builtin_array(node, 1)
+        size = self.array_size(name)
+        if node.name == "len" and size is not None:
+            return self.generate_constant(Constant(size))
+        temp = self.new_temp()
+        self.add_instruction(f"ARRAY_REDUCE {node.name}, {name}, {temp}")
+        return temp
+
+    def generate_fill(self, node):
+        name = self.builtin_array(node, 2)
+        value = self.generate(node.arguments[1])
+        self.add_instruction(f"ARRAY_FILL {name}, {value}")
+
+    def generate_return(self, node):
+        if node.value is None:
+            self.add_instruction("RET")
+        else:
+            temp = self.generate(node.value)
+            self.add_instruction(f"RET {temp}")
+
+    def array_size(self, name):
+        # size of the array name refers to in the current scope, None if it is not a known array
+        if self.scope is not None and name in self.scope.locals:
+            return self.local_arrays.get(name)
+        return self.arrays.get(name)
+
+    def not_an_array(self, name):
+        if self.array_size(name) is not None:
+            raise ValueError(f"{name} is an array, use {name}[index]")
+
+    def generate_array_declaration(self, node):
+        self.add_instruction(f"ALLOC_ARRAY {node.name}, {node.size}")
+        arrays = self.local_arrays if self.scope is not None else self.arrays
+        arrays[node.name] = node.size
+
     def generate_declaration(self, node):
+        (self.local_arrays if self.scope is not None else self.arrays).pop(node.name, None)
         self.add_instruction(f"ALLOC {node.name}")
         if node.name not in self.var_assignments:
             self.var_assignments[node.name] = []
@@ -87,6 +270,10 @@ class CodeGenerator:
             self.invalidate_expr_cache(node.name)
 
     def generate_assignment(self, node):
+        self.not_an_array(node.target.name)
+        parts = self.appended_parts(node)
+        if parts is not None:
+            return self.generate_append(node, parts)
         temp = self.generate(node.value)
         self.add_instruction(f"STORE {temp}, {node.target.name}")
         if node.target.name not in self.var_assignments:
@@ -95,6 +282,59 @@ class CodeGenerator:
         # Invalidate expressions involving this variable
         self.invalidate_expr_cache(node.target.name)
 
+    def appended_parts(self, node):
+        # [e1, e2, ...] for s = s + e1 + e2 ... with s a variable that only ever holds
+        # strings, and no e reading s or calling anything; None otherwise
+        name = node.target.name
+        if name not in self.string_vars.get(self.scope.procedure.name if self.scope else None, ()):
+            return None
+        parts = []
+        value = node.value
+        while isinstance(value, BinaryOperation) and value.operator == "+":
+            parts.append(value.right)
+            value = value.left
+        if not (parts and isinstance(value, Identifier) and value.name == name):
+            return None
+        for part in parts:
+            for expr in expression_nodes(part):
+                if isinstance(expr, Call) or (isinstance(expr, Identifier) and expr.name == name):
+                    return None
+        return parts[::-1]
+
+    def generate_append(self, node, parts):
+        # appends in place instead of copying the string: see executer/strings.py
+        name = node.target.name
+        for part in parts:
+            temp = self.generate(part)
+            self.add_instruction(f"APPEND {name}, {temp}")
+        # s is read and written once, as by LOAD and STORE
+        self.var_usage[name] = self.var_usage.get(name, 0) + 1
+        self.var_assignments.setdefault(name, []).append(len(self.instructions) - 1)
+        self.invalidate_expr_cache(name)
+
+    def generate_array_assignment(self, node):
+        target = node.target
+        index = self.generate(target.index)
+        temp = self.generate(node.value)
+        op = "STORE_ELEM_UNCHECKED" if self.in_bounds(target) else "STORE_ELEM"
+        self.add_instruction(f"{op} {temp}, {target.name}, {index}")
+
+    def generate_array_element(self, node):
+        index = self.generate(node.index)
+        temp = self.new_temp()
+        op = "LOAD_ELEM_UNCHECKED" if self.in_bounds(node) else "LOAD_ELEM"
+        self.add_instruction(f"{op} {node.name}, {index}, {temp}")
+        return temp
+
+    def in_bounds(self, element):
+        # whether the index of an element access is known to be in range
+        if isinstance(element.index, Constant):
+            size = self.array_size(element.name)
+            index = element.index.value
+            return size is not None and type(index) is int and 0 <= index < size
+        return any(element.name in arrays and counter_offset(element.index, counter) is not None
+                   for counter, arrays in self.unchecked.items())
+
     def generate_print(self, node):
         temp = self.generate(node.expression)
         self.add_instruction(f"PRINT {temp}")
@@ -111,10 +351,8 @@ class CodeGenerator:
                         self.generate(stmt)
             return
 
-        condition_temp = self.generate(node.condition)
         else_label = self.new_else_label()
-
-        self.add_instruction(f"JUMP_IF_FALSE {condition_temp}, {else_label}")
+        self.generate_branch(node.condition, else_label)
 
         for stmt in node.then_block:
             self.generate(stmt)
@@ -143,12 +381,63 @@ class CodeGenerator:
             self.add_instruction(f"JUMP {start_label}")
             return
 
+        if self.scope is not None:
+            loop, reason = None, "loop is inside a procedure"
+        else:
+            loop, reason = analyze_loop(node, self.pure_procedures | READ_ONLY_BUILTINS)
+        hoisted = hoisted_checks(node, self.pure_procedures) if self.versioning else None
+        if hoisted is not None:
+            body_size = size(node.body)
+            if body_size > MAX_VERSIONED_SIZE or self.versioned_size + body_size > MAX_VERSIONING_GROWTH:
+                hoisted = None
+            else:
+                self.versioned_size += body_size
+        if hoisted is None:
+            self.generate_loop(node, loop, reason)
+            return
+
+        # loop versioning: if every counter-relative index the loop can reach is in
+        # bounds, run a copy of it without checks on those accesses, else the original
+        counter, checks = hoisted
+        checked_label = self.new_else_label()
+        done_label = self.new_end_label()
+        for name, (first, last) in checks.items():
+            first_temp = self.generate(first)
+            last_temp = self.generate(last)
+            self.add_instruction(f"CHECK_RANGE {name}, {first_temp}, {last_temp}, {checked_label}")
+        outer = self.unchecked
+        self.unchecked = dict(outer)
+        self.unchecked[counter] = set(checks)
+        self.generate_loop(node, loop, reason)
+        self.unchecked = outer
+        self.add_instruction(f"JUMP {done_label}")
+        self.add_instruction(f"LABEL {checked_label}")
+        versioning, self.versioning = self.versioning, False
+        self.generate_loop(node, loop, reason, report=False)
+        self.versioning = versioning
+        self.add_instruction(f"LABEL {done_label}")
+
+    def generate_loop(self, node, loop, reason, report=True):
         start_label = self.new_start_label()
         end_label = self.new_end_label()
+        if loop is not None:
+            self.parallel_loops[start_label] = loop
+        if report:
+            self.parallel_report.append((self.current_line, start_label, reason))
+
+        if loop is None and self.profile is not None and hot_loop(self.profile, node.line):
+            # the test moves to the bottom of the body, with a copy of it before the first
+            # iteration: each iteration then runs straight through into one back edge
+            self.generate_branch(node.condition, end_label)
+            self.add_instruction(f"LABEL {start_label}")
+            for stmt in node.body:
+                self.generate(stmt)
+            self.generate_branch(node.condition, start_label, jump_if=True)
+            self.add_instruction(f"LABEL {end_label}")
+            return
 
         self.add_instruction(f"LABEL {start_label}")
-        condition_temp = self.generate(node.condition)
-        self.add_instruction(f"JUMP_IF_FALSE {condition_temp}, {end_label}")
+        self.generate_branch(node.condition, end_label)
 
         for stmt in node.body:
             self.generate(stmt)
@@ -156,6 +445,26 @@ class CodeGenerator:
         self.add_instruction(f"JUMP {start_label}")
         self.add_instruction(f"LABEL {end_label}")
 
+    def generate_branch(self, condition, label, jump_if=False):
+        # jumps to label when the truth of condition is jump_if, else falls through;
+        # and / or only evaluate their right operand when the left one does not decide
+        if isinstance(condition, BinaryOperation) and condition.operator in ("and", "or"):
+            if (condition.operator == "or") == jump_if:
+                # either operand alone takes the jump: a and b jumps on false, a or b on true
+                self.generate_branch(condition.left, label, jump_if)
+                self.generate_branch(condition.right, label, jump_if)
+            else:
+                # the left operand alone can only skip the right one
+                skip_label = self.new_end_label()
+                self.generate_branch(condition.left, skip_label, not jump_if)
+                self.generate_branch(condition.right, label, jump_if)
+                self.add_instruction(f"LABEL {skip_label}")
+        elif isinstance(condition, UnaryOperation) and condition.operator in ("not", "!"):
+            self.generate_branch(condition.operand, label, not jump_if)
+        else:
+            temp = self.generate(condition)
+            self.add_instruction(f"{'JUMP_IF_TRUE' if jump_if else 'JUMP_IF_FALSE'} {temp}, {label}")
+
     def generate_input(self, node):
         temp = self.new_temp()
         self.add_instruction(f"INPUT {temp}")
@@ -165,21 +474,25 @@ class CodeGenerator:
         if isinstance(node.left, Constant) and isinstance(node.right, Constant):
             left_val = node.left.value
             right_val = node.right.value
-            result = self.evaluate_binop(node.operator, left_val, right_val)
-            return self.generate_constant(Constant(result))
-        else:
-            left = self.generate(node.left)
-            right = self.generate(node.right)
-            
-            expr_key = self.get_expr_key(node.operator, [left, right])
-            
-            if expr_key in self.expr_cache:
-                return self.expr_cache[expr_key]
+            try:
+                result = self.evaluate_binop(node.operator, left_val, right_val)
+            except (TypeError, ArithmeticError):
+                pass  # left to fail when it runs
             else:
-                temp = self.new_temp()
-                self.add_instruction(f"BINOP {node.operator}, {left}, {right}, {temp}")
-                self.expr_cache[expr_key] = temp
-                return temp
+                return self.generate_constant(Constant(result))
+
+        left = self.generate(node.left)
+        right = self.generate(node.right)
+
+        expr_key = self.get_expr_key(node.operator, [left, right])
+
+        if expr_key in self.expr_cache:
+            return self.expr_cache[expr_key]
+        else:
+            temp = self.new_temp()
+            self.add_instruction(f"BINOP {node.operator}, {left}, {right}, {temp}")
+            self.cache_expr(expr_key, temp)
+            return temp
 
     def evaluate_binop(self, operator, left, right):
         if operator == '+':
@@ -215,9 +528,17 @@ class CodeGenerator:
         else:
             temp = self.new_temp()
             self.add_instruction(f"UNARY {node.operator}, {operand}, {temp}")
-            self.expr_cache[expr_key] = temp
+            self.cache_expr(expr_key, temp)
             return temp
 
+    def generate_is_int(self, node):
+        if isinstance(node.operand, Constant):
+            return self.generate_constant(Constant(int(type(node.operand.value) is int)))
+        operand = self.generate(node.operand)
+        temp = self.new_temp()
+        self.add_instruction(f"IS_INT {operand}, {temp}")
+        return temp
+
     def generate_constant(self, node):
         temp = self.new_temp()
         if isinstance(node.value, str):
@@ -228,30 +549,40 @@ class CodeGenerator:
         return temp
 
     def generate_identifier(self, node):
+        self.not_an_array(node.name)
         temp = self.new_temp()
         self.add_instruction(f"LOAD {node.name}, {temp}")
+        self.loaded_from[temp] = node.name
         self.var_usage[node.name] = self.var_usage.get(node.name, 0) + 1
         return temp
 
+    def cache_expr(self, expr_key, temp):
+        self.expr_cache[expr_key] = temp
+        for operand in expr_key[1]:
+            if operand in self.loaded_from:
+                self.expr_dependents.setdefault(self.loaded_from[operand], []).append(expr_key)
+
+    def clear_expr_cache(self):
+        self.expr_cache.clear()
+        self.expr_dependents.clear()
+
     def invalidate_expr_cache(self, var_name):
-        keys_to_remove = []
-        for expr_key, temp in self.expr_cache.items():
-            operator, operands = expr_key
-            for operand in operands:
-                for instr in self.instructions:
-                    tokens = tokenize_instruction(instr)
-                    if tokens and tokens[0] == "LOAD" and tokens[1] == var_name and tokens[2] == operand:
-                        keys_to_remove.append(expr_key)
-                        break
-        for key in keys_to_remove:
-            del self.expr_cache[key]
+        # drop cached expressions that read a temp loaded from var_name
+        for key in self.expr_dependents.pop(var_name, []):
+            self.expr_cache.pop(key, None)
 
     def optimize(self):
-        print("Optimizing...")
+        if self.verbose:
+            print("Optimizing...")
+        self.unoptimized_size = len(self.instructions)
         self.common_elimination()
         self.propagate_constants()
         self.remove_dead_code()
         self.optimize_strength_reduction()
+        self.build_constant_pool()
+        self.allocate_registers()
+        if self.verbose:
+            self.print_parallel_report()
 
         self.expr_cache.clear()
 
@@ -276,24 +607,42 @@ class CodeGenerator:
     
 
     def remove_dead_code(self):
+        self.remove_dead_stores()
+        self.remove_unused_constants()
+
+    def remove_dead_stores(self):
         to_remove = set()
 
+        # ALLOCs of procedure locals follow the main program and are never removed
+        main_end = next((idx for idx, instr in enumerate(self.instructions) if instr.startswith("PROC ")),
+                        len(self.instructions))
         for var, assignments in self.var_assignments.items():
+            if var in self.pinned_vars:
+                continue
             usage = self.var_usage.get(var, 0)
             if usage == 0:
                 to_remove.update(assignments)
-                for idx, instr in enumerate(self.instructions):
+                for idx, instr in enumerate(self.instructions[:main_end]):
                     tokens = tokenize_instruction(instr)
                     if tokens and tokens[0] == "ALLOC" and tokens[1] == var:
                         to_remove.add(idx)
-            elif usage < len(assignments):
-                to_remove.update(assignments[:-1])
+            else:
+                to_remove.update(index for index in assignments if self.overwritten(index, var))
 
-        self.instructions = [
-            instr for idx, instr in enumerate(self.instructions)
-            if idx not in to_remove
-        ]
+        self.filter_instructions(to_remove)
 
+    def overwritten(self, index, var):
+        # whether var is stored again, in the same basic block, before anything after
+        # the STORE at index can read it
+        for instr in self.instructions[index + 1:]:
+            tokens = tokenize_instruction(instr)
+            if tokens[0] == "STORE" and tokens[2] == var:
+                return True
+            if tokens[0] in BLOCK_ENDS or var in tokens[1:]:
+                return False
+        return False
+
+    def remove_unused_constants(self):
         to_remove = set()
         temp_usage = self.analyze_temp_usage()
 
@@ -304,22 +653,24 @@ class CodeGenerator:
                 if temp not in temp_usage:
                     to_remove.add(idx)
 
-        self.instructions = [
-            instr for idx, instr in enumerate(self.instructions)
-            if idx not in to_remove
-        ]
+        self.filter_instructions(to_remove)
 
 
     def propagate_constants(self):
-        print("Performing constant propagation...")
+        if self.verbose:
+            print("Performing constant propagation...")
         constant_values = {}
         temp_constant_values = {}
         new_instructions = []
+        new_lines = []
+        moved = []  # index of every instruction afterwards, None if it was dropped
 
-        for instr in self.instructions:
+        for instr, line in zip(self.instructions, self.lines):
             tokens = tokenize_instruction(instr)
             if not tokens:
+                moved.append(len(new_lines))
                 new_instructions.append(instr)
+                new_lines.append(line)
                 continue
 
             op = tokens[0]
@@ -377,9 +728,14 @@ class CodeGenerator:
                         except ValueError:
                             pass
 
+                result = None
                 if left_val is not None and right_val is not None:
-                    result = self.evaluate_binop(operator, left_val, right_val)
-                    new_instr = f"LOAD_CONST {result}, {dest}"
+                    try:
+                        result = self.evaluate_binop(operator, left_val, right_val)
+                    except (TypeError, ArithmeticError):
+                        pass  # left to fail when it runs
+                if result is not None:
+                    new_instr = f"LOAD_CONST {format_literal(result)}, {dest}"
                     new_instructions.append(new_instr)
                     temp_constant_values[dest] = result
                 else:
@@ -414,15 +770,13 @@ class CodeGenerator:
                 var, temp = tokens[1], tokens[2]
                 if var in constant_values:
                     const_value = constant_values[var]
-                    if isinstance(const_value, str):
-                        const_value = f'"{const_value}"'  # Ensure strings are quoted
-                    new_instr = f"LOAD_CONST {const_value}, {temp}"
+                    new_instr = f"LOAD_CONST {format_literal(const_value)}, {temp}"
                     new_instructions.append(new_instr)
                     temp_constant_values[temp] = const_value
                 else:
                     new_instructions.append(instr)
                     temp_constant_values.pop(temp, None)
-            elif op == "JUMP_IF_FALSE":
+            elif op == "JUMP_IF_FALSE" or op == "JUMP_IF_TRUE":
                 condition, label = tokens[1], tokens[2]
                 cond_val = None
 
@@ -440,7 +794,7 @@ class CodeGenerator:
                             pass
 
                 if cond_val is not None:
-                    if not cond_val:
+                    if bool(cond_val) == (op == "JUMP_IF_TRUE"):
                         new_instr = f"JUMP {label}"
                         new_instructions.append(new_instr)
                     else:
@@ -449,10 +803,18 @@ class CodeGenerator:
                     new_instructions.append(instr)
             elif op == "JUMP":
                 new_instructions.append(instr)
-            elif op == "LABEL":
+            elif op == "LABEL" or op == "PROC":
                 new_instructions.append(instr)
                 constant_values = {}
                 temp_constant_values = {}
+            elif op == "APPEND":
+                new_instructions.append(instr)
+                constant_values.pop(tokens[1], None)
+            elif op == "CALL":
+                # the callee may write main program variables
+                new_instructions.append(instr)
+                constant_values = {}
+                temp_constant_values.pop(tokens[2], None)
             elif op == "PRINT":
                 new_instructions.append(instr)
             elif op == "INPUT":
@@ -462,7 +824,14 @@ class CodeGenerator:
             else:
                 new_instructions.append(instr)
 
+            # each branch above emits at most one instruction, which keeps this line
+            moved.append(len(new_lines) if len(new_instructions) > len(new_lines) else None)
+            new_lines.extend([line] * (len(new_instructions) - len(new_lines)))
         self.instructions = new_instructions
+        self.lines = new_lines
+        # a jump that is never taken is dropped, so the STOREs dead store removal looks at move up
+        self.var_assignments = {var: [moved[index] for index in assignments if moved[index] is not None]
+                                for var, assignments in self.var_assignments.items()}
         self.constant_values = constant_values
 
     def evaluate_unop(self, operator, operand):
@@ -476,7 +845,8 @@ class CodeGenerator:
             raise ValueError(f"Unknown unary operator: {operator}")
 
     def optimize_strength_reduction(self):
-        print("Performing strength reduction optimizations...")
+        if self.verbose:
+            print("Performing strength reduction optimizations...")
         optimized_instructions = []
         for instr in self.instructions:
             tokens = tokenize_instruction(instr)
@@ -511,7 +881,86 @@ class CodeGenerator:
                         temp_usage.add(token)
         return temp_usage
 
+    def allocate_registers(self):
+        # Linear scan over temp live ranges: temps whose ranges do not overlap share a
+        # register, so the executer needs only as many temp slots as are live at once.
+        parsed = [tokenize_instruction(instr) for instr in self.instructions]
+        if any(tokens and tokens[0] not in KNOWN_OPS for tokens in parsed):
+            return
+        ranges = live_ranges(parsed)
+
+        registers = {}
+        free = []
+        active = []  # heap of (last, register)
+        next_register = 1
+        for temp, (first, last) in sorted(ranges.items(), key=lambda item: item[1]):
+            while active and active[0][0] <= first:
+                heapq.heappush(free, heapq.heappop(active)[1])
+            if free:
+                register = heapq.heappop(free)
+            else:
+                register = next_register
+                next_register += 1
+            registers[temp] = f"t{register}"
+            heapq.heappush(active, (last, register))
+            self.register_pressure = max(self.register_pressure, len(active))
+
+        new_instructions = []
+        for instr, tokens in zip(self.instructions, parsed):
+            # only operand positions are renamed: a variable may also be called t1
+            positions = [i for i in temp_positions(tokens) if tokens[i] in registers]
+            if positions:
+                tokens = list(tokens)
+                for i in positions:
+                    tokens[i] = registers[tokens[i]]
+                instr = format_instruction(tokens)
+            new_instructions.append(instr)
+        self.instructions = new_instructions
+        if self.verbose:
+            print(f"Register allocation: {len(ranges)} temps in {self.register_pressure} registers")
+
+    def print_parallel_report(self):
+        for line, label, reason in self.parallel_report:
+            if reason is None:
+                print(f"Loop {label} (line {line}): iterations can run in parallel")
+            else:
+                print(f"Loop {label} (line {line}): runs serially, {reason}")
+
     def get_code(self):
-        code = "\n".join(self.instructions)
+        pool = [f"CONST k{index}, {format_literal(value)}" for index, value in enumerate(self.constants)]
+        code = "\n".join(pool + self.instructions)
         return code
+
+    def add_constant(self, value):
+        # keyed by type as well, so that 1 and 1.0 stay distinct
+        key = (type(value), value)
+        if key not in self.constant_ids:
+            self.constant_ids[key] = len(self.constants)
+            self.constants.append(value)
+        return f"k{self.constant_ids[key]}"
+
+    def build_constant_pool(self):
+        # Replaces every LOAD_CONST with an entry in a program-wide pool of typed,
+        # deduplicated constants. Instructions read the entries (k0, k1, ...) directly,
+        # so constants cost no instruction and no temp, even inside loops.
+        parsed = [tokenize_instruction(instr) for instr in self.instructions]
+        definitions = {}
+        for tokens in parsed:
+            if tokens and tokens[0] in DEST_INDEX:
+                dest = tokens[DEST_INDEX[tokens[0]]]
+                definitions[dest] = definitions.get(dest, 0) + 1
+
+        pooled = {}
+        for tokens in parsed:
+            if tokens and tokens[0] == "LOAD_CONST" and definitions[tokens[2]] == 1:
+                pooled[tokens[2]] = self.add_constant(parse_literal(tokens[1]))
+
+        to_remove = set()
+        for idx, tokens in enumerate(parsed):
+            if tokens and tokens[0] == "LOAD_CONST" and tokens[2] in pooled:
+                to_remove.add(idx)
+            elif any(token in pooled for token in tokens[1:]):
+                self.instructions[idx] = format_instruction(
+                    [tokens[0]] + [pooled.get(token, token) for token in tokens[1:]])
+        self.filter_instructions(to_remove)
     
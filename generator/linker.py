@@ -0,0 +1,182 @@
+"""
+Object units and the linker.
+
+Every source file of a program is a compilation unit (see pipeline/build.py),
+compiled on its own into an ObjectUnit: its optimized IR, with its own constant
+pool, label numbers and source lines, the interface of the procedures it
+defines (name, parameters, purity and the main program variables they or the
+procedures they call use) and the interfaces of the units it imports as they
+were when it was compiled. A unit only needs the interfaces of its imports to
+compile, not their code.
+
+link() joins the units of a program into one IR program:
+
+- the main program's unit comes first, then the procedures of the others;
+- the constant pools are merged and the k<i> operands renumbered;
+- the labels of every unit are renumbered past those of the units before it,
+  as every unit numbers its start_label_1, end_label_1 ... from 1;
+- a procedure may only be defined by one unit, and every CALL must name one.
+
+Object units are saved as MAGIC, one VERSION byte, then a marshal dump of
+their fields in the order of FIELDS.
+"""
+import marshal
+import re
+import zlib
+from array import array
+
+from .cfg import BRANCH_LABEL, use_positions
+from .generator import format_instruction, tokenize_instruction
+from .literals import format_literal
+from .parallel import ParallelLoop
+from .procedures import ImportedInfo, reachable_globals
+
+MAGIC = b"NUMERA-OBJECT"
+VERSION = 1
+FIELDS = ("name", "source", "options", "imports", "exports", "instructions", "lines", "constants",
+          "labels", "parallel_loops", "main")
+LABEL_NAME = re.compile(r"(start|end|else)_label_(\d+)$")
+
+
+def fingerprint(text):
+    return len(text), zlib.crc32(text.encode())
+
+
+class ObjectUnit:
+    def __init__(self, name, source, options, imports, exports, instructions, lines, constants,
+                 labels, parallel_loops, main):
+        self.name = name  # file name, for messages
+        self.source = source  # fingerprint of the source it was compiled from
+        self.options = options  # compile options it was compiled with
+        self.imports = imports  # [(import path as written, interface of that unit when compiled)]
+        self.exports = exports  # [(procedure, parameters, pure, main program variables it uses)]
+        self.instructions = instructions
+        self.lines = lines  # source line of every instruction, 0 if unknown
+        self.constants = constants  # constant pool, entry i is the operand k<i>
+        self.labels = labels  # highest label number used
+        self.parallel_loops = parallel_loops  # [(start label, ParallelLoop fields...)]
+        self.main = main  # whether it holds the main program
+
+    def interface(self):
+        # changes when, and only when, units importing it have to be compiled again
+        # (repr, as marshal output depends on which objects are shared)
+        return zlib.crc32(repr(self.exports).encode())
+
+    def imported_infos(self):
+        # {procedure: procedures.ImportedInfo} for the units that import this one
+        return {name: ImportedInfo(name, parameters, pure, globals)
+                for name, parameters, pure, globals in self.exports}
+
+
+def object_unit(generator, program, name, source, options, imports, main):
+    # the ObjectUnit of a program CodeGenerator has generated
+    reachable = reachable_globals(generator.procedures)
+    exports = [(procedure.name, tuple(parameter.name for parameter in procedure.parameters),
+                procedure.name in generator.pure_procedures, tuple(sorted(reachable[procedure.name])))
+               for procedure in program.procedures or []]
+    loops = [(label, loop.counter, loop.operator, loop.bound, loop.step, loop.reductions, list(loop.privates))
+             for label, loop in generator.parallel_loops.items()]
+    labels = max(generator.start_label_counter, generator.end_label_counter, generator.else_label_counter)
+    return ObjectUnit(name, source, options, imports, exports, list(generator.instructions),
+                      list(generator.lines), list(generator.constants), labels, loops, main)
+
+def save(unit):
+    return MAGIC + bytes([VERSION]) + marshal.dumps(tuple(getattr(unit, field) for field in FIELDS))
+
+def load(data):
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a Numera object unit")
+    version = data[len(MAGIC)]
+    if version != VERSION:
+        raise ValueError(f"Unsupported object unit version {version}, expected {VERSION}")
+    return ObjectUnit(*marshal.loads(data[len(MAGIC) + 1:]))
+
+
+class Linked:
+    def __init__(self, code, source_map, parallel_loops, units, constants):
+        self.code = code
+        self.source_map = source_map  # lines of the main program's unit, 0 in the others
+        self.parallel_loops = parallel_loops
+        self.units = units
+        self.constants = constants
+
+    def report(self):
+        return (f"Linked: {self.units} units, {len(self.source_map)} instructions, "
+                f"{self.constants} constants")
+
+
+def relabel(label, offset):
+    match = LABEL_NAME.match(label)
+    if match is None:
+        return label
+    return f"{match.group(1)}_label_{int(match.group(2)) + offset}"
+
+def label_positions(tokens):
+    if tokens[0] in ("LABEL", "JUMP"):
+        return [1]
+    if tokens[0] in BRANCH_LABEL:
+        return [BRANCH_LABEL[tokens[0]]]
+    return []
+
+
+def link(units):
+    # units: the ObjectUnits of a program, the one holding the main program first
+    if not units or not units[0].main:
+        raise ValueError("Nothing to link: no unit holds the main program")
+    defined = {}
+    for unit in units:
+        for name, _, _, _ in unit.exports:
+            if name in defined:
+                raise ValueError(f"Procedure {name} is defined in both {defined[name]} and {unit.name}")
+            defined[name] = unit.name
+
+    procedures = any(unit.exports for unit in units[1:])
+    pool, pool_ids = [], {}
+    instructions, lines = [], []
+    parallel_loops = {}
+    offset = 0
+    for position, unit in enumerate(units):
+        renamed = {}
+        for index, value in enumerate(unit.constants):
+            key = (type(value), value)  # as in CodeGenerator.add_constant
+            if key not in pool_ids:
+                pool_ids[key] = len(pool)
+                pool.append(value)
+            renamed[f"k{index}"] = f"k{pool_ids[key]}"
+
+        code, code_lines = unit.instructions, unit.lines
+        if position > 0:
+            # only the procedures; the main program part of another unit is a bare RET
+            start = next((index for index, instr in enumerate(code) if instr.startswith("PROC ")), len(code))
+            code, code_lines = code[start:], code_lines[start:]
+        elif procedures and not any(instr.startswith("PROC ") for instr in code):
+            # the main program has to end before the procedures that now follow it
+            code, code_lines = code + ["RET"], code_lines + [0]
+
+        moved = {old: new for old, new in renamed.items() if old != new}
+        for instr, line in zip(code, code_lines):
+            op = instr.split(" ", 1)[0]
+            # most instructions have neither a label nor a pool operand to rename
+            if op == "CALL" or (offset and (op in ("LABEL", "JUMP") or op in BRANCH_LABEL)) \
+                    or (moved and " k" in instr):
+                tokens = tokenize_instruction(instr)
+                if op == "CALL" and tokens[1] not in defined:
+                    raise ValueError(f"Undefined procedure {tokens[1]} called in {unit.name}")
+                labels = label_positions(tokens) if offset else []
+                constants = [i for i in use_positions(tokens) if tokens[i] in moved]
+                if labels or constants:
+                    tokens = list(tokens)
+                    for i in labels:
+                        tokens[i] = relabel(tokens[i], offset)
+                    for i in constants:
+                        tokens[i] = moved[tokens[i]]
+                    instr = format_instruction(tokens)
+            instructions.append(instr)
+            lines.append(line if position == 0 else 0)
+
+        for label, *fields in unit.parallel_loops:
+            parallel_loops[relabel(label, offset)] = ParallelLoop(*fields)
+        offset += unit.labels
+
+    constants = [f"CONST k{index}, {format_literal(value)}" for index, value in enumerate(pool)]
+    return Linked("\n".join(constants + instructions), array('i', lines), parallel_loops, len(units), len(pool))
@@ -0,0 +1,19 @@
+# Constants as written in the IR: in CONST and LOAD_CONST, strings are quoted, numbers as they print
+
+def parse_literal(text):
+    # typed value of a constant as written in the IR
+    if text.startswith('"') and text.endswith('"'):
+        return text[1:-1]
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return text
+
+def format_literal(value):
+    # IR text of a constant, read back by parse_literal
+    if isinstance(value, str):
+        return f'"{value}"'
+    return str(value)
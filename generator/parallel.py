@@ -0,0 +1,162 @@
+"""
+Dependence analysis of while loops, to find the ones whose iterations can run
+in parallel (see executer/parallel.py).
+
+A loop qualifies when it is a counted loop
+
+    while i < n do       (or <=, >, >=; n an integer constant or a variable
+        ...               the loop does not write)
+        i = i + 1;       (exactly once, unconditionally, in the loop body)
+        ...
+    end
+
+that neither prints, reads input, writes array elements nor calls a procedure
+that is not pure (see generator/procedures.py), and every other variable it
+writes is
+
+- private: its first use in the body is an unconditional assignment that does
+  not read it, so no iteration sees the value of the previous one, or
+- a reduction: it only appears in assignments s = s + e or s = s * e (either
+  operand order, one operator per variable) where e does not read s.
+"""
+from parser.ast_node import *
+from .procedures import expression_nodes
+
+IDENTITIES = {"+": 0, "*": 1}
+# direction the counter has to move in for the loop to terminate
+DIRECTIONS = {"<": 1, "<=": 1, ">": -1, ">=": -1}
+
+
+class Unsupported(Exception):
+    # what in a loop body keeps it from running in parallel
+    pass
+
+
+class ParallelLoop:
+    def __init__(self, counter, operator, bound, step, reductions, privates):
+        self.counter = counter
+        self.operator = operator
+        self.bound = bound  # int, or the name of the variable holding it
+        self.step = step
+        self.reductions = reductions  # variable -> "+" or "*"
+        self.privates = privates
+
+
+def reads(expr):
+    return {node.name for node in expression_nodes(expr) if isinstance(node, Identifier)}
+
+
+class LoopAnalysis:
+    def __init__(self, pure_procedures=()):
+        self.pure_procedures = pure_procedures
+        self.uses = {}  # variable -> [(statement, is a write, top level)] in program order
+
+    def use(self, name, statement, write, top_level):
+        self.uses.setdefault(name, []).append((statement, write, top_level))
+
+    def expression(self, expr, statement, top_level):
+        for node in expression_nodes(expr):
+            if isinstance(node, Input):
+                raise Unsupported("reads input")
+            if isinstance(node, Call) and node.name not in self.pure_procedures:
+                raise Unsupported(f"calls {node.name}, which is not pure")
+            if isinstance(node, Identifier):
+                self.use(node.name, statement, False, top_level)
+
+    def block(self, statements, top_level):
+        for statement in statements:
+            if isinstance(statement, PrintStatement):
+                raise Unsupported("prints")
+            if isinstance(statement, ArrayAssignment):
+                raise Unsupported("writes array elements")
+            if isinstance(statement, AssignmentStatement):
+                self.expression(statement.value, statement, top_level)
+                self.use(statement.target.name, statement, True, top_level)
+            elif isinstance(statement, IfStatement):
+                self.expression(statement.condition, statement, False)
+                self.block(statement.then_block, False)
+                self.block(statement.else_block or [], False)
+            elif isinstance(statement, WhileStatement):
+                self.expression(statement.condition, statement, False)
+                self.block(statement.body, False)
+            else:
+                raise Unsupported(f"contains {type(statement).__name__}")
+
+    def counter_step(self, counter, direction):
+        writes = [(statement, top_level) for statement, write, top_level in self.uses[counter] if write]
+        if len(writes) != 1 or not writes[0][1]:
+            return None
+        value = writes[0][0].value
+        if (isinstance(value, BinaryOperation) and value.operator in ("+", "-")
+                and isinstance(value.left, Identifier) and value.left.name == counter
+                and isinstance(value.right, Constant) and type(value.right.value) is int):
+            step = value.right.value if value.operator == "+" else -value.right.value
+            if step * direction > 0:
+                return step
+        return None
+
+    def is_private(self, name):
+        statement, write, top_level = self.uses[name][0]
+        return write and top_level and name not in reads(statement.value)
+
+    def reduction(self, name):
+        operators = set()
+        for statement, write, top_level in self.uses[name]:
+            if not (isinstance(statement, AssignmentStatement) and statement.target.name == name):
+                return None
+            value = statement.value
+            if not (isinstance(value, BinaryOperation) and value.operator in IDENTITIES):
+                return None
+            if isinstance(value.left, Identifier) and value.left.name == name:
+                rest = value.right
+            elif isinstance(value.right, Identifier) and value.right.name == name:
+                rest = value.left
+            else:
+                return None
+            if name in reads(rest):
+                return None
+            operators.add(value.operator)
+        return operators.pop() if len(operators) == 1 else None
+
+
+def analyze_loop(node, pure_procedures=()):
+    # returns (ParallelLoop, None) or (None, the reason the loop has to run serially)
+    condition = node.condition
+    if not (isinstance(condition, BinaryOperation) and condition.operator in DIRECTIONS
+            and isinstance(condition.left, Identifier)):
+        return None, "not a counted loop (condition is not <counter> <, <=, > or >= <bound>)"
+    counter = condition.left.name
+    if isinstance(condition.right, Constant) and type(condition.right.value) is int:
+        bound = condition.right.value
+    elif isinstance(condition.right, Identifier) and condition.right.name != counter:
+        bound = condition.right.name
+    else:
+        return None, "loop bound is neither an integer constant nor a variable"
+
+    analysis = LoopAnalysis(pure_procedures)
+    try:
+        analysis.block(node.body, True)
+    except Unsupported as e:
+        return None, f"loop body {e}"
+
+    if counter not in analysis.uses:
+        return None, f"counter {counter} is not updated in the loop"
+    step = analysis.counter_step(counter, DIRECTIONS[condition.operator])
+    if step is None:
+        return None, f"counter {counter} is not stepped towards the bound exactly once per iteration"
+
+    reductions = {}
+    privates = []
+    for name, uses in analysis.uses.items():
+        if name == counter or not any(write for _, write, _ in uses):
+            continue
+        if name == bound:
+            return None, f"loop bound {name} changes inside the loop"
+        if analysis.is_private(name):
+            privates.append(name)
+            continue
+        operator = analysis.reduction(name)
+        if operator is None:
+            return None, f"{name} is carried from one iteration to the next"
+        reductions[name] = operator
+    return ParallelLoop(counter, condition.operator, bound, step, reductions, privates), None
@@ -0,0 +1,144 @@
+"""
+Profile-guided optimization: what the compiler does with an
+executer/feedback.Profile recorded by a previous run of the same source.
+
+- Inliner replaces hot calls of procedures that only return an expression by
+  that expression, with the arguments in place of the parameters.
+- generator.generate_loop moves the test of hot loops to the bottom of their
+  body, so an iteration runs straight through and ends in one conditional
+  back edge.
+- generator/unroll.py leaves loops the profile run hardly iterated alone, and
+  unrolls counted loops whose counter was always an integer, though not known
+  to be one, behind an IsInt guard.
+
+A loop is hot when the profile run went round it HOT_ITERATIONS times, a call
+when its line ran HOT_CALLS calls. Without a profile none of this happens.
+"""
+from parser.ast_node import *
+from .procedures import BUILTINS, analyze_procedures, expression_nodes, statements
+
+HOT_ITERATIONS = 1000
+HOT_CALLS = 1000
+INLINE_MAX_SIZE = 24  # expression nodes of an inlined return value
+
+# statement class -> its fields holding expressions
+EXPRESSION_FIELDS = {Declaration: ("initial_value",), IfStatement: ("condition",),
+                     WhileStatement: ("condition",), PrintStatement: ("expression",),
+                     AssignmentStatement: ("value",), ArrayAssignment: ("target", "value"),
+                     CallStatement: ("call",), ReturnStatement: ("value",)}
+
+
+def hot_loop(profile, line):
+    trips = profile.loop(line)
+    return trips is not None and trips[1] >= HOT_ITERATIONS
+
+def cold_loop(profile, line):
+    # hot_loop's opposite, but False when the profile knows nothing about the loop
+    trips = profile.loop(line)
+    return trips is not None and trips[1] < HOT_ITERATIONS
+
+def observed_int(profile, line, operator):
+    # whether the profile run saw the left operand of operator at line, and only integers there
+    seen = profile.types_at(line, operator)
+    return bool(seen) and all(left == "int" for left, _ in seen)
+
+def bind(node, values):
+    # a copy of the expression node with the parameters in values replaced by copies of their values
+    if isinstance(node, list):
+        return [bind(item, values) for item in node]
+    if isinstance(node, Identifier) and node.name in values:
+        return bind(values[node.name], {})
+    if isinstance(node, ArrayElement) and node.name in values:
+        return ArrayElement(values[node.name].name, bind(node.index, values))
+    fields = getattr(node, "__node_fields__", None)
+    if fields is None:
+        return node
+    copy = object.__new__(node.__class__)
+    for name in fields:
+        setattr(copy, name, bind(getattr(node, name), values))
+    return copy
+
+
+class Inliner:
+    def __init__(self, profile):
+        self.profile = profile
+        self.candidates = {}  # name -> Procedure whose body is one return statement
+        self.pure = set()
+        self.inlined = 0
+        self.procedures = set()  # procedures inlined at least once
+
+    def report(self):
+        return f"Inlined: {self.inlined} hot calls of {len(self.procedures)} procedures"
+
+    def inline(self, program):
+        procedures = program.procedures or []
+        _, self.pure = analyze_procedures(procedures, program.imported)
+        for procedure in procedures:
+            body = procedure.body
+            if (procedure.name in self.pure and len(body) == 1 and isinstance(body[0], ReturnStatement)
+                    and body[0].value is not None
+                    and sum(1 for _ in expression_nodes(body[0].value)) <= INLINE_MAX_SIZE):
+                self.candidates[procedure.name] = procedure
+        if not self.candidates:
+            return program
+        self.block(program.declarations, None)
+        self.block(program.statements, None)
+        for procedure in procedures:
+            self.block(procedure.body, procedure.name)
+        return program
+
+    def block(self, block, scope):
+        for statement in statements(block):
+            if self.profile.calls_at(statement.line) < HOT_CALLS:
+                continue
+            for field in EXPRESSION_FIELDS.get(type(statement), ()):
+                expr = getattr(statement, field)
+                if expr is not None:
+                    setattr(statement, field, self.expression(expr, scope))
+
+    def expression(self, expr, scope):
+        # expr with the calls that can be inlined replaced; scope: the procedure it is in
+        if isinstance(expr, BinaryOperation):
+            expr.left = self.expression(expr.left, scope)
+            expr.right = self.expression(expr.right, scope)
+        elif isinstance(expr, (UnaryOperation, IsInt)):
+            expr.operand = self.expression(expr.operand, scope)
+        elif isinstance(expr, ArrayElement):
+            expr.index = self.expression(expr.index, scope)
+        elif isinstance(expr, Call):
+            expr.arguments = [self.expression(argument, scope) for argument in expr.arguments]
+            if expr.name in self.candidates and expr.name != scope:
+                inlined = self.call(expr)
+                if inlined is not None:
+                    self.inlined += 1
+                    self.procedures.add(expr.name)
+                    return inlined
+        return expr
+
+    def call(self, call):
+        # the return value of the procedure call runs with its arguments bound, None if
+        # that could evaluate them a different number of times or in a different order
+        procedure = self.candidates[call.name]
+        parameters = [parameter.name for parameter in procedure.parameters]
+        if len(parameters) != len(call.arguments):
+            return None  # left for the generator to report
+        value = procedure.body[0].value
+        uses = {name: 0 for name in parameters}
+        arrays = set()
+        for node in expression_nodes(value):
+            if isinstance(node, (Identifier, ArrayElement)) and node.name in uses:
+                uses[node.name] += 1
+                if isinstance(node, ArrayElement):
+                    arrays.add(node.name)
+        for name, argument in zip(parameters, call.arguments):
+            if name in arrays and not isinstance(argument, Identifier):
+                return None
+            if isinstance(argument, (Identifier, Constant)):
+                continue
+            # any other argument is evaluated where the parameter is read, so it must
+            # be read once and nothing may depend on when that happens
+            if uses[name] != 1 or any(isinstance(node, Input) or (isinstance(node, Call) and node.name not in BUILTINS
+                                                                   and node.name not in self.pure)
+                                      for node in expression_nodes(argument)):
+                return None
+        return bind(value, dict(zip(parameters, call.arguments)))
@@ -0,0 +1,127 @@
+"""
+Scope and side-effect analysis of procedures.
+
+Parameters and the variables a procedure declares are local to each call;
+every other name it uses refers to a variable of the main program. A
+procedure is pure when a call can be replaced by a previous result for the
+same arguments: it neither prints nor reads input, does not read or write
+main program variables, and only calls pure procedures.
+
+The array builtins are called like procedures but generated inline; they
+touch nothing but the array they are given.
+"""
+from parser.ast_node import *
+
+# builtin name -> True if it writes its array
+BUILTINS = {"len": False, "sum": False, "min": False, "max": False, "fill": True}
+
+
+def statements(block):
+    # every statement of a block, nested blocks included
+    for statement in block or []:
+        yield statement
+        if isinstance(statement, IfStatement):
+            yield from statements(statement.then_block)
+            yield from statements(statement.else_block)
+        elif isinstance(statement, WhileStatement):
+            yield from statements(statement.body)
+
+def expressions(statement):
+    # the expression trees evaluated directly by a statement
+    if isinstance(statement, Declaration):
+        return [statement.initial_value] if statement.initial_value is not None else []
+    if isinstance(statement, (IfStatement, WhileStatement)):
+        return [statement.condition]
+    if isinstance(statement, PrintStatement):
+        return [statement.expression]
+    if isinstance(statement, AssignmentStatement):
+        return [statement.value]
+    if isinstance(statement, ArrayAssignment):
+        return [statement.target, statement.value]
+    if isinstance(statement, CallStatement):
+        return [statement.call]
+    if isinstance(statement, ReturnStatement):
+        return [statement.value] if statement.value is not None else []
+    return []
+
+def expression_nodes(expr):
+    yield expr
+    if isinstance(expr, BinaryOperation):
+        yield from expression_nodes(expr.left)
+        yield from expression_nodes(expr.right)
+    elif isinstance(expr, (UnaryOperation, IsInt)):
+        yield from expression_nodes(expr.operand)
+    elif isinstance(expr, Call):
+        for argument in expr.arguments:
+            yield from expression_nodes(argument)
+    elif isinstance(expr, ArrayElement):
+        yield from expression_nodes(expr.index)
+
+def procedure_locals(procedure):
+    names = {parameter.name for parameter in procedure.parameters}
+    names.update(statement.name for statement in statements(procedure.body)
+                 if isinstance(statement, (Declaration, ArrayDeclaration)))
+    return names
+
+
+class ProcedureInfo:
+    def __init__(self, procedure):
+        self.procedure = procedure
+        self.locals = procedure_locals(procedure)
+        self.globals = set()  # main program variables it reads or writes
+        self.calls = set()
+        self.side_effects = False  # prints or reads input
+        for statement in statements(procedure.body):
+            if isinstance(statement, PrintStatement):
+                self.side_effects = True
+            if isinstance(statement, AssignmentStatement) and statement.target.name not in self.locals:
+                self.globals.add(statement.target.name)
+            for expr in expressions(statement):
+                for node in expression_nodes(expr):
+                    if isinstance(node, Input):
+                        self.side_effects = True
+                    elif isinstance(node, (Identifier, ArrayElement)) and node.name not in self.locals:
+                        self.globals.add(node.name)
+                    elif isinstance(node, Call) and node.name not in BUILTINS:
+                        self.calls.add(node.name)
+
+
+class ImportedInfo:
+    # ProcedureInfo of a procedure of another compilation unit, built from the interface it
+    # exports (see generator/linker.py); its globals include those of the procedures it calls
+    def __init__(self, name, parameters, pure, globals):
+        self.procedure = Procedure(name, [Identifier(parameter) for parameter in parameters], [])
+        self.locals = set(parameters)
+        self.globals = set(globals)
+        self.calls = set()
+        self.side_effects = not pure
+
+
+def analyze_procedures(procedures, imported=None):
+    # returns {name: ProcedureInfo}, and the names of the pure procedures;
+    # imported: {name: ImportedInfo} of the procedures of other units that can be called
+    infos = dict(imported or {})
+    infos.update((procedure.name, ProcedureInfo(procedure)) for procedure in procedures)
+    pure = {name for name, info in infos.items() if not info.side_effects and not info.globals}
+    changed = True
+    while changed:
+        changed = False
+        for name in list(pure):
+            if not infos[name].calls <= pure:
+                pure.discard(name)
+                changed = True
+    return infos, pure
+
+def reachable_globals(infos):
+    # {name: main program variables the procedure or a procedure it calls uses}
+    reachable = {}
+    for name in infos:
+        used, seen, stack = set(), {name}, [name]
+        while stack:
+            info = infos[stack.pop()]
+            used |= info.globals
+            callees = info.calls & infos.keys() - seen
+            seen |= callees
+            stack += callees
+        reachable[name] = used
+    return reachable
@@ -0,0 +1,355 @@
+"""
+Algebraic simplification of ast_node trees, run between parsing and code
+generation.
+
+- constant folding, through whole subtrees: (1 + 2) * 3 becomes 9
+- identities: x + 0, x - 0, x * 1 become x; x * 0 and x - x become 0;
+  x == x, x <= x, x >= x become 1 and x != x, x < x, x > x become 0
+- reassociation of constants: (x + 1) + 2 becomes x + 3, (x * 2) * 3 x * 6
+- conditions: not not c becomes c where only its truth matters, not (a < b)
+  becomes a >= b, and if not c then A else B end becomes if c then B else A end;
+  and / or with a constant operand reduce to the other operand or a constant
+- dead code: branches of constant conditions, while loops that never run, ifs
+  with nothing in either branch and statements after a return
+
+Numera variables are untyped, and x + 0 is an error for a string while x * 0
+is 0.0 for a float, so identities and reassociation only apply to operands
+that are known to be integers: integer constants, variables every assignment
+of which stores an integer (a flow-insensitive fixed point over the program),
+and arithmetic and comparisons of those. An operand is only dropped (x * 0,
+x - x) when evaluating it can neither fail nor have an effect. Folding leaves
+alone any operation that would fail, so the error still happens when it runs.
+
+The tree is simplified in place; arena views are read-only and not supported.
+"""
+from parser.ast_node import *
+from .procedures import procedure_locals, statements
+
+INVERSE = {"==": "!=", "!=": "==", "<": ">=", ">=": "<", ">": "<=", "<=": ">"}
+NEGATIONS = ("not", "!")
+ARITHMETIC = ("+", "-", "*")
+LOGICAL = ("and", "or")
+NOT_FOLDED = object()
+
+STATS = (("folded", "constants folded"), ("identities", "identities applied"),
+         ("reassociated", "constants reassociated"), ("conditions", "conditions simplified"),
+         ("branches", "dead branches removed"), ("unreachable", "unreachable statements removed"))
+
+
+def fold(operator, left, right=NOT_FOLDED):
+    # the value the executer would compute, NOT_FOLDED if it would fail
+    try:
+        if right is NOT_FOLDED:
+            if operator in NEGATIONS:
+                return int(not left)
+            return -left if operator == "-" else NOT_FOLDED
+        if operator == "+":
+            return left + right
+        if operator == "-":
+            return left - right
+        if operator == "*":
+            return left * right
+        if operator == "/":
+            return left / right
+        if operator == "==":
+            return int(left == right)
+        if operator == "!=":
+            return int(left != right)
+        if operator == "<":
+            return int(left < right)
+        if operator == "<=":
+            return int(left <= right)
+        if operator == ">":
+            return int(left > right)
+        if operator == ">=":
+            return int(left >= right)
+    except (TypeError, ArithmeticError):
+        pass
+    return NOT_FOLDED
+
+def is_constant(expr, value=None):
+    # an integer constant, equal to value if given
+    return (isinstance(expr, Constant) and type(expr.value) is int
+            and (value is None or expr.value == value))
+
+def is_int(expr, ints):
+    # whether expr evaluates to an integer whenever it evaluates at all
+    if isinstance(expr, Constant):
+        return type(expr.value) is int
+    if isinstance(expr, Identifier):
+        return expr.name in ints
+    if isinstance(expr, BinaryOperation):
+        if expr.operator in INVERSE:
+            return True
+        return expr.operator in ARITHMETIC and is_int(expr.left, ints) and is_int(expr.right, ints)
+    if isinstance(expr, UnaryOperation):
+        return expr.operator in NEGATIONS or (expr.operator == "-" and is_int(expr.operand, ints))
+    return isinstance(expr, Call) and expr.name == "len"
+
+def is_safe_int(expr, ints):
+    # an integer expression whose evaluation can neither fail nor have side effects
+    if isinstance(expr, Constant):
+        return type(expr.value) is int
+    if isinstance(expr, Identifier):
+        return expr.name in ints
+    if isinstance(expr, BinaryOperation):
+        return ((expr.operator in ARITHMETIC or expr.operator in INVERSE)
+                and is_safe_int(expr.left, ints) and is_safe_int(expr.right, ints))
+    if isinstance(expr, UnaryOperation):
+        return (expr.operator in NEGATIONS or expr.operator == "-") and is_safe_int(expr.operand, ints)
+    return False
+
+def is_boolean(expr):
+    # only ever 0 or 1
+    return ((isinstance(expr, BinaryOperation) and expr.operator in INVERSE)
+            or (isinstance(expr, UnaryOperation) and expr.operator in NEGATIONS)
+            or is_constant(expr, 0) or is_constant(expr, 1))
+
+def split_offset(expr):
+    # (e, c) with expr computing e + c for an integer constant c, or None
+    if isinstance(expr, BinaryOperation) and expr.operator in ("+", "-"):
+        if is_constant(expr.right):
+            return expr.left, expr.right.value if expr.operator == "+" else -expr.right.value
+        if expr.operator == "+" and is_constant(expr.left):
+            return expr.right, expr.left.value
+    return None
+
+
+def is_string(expr, strings):
+    # whether expr evaluates to a string whenever it evaluates at all
+    if isinstance(expr, Constant):
+        return type(expr.value) is str
+    if isinstance(expr, Identifier):
+        return expr.name in strings
+    # string + anything is a string or an error
+    return isinstance(expr, BinaryOperation) and expr.operator == "+" and is_string(expr.left, strings)
+
+def infer_variables(program, is_kind, uninitialized):
+    # {None: main program variables, procedure name: variables visible in it} that only
+    # ever hold values of one kind: is_kind(expr, variables of that kind) tells whether
+    # expr has it, uninitialized whether the 0 of a declaration without a value does
+    procedures = program.procedures or []
+    scopes = {None: program.declarations + program.statements}
+    scopes.update((procedure.name, procedure.body) for procedure in procedures)
+    locals_of = {procedure.name: procedure_locals(procedure) for procedure in procedures}
+
+    kinds = {scope: set() for scope in scopes}
+    arrays = {scope: set() for scope in scopes}
+    assignments = []  # (scope of the variable, its name, scope of the assignment, value or None)
+    for scope, block in scopes.items():
+        for statement in statements(block):
+            if isinstance(statement, (Declaration, AssignmentStatement)):
+                name = statement.name if isinstance(statement, Declaration) else statement.target.name
+                owner = scope if scope is not None and name in locals_of[scope] else None
+                if isinstance(statement, Declaration):
+                    value = statement.initial_value
+                    if value is not None or uninitialized:
+                        kinds[owner].add(name)
+                else:
+                    value = statement.value
+                assignments.append((owner, name, scope, value))
+            elif isinstance(statement, ArrayDeclaration):
+                arrays[scope].add(statement.name)
+    for scope in scopes:
+        kinds[scope] -= arrays[scope]
+    for info in (program.imported or {}).values():
+        # procedures of other units may assign anything to the variables they use
+        kinds[None] -= info.globals
+
+    def visible(scope):
+        if scope is None:
+            return kinds[None]
+        return kinds[scope] | (kinds[None] - locals_of[scope])
+
+    changed = True
+    while changed:
+        changed = False
+        views = {scope: visible(scope) for scope in scopes}
+        for owner, name, scope, value in assignments:
+            if name in kinds[owner] and value is not None and not is_kind(value, views[scope]):
+                kinds[owner].discard(name)
+                changed = True
+    return {scope: visible(scope) for scope in scopes}
+
+def infer_ints(program):
+    return infer_variables(program, is_int, True)
+
+def infer_strings(program):
+    return infer_variables(program, is_string, False)
+
+
+class Simplifier:
+    def __init__(self):
+        self.stats = dict.fromkeys((key for key, _ in STATS), 0)
+        self.ints = set()  # variables of the current scope known to hold integers
+
+    def report(self):
+        return "Simplified: " + ", ".join(f"{self.stats[key]} {label}" for key, label in STATS)
+
+    def simplify(self, program):
+        ints = infer_ints(program)
+        self.ints = ints[None]
+        program.declarations = self.block(program.declarations)
+        program.statements = self.block(program.statements)
+        for procedure in program.procedures or []:
+            self.ints = ints[procedure.name]
+            procedure.body = self.block(procedure.body)
+        self.ints = set()
+        return program
+
+    def block(self, block):
+        result = []
+        for position, statement in enumerate(block or []):
+            result.extend(self.statement(statement))
+            if result and isinstance(result[-1], ReturnStatement):
+                self.stats["unreachable"] += len(block) - position - 1
+                break
+        return result
+
+    def statement(self, node):
+        # the statements node simplifies to
+        if isinstance(node, Declaration):
+            if node.initial_value is not None:
+                node.initial_value = self.expression(node.initial_value)
+        elif isinstance(node, (AssignmentStatement, ArrayAssignment)):
+            if isinstance(node, ArrayAssignment):
+                node.target = self.expression(node.target)
+            node.value = self.expression(node.value)
+        elif isinstance(node, PrintStatement):
+            node.expression = self.expression(node.expression)
+        elif isinstance(node, CallStatement):
+            node.call = self.expression(node.call)
+        elif isinstance(node, ReturnStatement):
+            if node.value is not None:
+                node.value = self.expression(node.value)
+        elif isinstance(node, IfStatement):
+            return self.if_statement(node)
+        elif isinstance(node, WhileStatement):
+            node.condition = self.expression(node.condition, condition=True)
+            if isinstance(node.condition, Constant) and not node.condition.value:
+                self.stats["branches"] += 1
+                return []
+            node.body = self.block(node.body)
+        return [node]
+
+    def if_statement(self, node):
+        condition = self.expression(node.condition, condition=True)
+        then_block = self.block(node.then_block)
+        else_block = self.block(node.else_block)
+        if isinstance(condition, Constant):
+            self.stats["branches"] += 1
+            return then_block if condition.value else else_block
+        if not then_block and not else_block and is_safe_int(condition, self.ints):
+            self.stats["branches"] += 1
+            return []
+        if (isinstance(condition, UnaryOperation) and condition.operator in NEGATIONS and else_block):
+            self.stats["conditions"] += 1
+            condition = condition.operand
+            then_block, else_block = else_block, then_block
+        node.condition = condition
+        node.then_block = then_block
+        node.else_block = else_block or None
+        return [node]
+
+    def expression(self, expr, condition=False):
+        # condition: only the truth of the value matters
+        if isinstance(expr, BinaryOperation) and expr.operator in LOGICAL:
+            # only in conditions, and their operands are only tested for truth
+            return self.logical(expr.operator, self.expression(expr.left, condition=True),
+                                self.expression(expr.right, condition=True))
+        if isinstance(expr, BinaryOperation):
+            return self.binary(expr.operator, self.expression(expr.left), self.expression(expr.right))
+        if isinstance(expr, UnaryOperation):
+            # the operand of a negation is itself only tested for truth
+            operand = self.expression(expr.operand, condition=expr.operator in NEGATIONS)
+            return self.unary(expr.operator, operand, condition)
+        if isinstance(expr, Call):
+            expr.arguments = [self.expression(argument) for argument in expr.arguments]
+        elif isinstance(expr, ArrayElement):
+            expr.index = self.expression(expr.index)
+        return expr
+
+    def binary(self, operator, left, right):
+        if isinstance(left, Constant) and isinstance(right, Constant):
+            value = fold(operator, left.value, right.value)
+            if value is not NOT_FOLDED:
+                self.stats["folded"] += 1
+                return Constant(value)
+        ints = self.ints
+        if operator in ("+", "-"):
+            inner = None
+            if is_constant(right):
+                inner, outer = split_offset(left), right.value if operator == "+" else -right.value
+            elif operator == "+" and is_constant(left):
+                inner, outer = split_offset(right), left.value
+            if inner is not None and is_int(inner[0], ints):
+                self.stats["reassociated"] += 1
+                return self.offset(inner[0], inner[1] + outer)
+            if is_constant(right, 0) and is_int(left, ints):
+                self.stats["identities"] += 1
+                return left
+            if operator == "+" and is_constant(left, 0) and is_int(right, ints):
+                self.stats["identities"] += 1
+                return right
+            if operator == "-" and left == right and is_safe_int(left, ints):
+                self.stats["identities"] += 1
+                return Constant(0)
+        elif operator == "*":
+            for constant, other in ((right, left), (left, right)):
+                if not is_constant(constant):
+                    continue
+                if isinstance(other, BinaryOperation) and other.operator == "*":
+                    for inner, rest in ((other.right, other.left), (other.left, other.right)):
+                        if is_constant(inner) and is_int(rest, ints):
+                            self.stats["reassociated"] += 1
+                            return self.binary("*", rest, Constant(inner.value * constant.value))
+                if constant.value == 1 and is_int(other, ints):
+                    self.stats["identities"] += 1
+                    return other
+                if constant.value == 0 and is_safe_int(other, ints):
+                    self.stats["identities"] += 1
+                    return Constant(0)
+        elif operator in INVERSE and left == right and is_safe_int(left, ints):
+            self.stats["identities"] += 1
+            return Constant(int(operator in ("==", "<=", ">=")))
+        return BinaryOperation(left, operator, right)
+
+    def logical(self, operator, left, right):
+        # and / or short-circuit: the right operand only runs when the left one does not decide
+        decides = 0 if operator == "and" else 1  # the truth of an operand that decides the result
+        if isinstance(left, Constant):
+            self.stats["conditions"] += 1
+            return Constant(decides) if bool(left.value) == decides else right
+        if isinstance(right, Constant):
+            if bool(right.value) != decides:
+                self.stats["conditions"] += 1
+                return left
+            if is_safe_int(left, self.ints):
+                self.stats["conditions"] += 1
+                return Constant(decides)
+        return BinaryOperation(left, operator, right)
+
+    def offset(self, expr, value):
+        # expr + value, with the sign folded into the operator
+        if value == 0:
+            return expr
+        return BinaryOperation(expr, "+" if value > 0 else "-", Constant(abs(value)))
+
+    def unary(self, operator, operand, condition):
+        if isinstance(operand, Constant):
+            value = fold(operator, operand.value)
+            if value is not NOT_FOLDED:
+                self.stats["folded"] += 1
+                return Constant(value)
+        if operator in NEGATIONS:
+            if isinstance(operand, UnaryOperation) and operand.operator in NEGATIONS:
+                if condition or is_boolean(operand.operand):
+                    self.stats["conditions"] += 1
+                    return operand.operand
+            if isinstance(operand, BinaryOperation) and operand.operator in INVERSE:
+                # == and != are exact opposites for any values, the orderings for integers
+                if operand.operator in ("==", "!=") or (is_int(operand.left, self.ints)
+                                                        and is_int(operand.right, self.ints)):
+                    self.stats["conditions"] += 1
+                    return BinaryOperation(operand.left, INVERSE[operand.operator], operand.right)
+        return UnaryOperation(operator, operand)
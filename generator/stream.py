@@ -0,0 +1,102 @@
+"""
+Streaming code generation for unoptimized builds.
+
+CodeGenerator keeps every instruction of a program, with its source line and
+the bookkeeping its optimization passes need, until optimize() has run and
+get_code() joins them into one string. StreamingGenerator.chunks instead
+yields the code of a program a few statements at a time, unoptimized, and
+forgets it once yielded, so the memory code generation takes does not grow
+with the size of the program:
+
+- the first chunk holds the procedures, behind a JUMP over them, as any of
+  them may be called from anywhere;
+- every further chunk holds top-level statements of the main program, whole,
+  and at least CHUNK_INSTRUCTIONS instructions of them unless it is the last.
+
+When a statement fails to generate, or the statements come from a parser
+(parser/stream.py) that fails, the statements before it are yielded as a last
+chunk before the error is raised, so they still run.
+
+Control never passes from one main program chunk back into an earlier one, so a
+consumer may drop a chunk once it has run (see executer/stream.py), and temps
+are numbered from 1 again in every chunk. The chunks joined in order are a
+program Execute runs like the optimized one.
+
+Nothing is optimized beyond what generation itself does (constant operands
+folded, expressions reused within a chunk), loops do not run in parallel and
+strings are not appended in place: these need to see the whole program.
+"""
+from itertools import chain
+
+from .generator import CodeGenerator
+
+CHUNK_INSTRUCTIONS = 1000
+
+
+class StreamingGenerator(CodeGenerator):
+    def __init__(self, verbose=False):
+        super().__init__(verbose)
+        self.emitted = 0  # instructions yielded so far
+        self.chunks_emitted = 0
+        self.largest = 0  # instructions of the largest chunk
+
+    def report(self):
+        return (f"Streamed: {self.emitted} instructions in {self.chunks_emitted} chunks, "
+                f"at most {self.largest} at a time")
+
+    def chunks(self, node):
+        # yields (instructions, source lines) of the program node, see above; string_vars
+        # stays empty, as a LOAD streamed before an APPEND to the variable could not join it
+        self.prepare_program(node)
+        if node.procedures:
+            skip_label = self.new_end_label()
+            self.add_instruction(f"JUMP {skip_label}")
+            for procedure in node.procedures:
+                self.generate(procedure)
+            self.add_instruction(f"LABEL {skip_label}")
+        yield self.flush()
+        statements = chain(node.declarations, node.statements)
+        while True:
+            generated = len(self.instructions)
+            try:
+                stmt = next(statements, None)
+                if stmt is None:
+                    break
+                self.generate(stmt)
+            except Exception:
+                # the statements before the one that failed still run
+                del self.instructions[generated:], self.lines[generated:]
+                if self.instructions:
+                    yield self.flush()
+                raise
+            if len(self.instructions) >= CHUNK_INSTRUCTIONS:
+                yield self.flush()
+        if self.instructions:
+            yield self.flush()
+
+    def flush(self):
+        # the chunk generated since the last one, after which generation starts afresh
+        chunk = self.instructions, self.lines
+        self.instructions, self.lines = [], []
+        self.emitted += len(chunk[0])
+        self.chunks_emitted += 1
+        self.largest = max(self.largest, len(chunk[0]))
+        self.temp_counter = 0
+        self.clear_expr_cache()
+        self.loaded_from.clear()
+        self.var_usage.clear()
+        self.var_assignments.clear()
+        self.parallel_loops.clear()
+        self.parallel_report.clear()
+        return chunk
+
+
+def write_code(chunks, file):
+    # writes the chunks to the text file file as one program; returns the instructions written
+    written = 0
+    for instructions, _ in chunks:
+        for instr in instructions:
+            file.write(instr)
+            file.write("\n")
+        written += len(instructions)
+    return written
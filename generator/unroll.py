@@ -0,0 +1,276 @@
+"""
+Unrolling of counted while loops, run on the simplified AST.
+
+A loop qualifies when it is a counted loop
+
+    while i < n do       (or <=, >, >=; n an integer constant)
+        ...
+        i = i + c;       (exactly once, unconditionally, in the loop body,
+        ...               towards the bound)
+    end
+
+whose body declares nothing, writes i nowhere else and calls no procedure
+that reads or writes i. When the value of i at the loop is a known integer
+(the last statement before it in the same block that sets i assigns a
+constant) and the loop runs at most FULL_UNROLL_MAX_TRIPS times, it is
+replaced by one copy of its body per iteration, with i replaced by its value
+in that iteration, followed by the assignment of the final value:
+
+    i = 0;                       i = 0;
+    while i < 3 do               print(a[0]);
+        print(a[i]);      =>     print(a[1]);
+        i = i + 1;               print(a[2]);
+    end                          i = 3;
+
+Any other qualifying loop over an integer counter is unrolled by the factor f:
+a main loop runs f copies of the body per iteration, as long as all f of them
+are allowed by the bound, and the original loop runs the remaining ones:
+
+    while i < 100 - 3 do         (f = 4)
+        ... i ... i + 1 ... i + 2 ... i + 3 ...
+        i = i + 4;
+    end
+    while i < 100 do ... end
+
+Both save the condition check and back jump of all but one iteration in f,
+and the copies keep the single counter update the parallel loop and bounds
+check analyses look for. The copies are simplified again, which folds the
+substituted values. An unrolled body is at most MAX_UNROLLED_SIZE statements
+and expression nodes, and all unrolling adds at most MAX_GROWTH of them to the
+program.
+
+Given a profile of a previous run (see generator/pgo.py), loops it hardly went
+round are not unrolled, which leaves the growth allowed to the others. A counter not
+known to hold an integer, but only seen holding integers by the loop condition
+in the profile run, is checked for one where the main loop starts:
+
+    if <i holds an integer> then       (an IsInt condition)
+        while i < 97 do ... end
+    end
+    while i < 100 do ... end
+
+The original loop runs all iterations when the check fails.
+"""
+from parser.ast_node import *
+from .parallel import DIRECTIONS
+from .pgo import cold_loop, observed_int
+from .procedures import (BUILTINS, analyze_procedures, expressions, expression_nodes, reachable_globals,
+                         statements)
+from .simplifier import fold, infer_ints, is_constant
+
+UNROLL_FACTOR = 4
+FULL_UNROLL_MAX_TRIPS = 16
+MAX_UNROLLED_SIZE = 400
+MAX_GROWTH = 4000
+
+
+def size(block):
+    # statements and expression nodes of a block
+    return sum(1 + sum(sum(1 for _ in expression_nodes(expr)) for expr in expressions(statement))
+               for statement in statements(block))
+
+def substitute(node, counter, value):
+    # a copy of node with every read of counter replaced by a copy of value
+    if isinstance(node, list):
+        return [substitute(item, counter, value) for item in node]
+    if isinstance(node, Identifier) and node.name == counter:
+        return substitute(value, None, None)
+    fields = getattr(node, "__node_fields__", None)
+    if fields is None:
+        return node
+    copy = object.__new__(node.__class__)
+    for name in fields:
+        setattr(copy, name, substitute(getattr(node, name), counter, value))
+    if "line" in node.__dict__:
+        copy.line = node.line
+    return copy
+
+def offset(expr, value):
+    if value == 0:
+        return expr
+    return BinaryOperation(expr, "+" if value > 0 else "-", Constant(abs(value)))
+
+def counter_step(statement, counter):
+    # c when statement is counter = counter + c or counter - c, else None
+    if not (isinstance(statement, AssignmentStatement) and statement.target.name == counter):
+        return None
+    value = statement.value
+    if (isinstance(value, BinaryOperation) and value.operator in ("+", "-")
+            and isinstance(value.left, Identifier) and value.left.name == counter
+            and is_constant(value.right)):
+        return value.right.value if value.operator == "+" else -value.right.value
+    return None
+
+
+class Unroller:
+    def __init__(self, simplifier, factor=UNROLL_FACTOR, profile=None):
+        self.simplifier = simplifier  # simplifies the copies
+        self.factor = factor  # partial unroll factor; 1 leaves long loops alone, 0 disables unrolling
+        self.profile = profile  # executer.feedback.Profile of a previous run, or None
+        self.growth = 0
+        self.full = 0
+        self.partial = 0
+        self.guarded = 0  # of the partial ones, those behind an IsInt guard
+        self.cold = 0  # loops that qualified but were left alone as the profile run hardly iterated them
+        self.ints = set()
+        self.locals = None  # locals of the procedure being unrolled, None in the main program
+        self.uses = {}  # procedure -> main program variables it or a procedure it calls uses
+
+    def report(self):
+        report = (f"Unrolled: {self.full} loops fully, {self.partial} loops by a factor of {self.factor}, "
+                  f"{self.growth} statements and expression nodes added")
+        if self.profile is not None:
+            report += f"; {self.guarded} behind integer guards, {self.cold} cold loops left alone"
+        return report
+
+    def unroll(self, program):
+        if self.factor <= 0:
+            return program
+        procedures = program.procedures or []
+        infos, _ = analyze_procedures(procedures, program.imported)
+        self.uses = reachable_globals(infos)
+        ints = infer_ints(program)
+
+        self.ints = self.simplifier.ints = ints[None]
+        known = {}
+        program.declarations = self.block(program.declarations, known)
+        program.statements = self.block(program.statements, known)
+        for procedure in procedures:
+            self.ints = self.simplifier.ints = ints[procedure.name]
+            self.locals = {parameter.name for parameter in procedure.parameters}
+            self.locals.update(statement.name for statement in statements(procedure.body)
+                               if isinstance(statement, (Declaration, ArrayDeclaration)))
+            procedure.body = self.block(procedure.body, {})
+        self.ints = self.simplifier.ints = set()
+        self.locals = None
+        return program
+
+    def block(self, block, known):
+        # known: variable -> the integer it holds before the block, updated to after it
+        result = []
+        for statement in block or []:
+            if isinstance(statement, IfStatement):
+                statement.then_block = self.block(statement.then_block, dict(known))
+                statement.else_block = self.block(statement.else_block, dict(known)) or None
+            elif isinstance(statement, WhileStatement):
+                statement.body = self.block(statement.body, {})
+                unrolled = self.loop(statement, known)
+                if unrolled is not None:
+                    for copy in unrolled:
+                        self.track(copy, known)
+                    result.extend(unrolled)
+                    continue
+            self.track(statement, known)
+            result.append(statement)
+        return result
+
+    def track(self, statement, known):
+        # updates known past statement
+        if isinstance(statement, (Declaration, AssignmentStatement)):
+            name = statement.name if isinstance(statement, Declaration) else statement.target.name
+            value = statement.initial_value if isinstance(statement, Declaration) else statement.value
+            if isinstance(statement, Declaration) and value is None:
+                value = Constant(0)
+            if is_constant(value):
+                known[name] = value.value
+                return
+            known.pop(name, None)
+        if isinstance(statement, (IfStatement, WhileStatement)):
+            known.clear()
+        elif any(isinstance(node, Call) and node.name not in BUILTINS
+                 for expr in expressions(statement) for node in expression_nodes(expr)):
+            known.clear()
+
+    def counted(self, node):
+        # (counter, bound, step, index of the counter update) of a qualifying loop, else None
+        condition = node.condition
+        if not (isinstance(condition, BinaryOperation) and condition.operator in DIRECTIONS
+                and isinstance(condition.left, Identifier) and is_constant(condition.right)):
+            return None
+        counter = condition.left.name
+        updates = [index for index, statement in enumerate(node.body)
+                   if isinstance(statement, AssignmentStatement) and statement.target.name == counter]
+        if len(updates) != 1:
+            return None
+        step = counter_step(node.body[updates[0]], counter)
+        if step is None or step * DIRECTIONS[condition.operator] <= 0:
+            return None
+        for statement in statements(node.body):
+            if isinstance(statement, (Declaration, ArrayDeclaration)):
+                return None
+            if (isinstance(statement, AssignmentStatement) and statement.target.name == counter
+                    and statement is not node.body[updates[0]]):
+                return None
+            if self.locals is None or counter not in self.locals:
+                # a procedure could see the counter
+                for expr in expressions(statement):
+                    for expr_node in expression_nodes(expr):
+                        if isinstance(expr_node, Call) and counter in self.uses.get(expr_node.name, ()):
+                            return None
+        return counter, condition.right.value, step, updates[0]
+
+    def copy(self, body, update, counter, before, after):
+        # the body of one iteration without the counter update: the counter reads
+        # before the update replaced by the expression before, those after it by after
+        copied = substitute(body[:update], counter, before) + substitute(body[update + 1:], counter, after)
+        return self.simplifier.block(copied)
+
+    def loop(self, node, known):
+        # the statements that replace node, None if it is not unrolled
+        counted = self.counted(node)
+        if counted is None:
+            return None
+        if self.profile is not None and cold_loop(self.profile, node.line):
+            self.cold += 1
+            return None
+        counter, bound, step, update = counted
+        operator = node.condition.operator
+        body_size = size(node.body)
+
+        trips = None
+        if counter in known:
+            value, trips = known[counter], 0
+            while fold(operator, value, bound) and trips <= FULL_UNROLL_MAX_TRIPS:
+                value += step
+                trips += 1
+            if trips > FULL_UNROLL_MAX_TRIPS:
+                trips = None
+        if trips is not None and self.fits(trips * body_size):
+            start = known[counter]
+            result = []
+            for trip in range(trips):
+                result += self.copy(node.body, update, counter, Constant(start + trip * step),
+                                    Constant(start + (trip + 1) * step))
+            final = locate(AssignmentStatement(Identifier(counter), Constant(start + trips * step)),
+                           node.body[update].line)
+            self.grow(trips * body_size - body_size)
+            self.full += 1
+            return result + [final]
+
+        factor = min(self.factor, MAX_UNROLLED_SIZE // max(body_size, 1))
+        guarded = (counter not in self.ints and self.profile is not None
+                   and observed_int(self.profile, node.line, operator))
+        if factor < 2 or (counter not in self.ints and not guarded) or (trips is not None and trips < factor):
+            return None
+        if not self.fits(factor * body_size):
+            return None
+        body = []
+        for copy in range(factor):
+            body += self.copy(node.body, update, counter, offset(Identifier(counter), copy * step),
+                              offset(Identifier(counter), (copy + 1) * step))
+        body.append(locate(AssignmentStatement(Identifier(counter), offset(Identifier(counter), factor * step)),
+                           node.body[update].line))
+        condition = BinaryOperation(Identifier(counter), operator, Constant(bound - (factor - 1) * step))
+        main_loop = locate(WhileStatement(condition, body), node.line)
+        self.grow(factor * body_size)
+        self.partial += 1
+        if guarded:
+            self.guarded += 1
+            return [locate(IfStatement(IsInt(Identifier(counter)), [main_loop]), node.line), node]
+        return [main_loop, node]
+
+    def fits(self, added):
+        return added <= MAX_UNROLLED_SIZE and self.growth + added <= MAX_GROWTH
+
+    def grow(self, added):
+        self.growth += max(added, 0)
@@ -1,12 +1,83 @@
 import sys
-from pipeline.pipeline import Pipeline
 
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 main.py <input_file>")
+# argparse (and the re module it pulls in) costs more than lexing and parsing a
+# small program, so the handful of flags is parsed by hand.
+USAGE = ("Usage: python3 main.py [--watch | --check-only | --profile] [--partial-eval] [--stream] [--pipelined] [--memoize] "
+         "[--stream-out <file>] [--bind-input <inputs_file>] [--unroll-factor <n>] [--checkpoint <file>] "
+         "[--record-profile <file>] [--use-profile <file>] "
+         "[--metrics-out <file.json | file.prom>] <input_file>\n"
+         "       python3 main.py repl")
+FLAGS = ("--watch", "--check-only", "--profile")  # modes, at most one of them
+SWITCHES = ("--partial-eval", "--stream", "--pipelined", "--memoize")
+OPTIONS = ("--metrics-out", "--bind-input", "--unroll-factor", "--checkpoint",
+           "--record-profile", "--use-profile", "--stream-out")  # options that take a value
+
+def parse_args(argv):
+    flags = set()
+    options = {}
+    files = []
+    args = iter(argv)
+    for arg in args:
+        name, _, value = arg.partition("=")
+        if arg in FLAGS:
+            flags.add(arg)
+        elif arg in SWITCHES:
+            options[arg] = True
+        elif name in OPTIONS:
+            value = value or next(args, None)
+            if not value:
+                print(f"Error: {name} needs a value")
+                print(USAGE)
+                sys.exit(1)
+            options[name] = value
+        elif arg.startswith("--"):
+            print(f"Error: unknown option {arg}")
+            print(USAGE)
+            sys.exit(1)
+        else:
+            files.append(arg)
+    if len(files) != 1 or len(flags) > 1:
+        print(USAGE)
+        sys.exit(1)
+    if "--watch" in flags and options:
+        print("Error: --watch cannot be combined with " + ", ".join(options))
         sys.exit(1)
+    if "--profile" in flags and "--checkpoint" in options:
+        print("Error: --profile cannot be combined with --checkpoint")
+        sys.exit(1)
+    if "--record-profile" in options:
+        for other in ("--profile", "--check-only", "--checkpoint"):
+            if other in flags or other in options:
+                print(f"Error: --record-profile cannot be combined with {other}")
+                sys.exit(1)
+    for streamed in ("--stream", "--pipelined", "--stream-out"):
+        if streamed in options:
+            # streamed code is not optimized and never whole
+            for other in ("--check-only", "--profile", "--partial-eval", "--bind-input", "--unroll-factor",
+                          "--checkpoint", "--record-profile", "--use-profile", "--stream", "--pipelined"):
+                if other != streamed and (other in flags or other in options):
+                    print(f"Error: {streamed} cannot be combined with {other}")
+                    sys.exit(1)
+    if "--memoize" in options:
+        # profiles count the instructions a memoized region skips
+        for other in ("--profile", "--record-profile", "--stream", "--pipelined", "--stream-out"):
+            if other in flags or other in options:
+                print(f"Error: --memoize cannot be combined with {other}")
+                sys.exit(1)
+    return files[0], flags, options
+
+def main():
+    if sys.argv[1:] == ["repl"]:
+        from pipeline.repl import repl
+        repl()
+        return
+
+    file, flags, options = parse_args(sys.argv[1:])
 
-    file = sys.argv[1]
+    if "--watch" in flags:
+        from pipeline.incremental import watch
+        watch(file)
+        return
 
     try:
         with open(file, 'r') as f:
@@ -15,7 +86,45 @@ def main():
         print(f"Error: File {file} not found.")
         sys.exit(1)
 
-    pipeline = Pipeline(code)
+    bound_inputs = []
+    if "--bind-input" in options:
+        # one in() value per line
+        try:
+            with open(options["--bind-input"], 'r') as f:
+                bound_inputs = f.read().splitlines()
+        except FileNotFoundError:
+            print(f"Error: File {options['--bind-input']} not found.")
+            sys.exit(1)
+
+    unroll_factor = None
+    if "--unroll-factor" in options:
+        if not options["--unroll-factor"].isdigit():
+            print("Error: --unroll-factor needs a whole number")
+            sys.exit(1)
+        unroll_factor = int(options["--unroll-factor"])
+
+    profile = None
+    if "--use-profile" in options:
+        from executer.feedback import load
+        try:
+            with open(options["--use-profile"], 'rb') as f:
+                profile = load(f.read())
+        except FileNotFoundError:
+            print(f"Error: File {options['--use-profile']} not found.")
+            sys.exit(1)
+        except (ValueError, EOFError, TypeError, IndexError) as e:
+            print(f"Error: {options['--use-profile']}: {e or 'not a Numera profile'}")
+            sys.exit(1)
+
+    from pipeline.pipeline import Pipeline
+    pipeline = Pipeline(code, check_only="--check-only" in flags, profile="--profile" in flags,
+                        metrics_out=options.get("--metrics-out"),
+                        partial_eval="--partial-eval" in options or "--bind-input" in options,
+                        bound_inputs=bound_inputs, unroll_factor=unroll_factor,
+                        checkpoint=options.get("--checkpoint"), source_path=file,
+                        record_profile=options.get("--record-profile"), use_profile=profile,
+                        stream="--stream" in options, pipelined="--pipelined" in options,
+                        memoize="--memoize" in options, stream_out=options.get("--stream-out"))
     pipeline.run()
 
 if __name__ == "__main__":
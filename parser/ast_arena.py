@@ -0,0 +1,327 @@
+"""
+Flat AST storage: every node is a row in a set of parallel typed arrays
+instead of an object with a __dict__.
+
+    kind   node kind (PROGRAM, IF, BINARY, ...)
+    op     operator id, an index into OPERATORS
+    a/b/c  child node indices, list ids or constant indices, depending on kind
+           (NONE when absent)
+    line   source line of statements and declarations (0 when unknown)
+
+Child sequences (statement blocks) are stored once in list_items and
+referenced by list id through list_start/list_length. Identifier names and
+literal values are deduplicated into the constants pool.
+
+    kind         a                 b                 c
+    PROGRAM      declarations list statements list procedures list
+    PROCEDURE    name constant     parameters list   body list
+    DECLARATION  name constant     initial value
+    IF           condition         then list         else list
+    WHILE        condition         body list
+    PRINT        expression
+    ASSIGN       target            value
+    BINARY       left              right                     (op)
+    UNARY        operand                                     (op)
+    IDENTIFIER   name constant
+    CONSTANT     value constant
+    INPUT
+    CALL         name constant     arguments list
+    CALL_STMT    call
+    RETURN       value
+    ARRAY_DECL   name constant     size constant
+    ELEMENT      name constant     index
+    ARRAY_ASSIGN target            value
+"""
+from array import array
+from . import ast_node
+
+NONE = -1
+
+(PROGRAM, DECLARATION, IF, WHILE, PRINT, ASSIGN, BINARY, UNARY, IDENTIFIER,
+ CONSTANT, INPUT, PROCEDURE, CALL, CALL_STMT, RETURN, ARRAY_DECL, ELEMENT, ARRAY_ASSIGN) = range(18)
+
+OPERATORS = ("+", "-", "*", "/", "%", "==", "!=", "<", "<=", ">", ">=", "and", "or", "not")
+OPERATOR_IDS = {op: index for index, op in enumerate(OPERATORS)}
+
+# per kind, the slots that hold children in field order: (slot, holds a list id)
+CHILDREN = {
+    PROGRAM: (("a", True), ("b", True), ("c", True)),
+    DECLARATION: (("b", False),),
+    IF: (("a", False), ("b", True), ("c", True)),
+    WHILE: (("a", False), ("b", True)),
+    PRINT: (("a", False),),
+    ASSIGN: (("a", False), ("b", False)),
+    BINARY: (("a", False), ("b", False)),
+    UNARY: (("a", False),),
+    IDENTIFIER: (),
+    CONSTANT: (),
+    INPUT: (),
+    PROCEDURE: (("b", True), ("c", True)),
+    CALL: (("b", True),),
+    CALL_STMT: (("a", False),),
+    RETURN: (("a", False),),
+    ARRAY_DECL: (),
+    ELEMENT: (("b", False),),
+    ARRAY_ASSIGN: (("a", False), ("b", False)),
+}
+
+
+class AstArena:
+    def __init__(self):
+        self.kind = array('B')
+        self.op = array('B')
+        self.a = array('i')
+        self.b = array('i')
+        self.c = array('i')
+        self.line = array('i')
+        self.list_start = array('i')
+        self.list_length = array('i')
+        self.list_items = array('i')
+        self.constants = []
+        self.constant_ids = {}
+        self.root = NONE
+
+    def __len__(self):
+        return len(self.kind)
+
+    def add(self, kind, a=NONE, b=NONE, c=NONE, op=0):
+        self.kind.append(kind)
+        self.op.append(op)
+        self.a.append(a)
+        self.b.append(b)
+        self.c.append(c)
+        self.line.append(0)
+        return len(self.kind) - 1
+
+    def add_list(self, items):
+        if items is None:
+            return NONE
+        self.list_start.append(len(self.list_items))
+        self.list_length.append(len(items))
+        self.list_items.extend(items)
+        return len(self.list_start) - 1
+
+    def add_constant(self, value):
+        # keyed by type as well, so that 1 and 1.0 stay distinct
+        key = (type(value), value)
+        index = self.constant_ids.get(key)
+        if index is None:
+            index = len(self.constants)
+            self.constants.append(value)
+            self.constant_ids[key] = index
+        return index
+
+    def items(self, list_id):
+        start = self.list_start[list_id]
+        return self.list_items[start:start + self.list_length[list_id]]
+
+    def children(self, index):
+        children = []
+        for slot, is_list in CHILDREN[self.kind[index]]:
+            value = getattr(self, slot)[index]
+            if value == NONE:
+                continue
+            if is_list:
+                children.extend(self.items(value))
+            else:
+                children.append(value)
+        return children
+
+    def walk(self, index=None):
+        # yields the node indices of a subtree in pre-order, without building views
+        arrays = {"a": self.a, "b": self.b, "c": self.c}
+        layout = [tuple((arrays[slot], is_list) for slot, is_list in reversed(CHILDREN[kind]))
+                  for kind in range(len(CHILDREN))]
+        kind, items, list_start, list_length = self.kind, self.list_items, self.list_start, self.list_length
+        stack = [self.root if index is None else index]
+        while stack:
+            index = stack.pop()
+            yield index
+            for values, is_list in layout[kind[index]]:
+                value = values[index]
+                if value == NONE:
+                    continue
+                if is_list:
+                    start = list_start[value]
+                    stack.extend(reversed(items[start:start + list_length[value]]))
+                else:
+                    stack.append(value)
+
+    def nbytes(self):
+        arrays = (self.kind, self.op, self.a, self.b, self.c, self.line,
+                  self.list_start, self.list_length, self.list_items)
+        return sum(arr.itemsize * len(arr) for arr in arrays)
+
+    def view(self, index):
+        if index == NONE:
+            return None
+        return VIEWS[self.kind[index]](self, index)
+
+    def views(self, list_id):
+        if list_id == NONE:
+            return None
+        return [self.view(index) for index in self.items(list_id)]
+
+
+class ArenaBuilder:
+    """
+    Node factory for Parser(tokens, nodes=ArenaBuilder()): the methods mirror
+    the ast_node constructors but append rows to an arena and return their index.
+    """
+    def __init__(self, arena=None):
+        self.arena = arena if arena is not None else AstArena()
+
+    def locate(self, index, line):
+        if line is not None:
+            self.arena.line[index] = line
+        return index
+
+    def Program(self, declarations, statements, procedures=None):
+        arena = self.arena
+        arena.root = arena.add(PROGRAM, arena.add_list(declarations), arena.add_list(statements),
+                               arena.add_list(procedures))
+        return arena.root
+
+    def Procedure(self, name, parameters, body):
+        arena = self.arena
+        return arena.add(PROCEDURE, arena.add_constant(name), arena.add_list(parameters), arena.add_list(body))
+
+    def Declaration(self, name, initial_value=None):
+        arena = self.arena
+        return arena.add(DECLARATION, arena.add_constant(name),
+                         NONE if initial_value is None else initial_value)
+
+    def IfStatement(self, condition, then_block, else_block=None):
+        arena = self.arena
+        return arena.add(IF, condition, arena.add_list(then_block), arena.add_list(else_block))
+
+    def WhileStatement(self, condition, body):
+        return self.arena.add(WHILE, condition, self.arena.add_list(body))
+
+    def PrintStatement(self, expression):
+        return self.arena.add(PRINT, expression)
+
+    def AssignmentStatement(self, target, value):
+        return self.arena.add(ASSIGN, target, value)
+
+    def BinaryOperation(self, left, operator, right):
+        return self.arena.add(BINARY, left, right, op=OPERATOR_IDS[operator])
+
+    def UnaryOperation(self, operator, operand):
+        return self.arena.add(UNARY, operand, op=OPERATOR_IDS[operator])
+
+    def Identifier(self, name):
+        return self.arena.add(IDENTIFIER, self.arena.add_constant(name))
+
+    def Constant(self, value):
+        return self.arena.add(CONSTANT, self.arena.add_constant(value))
+
+    def Input(self):
+        return self.arena.add(INPUT)
+
+    def Call(self, name, arguments):
+        return self.arena.add(CALL, self.arena.add_constant(name), self.arena.add_list(arguments))
+
+    def CallStatement(self, call):
+        return self.arena.add(CALL_STMT, call)
+
+    def ReturnStatement(self, value=None):
+        return self.arena.add(RETURN, NONE if value is None else value)
+
+    def ArrayDeclaration(self, name, size):
+        arena = self.arena
+        return arena.add(ARRAY_DECL, arena.add_constant(name), arena.add_constant(size))
+
+    def ArrayElement(self, name, index):
+        return self.arena.add(ELEMENT, self.arena.add_constant(name), index)
+
+    def ArrayAssignment(self, target, value):
+        return self.arena.add(ARRAY_ASSIGN, target, value)
+
+
+def from_tree(node, builder=None):
+    # copies an ast_node tree into an arena, returns the arena
+    builder = builder if builder is not None else ArenaBuilder()
+    _build(node, builder)
+    return builder.arena
+
+def _build(node, builder):
+    kwargs = {}
+    for name in node.__node_fields__:
+        value = getattr(node, name)
+        if isinstance(value, ast_node.Node):
+            value = _build(value, builder)
+        elif isinstance(value, list):
+            value = [_build(item, builder) for item in value]
+        kwargs[name] = value
+    return builder.locate(getattr(builder, type(node).__name__)(**kwargs), node.line)
+
+def to_tree(arena, index=None):
+    # materializes the ast_node tree rooted at index (the program by default)
+    view = arena.view(arena.root if index is None else index)
+    return _materialize(view)
+
+def _materialize(view):
+    cls = NODE_CLASSES[view.arena.kind[view.row]]
+    kwargs = {}
+    for name in cls.__node_fields__:
+        value = getattr(view, name)
+        if isinstance(value, ast_node.Node):
+            value = _materialize(value)
+        elif isinstance(value, list):
+            value = [_materialize(item) for item in value]
+        kwargs[name] = value
+    return ast_node.locate(cls(**kwargs), view.line)
+
+
+# Views are thin (arena, row) handles. They subclass the ast_node classes, so
+# code written against the dataclasses (e.g. CodeGenerator) consumes them unchanged.
+
+def _node(slot):
+    return property(lambda self: self.arena.view(getattr(self.arena, slot)[self.row]))
+
+def _list(slot):
+    return property(lambda self: self.arena.views(getattr(self.arena, slot)[self.row]))
+
+def _constant(slot):
+    return property(lambda self: self.arena.constants[getattr(self.arena, slot)[self.row]])
+
+def _operator():
+    return property(lambda self: OPERATORS[self.arena.op[self.row]])
+
+LAYOUT = {
+    PROGRAM: (ast_node.Program, {"declarations": _list("a"), "statements": _list("b"),
+                                 "procedures": _list("c")}),
+    PROCEDURE: (ast_node.Procedure, {"name": _constant("a"), "parameters": _list("b"), "body": _list("c")}),
+    DECLARATION: (ast_node.Declaration, {"name": _constant("a"), "initial_value": _node("b")}),
+    IF: (ast_node.IfStatement, {"condition": _node("a"), "then_block": _list("b"), "else_block": _list("c")}),
+    WHILE: (ast_node.WhileStatement, {"condition": _node("a"), "body": _list("b")}),
+    PRINT: (ast_node.PrintStatement, {"expression": _node("a")}),
+    ASSIGN: (ast_node.AssignmentStatement, {"target": _node("a"), "value": _node("b")}),
+    BINARY: (ast_node.BinaryOperation, {"left": _node("a"), "operator": _operator(), "right": _node("b")}),
+    UNARY: (ast_node.UnaryOperation, {"operator": _operator(), "operand": _node("a")}),
+    IDENTIFIER: (ast_node.Identifier, {"name": _constant("a")}),
+    CONSTANT: (ast_node.Constant, {"value": _constant("a")}),
+    INPUT: (ast_node.Input, {}),
+    CALL: (ast_node.Call, {"name": _constant("a"), "arguments": _list("b")}),
+    CALL_STMT: (ast_node.CallStatement, {"call": _node("a")}),
+    RETURN: (ast_node.ReturnStatement, {"value": _node("a")}),
+    ARRAY_DECL: (ast_node.ArrayDeclaration, {"name": _constant("a"), "size": _constant("b")}),
+    ELEMENT: (ast_node.ArrayElement, {"name": _constant("a"), "index": _node("b")}),
+    ARRAY_ASSIGN: (ast_node.ArrayAssignment, {"target": _node("a"), "value": _node("b")}),
+}
+
+def _line(self):
+    return self.arena.line[self.row] or None
+
+def _view_init(self, arena, row):
+    self.arena = arena
+    self.row = row
+
+NODE_CLASSES = [None] * len(LAYOUT)
+VIEWS = [None] * len(LAYOUT)
+for _kind, (_cls, _fields) in LAYOUT.items():
+    NODE_CLASSES[_kind] = _cls
+    VIEWS[_kind] = type(f"{_cls.__name__}View", (_cls,),
+                        dict(_fields, __slots__=("arena", "row"), __init__=_view_init,
+                             line=property(_line)))
@@ -1,67 +1,159 @@
-from dataclasses import dataclass
-from typing import List, Optional, Union
+from __future__ import annotations
 
-@dataclass
+# Annotations below are never evaluated, so the builtin generics need no typing import.
+_MISSING = object()
+
+def node_dataclass(cls):
+    # Generates the __init__, __repr__ and __eq__ that dataclasses.dataclass would, for
+    # the plain annotated fields and defaults the nodes use. Importing dataclasses
+    # pulls in inspect: with it, main.py --check-only spends about 27 ms importing
+    # instead of 13 ms (benchmark/startup_benchmark.py), more than lexing and parsing
+    # a typical program takes.
+    fields = {}
+    for klass in reversed(cls.__mro__):
+        for name in klass.__dict__.get('__annotations__', {}):
+            fields[name] = klass.__dict__.get(name, _MISSING)
+
+    namespace = {}
+    params = ["self"]
+    for name, default in fields.items():
+        if default is _MISSING:
+            params.append(name)
+        else:
+            namespace[f"_default_{name}"] = default
+            params.append(f"{name}=_default_{name}")
+    body = "".join(f"\n    self.{name} = {name}" for name in fields) or "\n    pass"
+    exec(f"def __init__({', '.join(params)}):{body}", namespace)
+
+    names = tuple(fields)
+
+    def __repr__(self):
+        args = ", ".join(f"{name}={getattr(self, name)!r}" for name in names)
+        return f"{self.__class__.__qualname__}({args})"
+
+    def __eq__(self, other):
+        if other.__class__ is self.__class__:
+            return all(getattr(self, name) == getattr(other, name) for name in names)
+        return NotImplemented
+
+    cls.__init__ = namespace["__init__"]
+    cls.__repr__ = __repr__
+    cls.__eq__ = __eq__
+    cls.__hash__ = None
+    cls.__node_fields__ = names
+    return cls
+
+@node_dataclass
 class Node:
-    pass
+    # source line of statements and declarations; not a field, so it is ignored by __eq__
+    line = None
+
+def locate(node, line):
+    node.line = line
+    return node
 
-@dataclass
+@node_dataclass
 class Program(Node):
-    declarations: List['Declaration']
-    statements: List['Statement']
+    declarations: list[Declaration | ArrayDeclaration]
+    statements: list[Statement]
+    procedures: list[Procedure] | None = None
+    # name -> generator.procedures.ImportedInfo of the procedures it imports from other
+    # compilation units; not a field, set by pipeline/build.py
+    imported = None
 
-@dataclass
+@node_dataclass
+class Procedure(Node):
+    # body holds the declarations followed by the statements
+    name: str
+    parameters: list[Identifier]
+    body: list[Statement | Declaration | ArrayDeclaration]
+
+@node_dataclass
 class Declaration(Node):
     name: str
-    initial_value: Optional['Expression'] = None
+    initial_value: Expression | None = None
 
-@dataclass
+@node_dataclass
+class ArrayDeclaration(Node):
+    name: str
+    size: int
+
+@node_dataclass
 class Statement(Node):
     pass
 
-@dataclass
+@node_dataclass
 class IfStatement(Statement):
-    condition: 'Expression'
-    then_block: List[Statement]
-    else_block: Optional[List[Statement]] = None
+    condition: Expression
+    then_block: list[Statement]
+    else_block: list[Statement] | None = None
 
-@dataclass
+@node_dataclass
 class WhileStatement(Statement):
-    condition: 'Expression'
-    body: List[Statement]
+    condition: Expression
+    body: list[Statement]
 
-@dataclass
+@node_dataclass
 class PrintStatement(Statement):
-    expression: 'Expression'
+    expression: Expression
 
-@dataclass
+@node_dataclass
 class AssignmentStatement(Statement):
-    target: 'Identifier'
-    value: 'Expression'
+    target: Identifier
+    value: Expression
+
+@node_dataclass
+class ArrayAssignment(Statement):
+    target: ArrayElement
+    value: Expression
+
+@node_dataclass
+class CallStatement(Statement):
+    call: Call
 
-@dataclass
+@node_dataclass
+class ReturnStatement(Statement):
+    value: Expression | None = None
+
+@node_dataclass
 class Expression(Node):
     pass
 
-@dataclass
+@node_dataclass
 class BinaryOperation(Expression):
     left: Expression
     operator: str
     right: Expression
 
-@dataclass
+@node_dataclass
 class UnaryOperation(Expression):
     operator: str
     operand: Expression
 
-@dataclass
+@node_dataclass
 class Identifier(Expression):
     name: str
 
-@dataclass
+@node_dataclass
+class ArrayElement(Expression):
+    name: str
+    index: Expression
+
+@node_dataclass
 class Constant(Expression):
-    value: Union[int, str]
+    value: int | str
 
-@dataclass
+@node_dataclass
 class Input(Expression):
-    pass
\ No newline at end of file
+    pass
+
+@node_dataclass
+class Call(Expression):
+    name: str
+    arguments: list[Expression]
+
+@node_dataclass
+class IsInt(Expression):
+    # 1 if operand holds an integer; never parsed, the guard of code specialized for
+    # integers (see generator/unroll.py)
+    operand: Expression
@@ -1,11 +1,14 @@
-from tokenizer.grammar import *
+from . import ast_node
 from .ast_node import *
 from .parser_error import ParserError
 
 class Parser:
-    def __init__(self, tokens):
+    def __init__(self, tokens, nodes=ast_node):
+        # nodes builds the AST: the ast_node classes, or an ast_arena.ArenaBuilder
         self.tokens = tokens
         self.position = 0
+        self.nodes = nodes
+        self.imports = []  # (path, line) of the import lines read, see pipeline/build.py
 
     def current_token(self):
         if self.position < len(self.tokens):
@@ -36,6 +39,10 @@ class Parser:
                 return False
         return True
     
+    def current_line(self):
+        token = self.current_token()
+        return int(token.line_num) if token is not None and token.line_num is not None else None
+
     def peek_next_token(self):
         if self.position + 1 < len(self.tokens):
             return self.tokens[self.position + 1]
@@ -43,9 +50,17 @@ class Parser:
 
     def parse(self):
         print("parse start...")
+        program = self.program()
+        print("parse end")
+        return program
+
+    def program(self):
+        self.import_seq()
+        procedures = []
         self.expect_token("procedure")
-        if not self.match_token("main"):
-            raise ParserError(f"Expected 'main' after 'procedure', got '{self.current_token().value}' on line {self.current_token().line_num}")
+        while not self.match_token("main"):
+            procedures.append(self.procedure())
+            self.expect_token("procedure")
         self.expect_token("main")
         self.expect_token("is")
 
@@ -57,9 +72,64 @@ class Parser:
 
         if self.current_token() is not None:
             raise ParserError(f"Unexpected token '{self.current_token().value}' after 'end' on line {self.current_token().line_num}")
-        
-        print("parse end")
-        return Program(declarations=declarations, statements=statements)
+
+        return self.nodes.Program(declarations=declarations, statements=statements, procedures=procedures)
+
+    def library(self):
+        # an imported unit: its imports and procedures, without a main program
+        self.import_seq()
+        procedures = []
+        while self.current_token() is not None:
+            self.expect_token("procedure")
+            if self.match_token("main"):
+                raise ParserError(f"An imported unit cannot define procedure main, on line {self.current_token().line_num}")
+            procedures.append(self.procedure())
+        return self.nodes.Program(declarations=[], statements=[], procedures=procedures)
+
+    def import_seq(self):
+        while self.match_token("import"):
+            line = self.current_line()
+            self.next_token()
+            token = self.current_token()
+            if token is None or not (token.value.startswith('"') and len(token.value) > 2):
+                value = token.value if token is not None else "nothing"
+                raise ParserError(f"Expected a file name in quotes after 'import', got '{value}' on line {line}")
+            self.next_token()
+            self.expect_token(";")
+            self.imports.append((token.value[1:-1], line))
+
+    def procedure(self):
+        line = self.current_line()
+        token = self.current_token()
+        if token is None or not token.value.isidentifier():
+            value = token.value if token is not None else "nothing"
+            raise ParserError(f"Expected procedure name or 'main' after 'procedure', got '{value}'"
+                              + (f" on line {token.line_num}" if token is not None else ""))
+        name = token.value
+        self.next_token()
+        self.expect_token("(")
+        parameters = []
+        if not self.match_token(")"):
+            parameters.append(self.parameter())
+            while self.match_token(","):
+                self.expect_token(",")
+                parameters.append(self.parameter())
+        self.expect_token(")")
+        self.expect_token("is")
+
+        declarations = self.decl_seq()
+        self.expect_token("begin")
+        statements = self.stmt_seq()
+        self.expect_token("end")
+        return self.nodes.locate(self.nodes.Procedure(name=name, parameters=parameters,
+                                                      body=declarations + statements), line)
+
+    def parameter(self):
+        token = self.current_token()
+        if token is None or not token.value.isidentifier():
+            raise ParserError(f"Invalid parameter '{token.value if token else ''}'")
+        self.next_token()
+        return self.nodes.Identifier(name=token.value)
     
     def decl_seq(self):
         declarations = []
@@ -71,6 +141,7 @@ class Parser:
         return self.decl_var()
 
     def decl_var(self):
+        line = self.current_line()
         self.expect_token("var")
         token = self.current_token()
         if token is None:
@@ -80,6 +151,17 @@ class Parser:
             raise ParserError(f"Invalid identifier '{var_name}' after 'var'")
         self.next_token()
 
+        if self.match_token("["):
+            self.expect_token("[")
+            size = self.current_token()
+            if size is None or not size.value.isdigit() or int(size.value) == 0:
+                raise ParserError(f"Array {var_name} needs a positive integer size"
+                                  + (f" on line {size.line_num}" if size is not None else ""))
+            self.next_token()
+            self.expect_token("]")
+            self.expect_token(";")
+            return self.nodes.locate(self.nodes.ArrayDeclaration(name=var_name, size=int(size.value)), line)
+
         initial_value = None
         if self.match_token("="):
             self.expect_token("=")
@@ -87,7 +169,7 @@ class Parser:
             self.expect_token(";")
         else:
             self.expect_token(";")
-        return Declaration(name=var_name, initial_value=initial_value)
+        return self.nodes.locate(self.nodes.Declaration(name=var_name, initial_value=initial_value), line)
 
     def stmt_seq(self):
         statements = []
@@ -109,33 +191,83 @@ class Parser:
             return self.if_stmt()
         elif token.value == "while":
             return self.loop()
+        elif token.value == "return":
+            return self.return_stmt()
         elif token.value.isidentifier():
             next_token = self.peek_next_token()
             if next_token and next_token.value == "=":
                 return self.assign()
+            if next_token and next_token.value == "[":
+                return self.assign_element()
+            if next_token and next_token.value == "(":
+                line = self.current_line()
+                call = self.call()
+                self.expect_token(";")
+                return self.nodes.locate(self.nodes.CallStatement(call=call), line)
         else:
             raise ParserError(f"Unexpected token '{token.value}' in statement on line {token.line_num}")
 
     def assign(self):
+        line = self.current_line()
         var_name = self.current_token().value
         if not var_name.isidentifier():
             raise ParserError(f"Invalid identifier '{var_name}' in assignment")
-        target = Identifier(name=var_name)
+        target = self.nodes.Identifier(name=var_name)
         self.next_token()
         self.expect_token("=")
         expr = self.expr()
         self.expect_token(";")
-        return AssignmentStatement(target=target, value=expr)
+        return self.nodes.locate(self.nodes.AssignmentStatement(target=target, value=expr), line)
+
+    def assign_element(self):
+        line = self.current_line()
+        target = self.element()
+        self.expect_token("=")
+        expr = self.expr()
+        self.expect_token(";")
+        return self.nodes.locate(self.nodes.ArrayAssignment(target=target, value=expr), line)
+
+    def element(self):
+        name = self.current_token().value
+        self.next_token()
+        self.expect_token("[")
+        index = self.expr()
+        self.expect_token("]")
+        return self.nodes.ArrayElement(name=name, index=index)
+
+    def return_stmt(self):
+        line = self.current_line()
+        self.expect_token("return")
+        value = None
+        if not self.match_token(";"):
+            value = self.expr()
+        self.expect_token(";")
+        return self.nodes.locate(self.nodes.ReturnStatement(value=value), line)
+
+    def call(self):
+        name = self.current_token().value
+        self.next_token()
+        self.expect_token("(")
+        arguments = []
+        if not self.match_token(")"):
+            arguments.append(self.expr())
+            while self.match_token(","):
+                self.expect_token(",")
+                arguments.append(self.expr())
+        self.expect_token(")")
+        return self.nodes.Call(name=name, arguments=arguments)
 
     def print_stmt(self):
+        line = self.current_line()
         self.expect_token("print")
         self.expect_token("(")
         expr = self.expr()
         self.expect_token(")")
         self.expect_token(";")
-        return PrintStatement(expression=expr)
+        return self.nodes.locate(self.nodes.PrintStatement(expression=expr), line)
 
     def if_stmt(self):
+        line = self.current_line()
         self.expect_token("if")
         condition = self.cond()
         self.expect_token("then")
@@ -147,21 +279,22 @@ class Parser:
             else_block = self.stmt_seq()
 
         self.expect_token("end")
-        return IfStatement(condition=condition, then_block=then_block, else_block=else_block)
+        return self.nodes.locate(self.nodes.IfStatement(condition=condition, then_block=then_block, else_block=else_block), line)
 
     def loop(self):
+        line = self.current_line()
         self.expect_token("while")
         condition = self.cond()
         self.expect_token("do")
         body = self.stmt_seq()
         self.expect_token("end")
-        return WhileStatement(condition=condition, body=body)
+        return self.nodes.locate(self.nodes.WhileStatement(condition=condition, body=body), line)
 
     def cond(self):
         if self.match_token("not"):
             self.expect_token("not")
             cond_expr = self.cond() 
-            return UnaryOperation(operator="not", operand=cond_expr)
+            return self.nodes.UnaryOperation(operator="not", operand=cond_expr)
         
         left = self.cmpr()
         
@@ -169,7 +302,7 @@ class Parser:
             op = self.current_token().value
             self.next_token()
             right = self.cmpr()
-            left = BinaryOperation(left=left, operator=op, right=right)
+            left = self.nodes.BinaryOperation(left=left, operator=op, right=right)
         
         return left
 
@@ -181,7 +314,7 @@ class Parser:
             op = self.current_token().value
             self.next_token()
             right = self.expr()
-            return BinaryOperation(left=left, operator=op, right=right)
+            return self.nodes.BinaryOperation(left=left, operator=op, right=right)
         return left
     
 
@@ -191,7 +324,7 @@ class Parser:
             op = self.current_token().value
             self.next_token()
             right = self.term()
-            left = BinaryOperation(left=left, operator=op, right=right)
+            left = self.nodes.BinaryOperation(left=left, operator=op, right=right)
         return left
     
 
@@ -201,12 +334,14 @@ class Parser:
             op = self.current_token().value
             self.next_token()
             right = self.factor()
-            left = BinaryOperation(left=left, operator=op, right=right)
+            left = self.nodes.BinaryOperation(left=left, operator=op, right=right)
         return left
     
 
     def factor(self):
         token = self.current_token()
+        if token is None:
+            raise ParserError("Unexpected end of input in expression")
         if token.value == "(":
             self.expect_token("(")
             expr = self.expr()
@@ -216,19 +351,24 @@ class Parser:
             self.expect_token("in")
             self.expect_token("(")
             self.expect_token(")")
-            return Input()
+            return self.nodes.Input()
         elif token.value.isdigit():
             value = int(token.value)
             self.next_token()
-            return Constant(value=value)
+            return self.nodes.Constant(value=value)
         elif token.value.startswith('"') and token.value.endswith('"'):
             value = token.value[1:-1]  # Remove quotes
             self.next_token()
-            return Constant(value=value)
+            return self.nodes.Constant(value=value)
         else:
+            next_token = self.peek_next_token()
+            if token.value.isidentifier() and next_token and next_token.value == "(":
+                return self.call()
+            if token.value.isidentifier() and next_token and next_token.value == "[":
+                return self.element()
             identifier = token.value
             self.next_token()
-            return Identifier(name=identifier)
+            return self.nodes.Identifier(name=identifier)
 
     def print_ast(self, node, level=0, is_last=True, prefix=""):
         if node is None:
@@ -243,8 +383,14 @@ class Parser:
             print(f" ({node.value})")
         elif isinstance(node, Declaration):
             print(f" ({node.name})")
+        elif isinstance(node, ArrayDeclaration):
+            print(f" ({node.name}[{node.size}])")
+        elif isinstance(node, ArrayElement):
+            print(f" ({node.name})")
         elif isinstance(node, AssignmentStatement):
             print(f" ({node.target})")
+        elif isinstance(node, (Procedure, Call)):
+            print(f" ({node.name})")
         else:
             print()
 
@@ -253,12 +399,27 @@ class Parser:
 
         children = []
         if isinstance(node, Program):
+            children.extend(node.procedures or [])
             children.extend(node.declarations)
             children.extend(node.statements)
+        elif isinstance(node, Procedure):
+            children.extend(node.parameters)
+            children.extend(node.body)
+        elif isinstance(node, Call):
+            children.extend(node.arguments)
+        elif isinstance(node, CallStatement):
+            children.append(node.call)
+        elif isinstance(node, ReturnStatement) and node.value:
+            children.append(node.value)
         elif isinstance(node, Declaration) and node.initial_value:
             children.append(node.initial_value)
         elif isinstance(node, AssignmentStatement):
             children.append(node.value)
+        elif isinstance(node, ArrayAssignment):
+            children.append(node.target)
+            children.append(node.value)
+        elif isinstance(node, ArrayElement):
+            children.append(node.index)
         elif isinstance(node, PrintStatement):
             children.append(node.expression)
         elif isinstance(node, IfStatement):
@@ -0,0 +1,89 @@
+"""
+Parsing tokens while they are scanned.
+
+Parser reads a list holding every token of the program and returns the whole
+tree at the end. StreamingParser reads the tokens from an iterable of token
+lists, such as the batches of lines a lexer scans, pulling the next batch only
+when it needs a token that has not arrived yet, and hands the program out as
+it goes:
+
+- header() reads up to the begin of the main program and returns its
+  procedures and declarations, which the code of any statement may need;
+- statements() then yields the statements of the main program one at a time
+  and checks the end of the program once they are done.
+
+Tokens are dropped once the statement they belong to has been read, so what is
+held at a time is one statement and the batch it ends in.
+"""
+from . import ast_node
+from .parser import Parser
+from .parser_error import ParserError
+
+
+class StreamingParser(Parser):
+    def __init__(self, batches, nodes=ast_node):
+        super().__init__([], nodes)
+        self.batches = iter(batches)
+        self.exhausted = False  # every batch has been read
+
+    def fill(self, index):
+        # whether there is a token at index, reading batches until there is
+        tokens = self.tokens
+        while index >= len(tokens) and not self.exhausted:
+            batch = next(self.batches, None)
+            if batch is None:
+                self.exhausted = True
+            else:
+                tokens.extend(batch)
+        return index < len(tokens)
+
+    def current_token(self):
+        if self.fill(self.position):
+            return self.tokens[self.position]
+        return None
+
+    def next_token(self):
+        # moves on without reading a batch: that waits until the token is looked at, so
+        # the statement a batch ends in is handed out before the next batch, or the
+        # error of the lexer in its place, is needed
+        self.position += 1
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def peek_next_token(self):
+        if self.fill(self.position + 1):
+            return self.tokens[self.position + 1]
+        return None
+
+    def release(self):
+        # drops the tokens read so far
+        del self.tokens[:self.position]
+        self.position = 0
+
+    def header(self):
+        # (procedures, declarations) of the program, read up to and including its begin
+        self.import_seq()
+        procedures = []
+        self.expect_token("procedure")
+        while not self.match_token("main"):
+            procedures.append(self.procedure())
+            self.release()
+            self.expect_token("procedure")
+        self.expect_token("main")
+        self.expect_token("is")
+        declarations = self.decl_seq()
+        self.expect_token("begin")
+        self.release()
+        return procedures, declarations
+
+    def statements(self):
+        # yields the statements of the main program, then reads the end of the program
+        while self.current_token() is not None and not self.match_token("end") and not self.match_token("else"):
+            token = self.current_token()
+            statement = self.stmt()
+            if statement is None:
+                raise ParserError(f"Unexpected token '{token.value}' in statement on line {token.line_num}")
+            self.release()
+            yield statement
+        self.expect_token("end")
+        if self.current_token() is not None:
+            raise ParserError(f"Unexpected token '{self.current_token().value}' after 'end' on line {self.current_token().line_num}")
@@ -0,0 +1,190 @@
+"""
+Separate compilation of programs split over several files.
+
+A file names the files whose procedures it calls in import lines before its
+first procedure, with paths relative to its own directory:
+
+    import "geometry.num";
+
+An imported file holds procedures only. Every file is a compilation unit,
+compiled on its own against the interfaces of the units it imports into a
+generator.linker.ObjectUnit, which is saved to __numera_cache__/<file>.nobj next
+to it; the units of the program are then linked into one. A unit is only
+compiled again when its source or the compile options changed, or the interface
+of a unit it imports did (see ObjectUnit.interface). Otherwise its saved object
+is used as it is, without even lexing the file: an edit to the body of a
+procedure recompiles its own file, one that changes what the procedure looks
+like to callers also the files that import it.
+
+A profile (see executer/feedback.py) only describes the lines of the main
+program's file, so only that unit is compiled with it, and again whenever the
+profile changes.
+"""
+import os
+
+from generator.linker import fingerprint, load, object_unit, save
+
+CACHE_DIR = "__numera_cache__"
+OBJECT_SUFFIX = ".nobj"
+
+
+def object_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, CACHE_DIR, name + OBJECT_SUFFIX)
+
+
+class Build:
+    def __init__(self, unroll_factor=None, cache=True, profile=None):
+        from generator.unroll import UNROLL_FACTOR
+        self.unroll_factor = UNROLL_FACTOR if unroll_factor is None else unroll_factor
+        self.options = (self.unroll_factor,)
+        self.profile = profile  # executer.feedback.Profile the main program's unit is compiled with
+        self.cache = cache  # whether objects are loaded from and saved to __numera_cache__
+        self.units = {}  # path -> ObjectUnit, each after the units it imports
+        self.compiled = []  # names of the units compiled by this build
+        self.reused = []  # names of the units whose saved objects were used
+        self.base = os.getcwd()  # directory unit names are relative to: the main program's
+
+    def report(self):
+        return (f"Units: {len(self.compiled)} compiled ({', '.join(self.compiled) or 'none'}), "
+                f"{len(self.reused)} reused")
+
+    def build(self, path, source, program, imports):
+        # the ObjectUnits of the program at path (None if it was not read from a file), its
+        # main program's first; its source, AST and parser.imports come from the pipeline
+        path = os.path.abspath(path) if path else None
+        if path:
+            self.base = os.path.dirname(path)
+        root = self.unit(path, (), source, (program, imports))
+        return [root] + [unit for unit in self.units.values() if unit is not root]
+
+    def check(self, path, imports, stack=()):
+        # lexes and parses every file the program imports, without compiling anything
+        path = os.path.abspath(path) if path else None
+        if path and not stack:
+            self.base = os.path.dirname(path)
+        for target in self.resolve(path, imports, stack):
+            if target not in self.units:
+                self.units[target] = None
+                _, target_imports = self.parse(target, self.read(target, path), main=False)
+                self.check(target, target_imports, stack + (path,))
+
+    def resolve(self, path, imports, stack):
+        # absolute paths of the imports of the unit at path
+        directory = os.path.dirname(path) if path else os.getcwd()
+        targets = []
+        for name, _ in imports:
+            target = os.path.normpath(os.path.join(directory, name))
+            if target in stack + (path,):
+                cycle = stack[stack.index(target):] + (path, target) if target in stack else (path, target)
+                raise ValueError("Import cycle: " + " -> ".join(self.name(item) for item in cycle))
+            targets.append(target)
+        return targets
+
+    def unit(self, path, stack, source=None, parsed=None):
+        if path in self.units:
+            return self.units[path]
+        main = parsed is not None
+        if source is None:
+            source = self.read(path, stack[-1] if stack else None)
+        source_print = fingerprint(source)
+        options = self.options
+        if main and self.profile is not None:
+            options += (self.profile.key,)
+        saved = self.load(path)
+        if saved is not None and (saved.source != source_print or saved.options != options):
+            saved = None
+        if saved is not None:
+            imports = [(name, None) for name, _ in saved.imports]
+        else:
+            if parsed is None:
+                parsed = self.parse(path, source, main)
+            imports = parsed[1]
+
+        dependencies = [self.unit(target, stack + (path,)) for target in self.resolve(path, imports, stack)]
+        if saved is not None and all(dependency.interface() == interface
+                                     for dependency, (_, interface) in zip(dependencies, saved.imports)):
+            self.reused.append(self.name(path))
+            self.units[path] = saved
+            return saved
+
+        if parsed is None:
+            parsed = self.parse(path, source, main)
+        program, imports = parsed
+        imported, owners = {}, {}
+        for dependency in dependencies:
+            for name, info in dependency.imported_infos().items():
+                if owners.setdefault(name, dependency) is not dependency:
+                    raise ValueError(f"{self.name(path)}: procedure {name} is imported from both "
+                                     f"{owners[name].name} and {dependency.name}")
+                imported[name] = info
+        unit = self.compile(path, program, imported, source_print, options,
+                            [(name, dependency.interface()) for (name, _), dependency in zip(imports, dependencies)],
+                            main)
+        self.compiled.append(self.name(path))
+        self.units[path] = unit
+        self.save(path, unit)
+        return unit
+
+    def compile(self, path, program, imported, source_print, options, imports, main):
+        from generator.simplifier import Simplifier
+        from generator.unroll import Unroller
+        from generator.generator import CodeGenerator
+        profile = self.profile if main else None
+        program.imported = imported
+        simplifier = Simplifier()
+        program = simplifier.simplify(program)
+        if profile is not None:
+            from generator.pgo import Inliner
+            program = Inliner(profile).inline(program)
+        program = Unroller(simplifier, self.unroll_factor, profile).unroll(program)
+        generator = CodeGenerator(verbose=False, profile=profile)
+        try:
+            generator.generate(program)
+        except ValueError as e:
+            raise ValueError(f"{self.name(path)}: {e}")
+        return object_unit(generator, program, self.name(path), source_print, options, imports, main)
+
+    def parse(self, path, source, main):
+        # (program, [(import path, line)]) of a source file
+        from tokenizer.scanner import Lexer
+        from parser.parser import Parser
+        from parser.parser_error import ParserError
+        parser = Parser(Lexer().scan(source))
+        try:
+            program = parser.program() if main else parser.library()
+        except ParserError as e:
+            raise ValueError(f"{self.name(path)}: {e}")
+        return program, parser.imports
+
+    def read(self, path, importer):
+        try:
+            with open(path, 'r') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise ValueError(f"File {self.name(path)} imported by {self.name(importer)} not found")
+
+    def name(self, path):
+        return os.path.relpath(path, self.base) if path else "<main>"
+
+    def load(self, path):
+        # the saved object of the unit at path, None if there is none that can be read
+        if not self.cache or path is None:
+            return None
+        try:
+            with open(object_path(path), "rb") as f:
+                return load(f.read())
+        except (OSError, ValueError, EOFError, TypeError):
+            return None
+
+    def save(self, path, unit):
+        if not self.cache or path is None:
+            return
+        target = object_path(path)
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target + ".tmp", "wb") as f:
+                f.write(save(unit))
+            os.replace(target + ".tmp", target)
+        except OSError:
+            pass  # e.g. a read-only directory: the unit is compiled again next time
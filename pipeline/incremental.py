@@ -0,0 +1,257 @@
+import os
+import time
+from parser.ast_node import Program
+from parser.parser import Parser
+from parser.parser_error import ParserError
+from tokenizer.scanner import Lexer
+from tokenizer.token import Token
+from generator.generator import CodeGenerator
+from generator.simplifier import Simplifier
+from executer.executer import Execute
+
+# procedure main is
+HEADER_LENGTH = 3
+
+
+class Fragment:
+    # one top-level declaration or statement, its token span and its IR
+    def __init__(self, node, start, end, instructions):
+        self.node = node
+        self.start = start
+        self.end = end
+        self.instructions = instructions
+        self.code = "\n".join(instructions) if instructions is not None else None
+
+    def shifted(self, shift):
+        fragment = Fragment(self.node, self.start + shift, self.end + shift, None)
+        fragment.instructions = self.instructions
+        fragment.code = self.code
+        return fragment
+
+
+class IncrementalReport:
+    def __init__(self, lines_total, lines_relexed, fragments_total, fragments_reused, full_rebuild, seconds):
+        self.lines_total = lines_total
+        self.lines_relexed = lines_relexed
+        self.fragments_total = fragments_total
+        self.fragments_reused = fragments_reused
+        self.full_rebuild = full_rebuild
+        self.seconds = seconds
+
+    def __str__(self):
+        mode = "full rebuild" if self.full_rebuild else "incremental"
+        return (f"[{mode}] relexed {self.lines_relexed}/{self.lines_total} lines, "
+                f"reused {self.fragments_reused}/{self.fragments_total} statements, "
+                f"{self.seconds * 1000:.2f} ms")
+
+
+class IncrementalCompiler:
+    """
+    Keeps the tokens, top-level statements and IR of the last successful build
+    so that an edit only re-lexes the changed lines and re-parses and regenerates
+    the top-level statements whose tokens were touched.
+
+    Every top-level fragment is generated and optimized on its own, so only
+    optimizations that are local to a fragment are applied.
+    """
+    def __init__(self):
+        self.lexer = Lexer()
+        self.lines = []
+        self.line_tokens = []
+        self.tokens = []
+        self.fragments = []
+        self.decl_count = 0
+        self.begin_index = None
+        self.label_counter = 0
+        self.code = ""
+
+    def update(self, source):
+        started = time.perf_counter()
+        new_lines = source.splitlines()
+        old_lines = self.lines
+
+        prefix = 0
+        limit = min(len(old_lines), len(new_lines))
+        while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+            suffix += 1
+
+        if prefix == len(old_lines) == len(new_lines):
+            return IncrementalReport(len(new_lines), 0, len(self.fragments), len(self.fragments),
+                                     False, time.perf_counter() - started)
+
+        changed = new_lines[prefix:len(new_lines) - suffix]
+        delta = len(new_lines) - len(old_lines)
+        old_suffix_tokens = self.line_tokens[len(old_lines) - suffix:]
+        line_tokens = self.line_tokens[:prefix]
+        for offset, line in enumerate(changed):
+            line_tokens.append(self.lexer.scan_line(line, prefix + offset + 1))
+        for tokens in old_suffix_tokens:
+            if delta:
+                tokens = [Token(t.type, t.value, str(int(t.line_num) + delta)) for t in tokens]
+            line_tokens.append(tokens)
+        tokens = [token for line in line_tokens for token in line]
+
+        prefix_count = sum(len(line) for line in line_tokens[:prefix])
+        suffix_count = sum(len(line) for line in old_suffix_tokens)
+        fragments = None
+        if self.begin_index is not None:
+            fragments = self._update_fragments(tokens, prefix_count,
+                                               len(self.tokens) - suffix_count,
+                                               len(tokens) - suffix_count)
+        full_rebuild = fragments is None
+        if full_rebuild and len(tokens) > 1 and tokens[1].value != "main":
+            # procedures are generated with the whole program, which is rebuilt on every edit
+            program = Parser(tokens).program()
+            fragments, decl_count, begin_index = [Fragment(program, 0, len(tokens), None)], 0, None
+        elif full_rebuild:
+            fragments, decl_count, begin_index = self._parse_all(tokens)
+        else:
+            fragments, decl_count, begin_index = fragments
+
+        reused = 0
+        for fragment in fragments:
+            if fragment.instructions is None:
+                fragment.instructions = self._generate(fragment.node)
+                fragment.code = "\n".join(fragment.instructions)
+            else:
+                reused += 1
+
+        self.lines = new_lines
+        self.line_tokens = line_tokens
+        self.tokens = tokens
+        self.fragments = fragments
+        self.decl_count = decl_count
+        self.begin_index = begin_index
+        self.code = "\n".join(fragment.code for fragment in fragments if fragment.code)
+
+        return IncrementalReport(len(new_lines), len(changed), len(fragments), reused,
+                                 full_rebuild, time.perf_counter() - started)
+
+    def _update_fragments(self, tokens, changed_start, old_changed_end, new_changed_end):
+        # returns None whenever the edit touches the program skeleton
+        # (procedure main is ... begin ... end) and a full parse is needed
+        shift = new_changed_end - old_changed_end
+        old_end_index = len(self.tokens) - 1
+        if changed_start < HEADER_LENGTH or old_changed_end > old_end_index:
+            return None
+        if changed_start <= self.begin_index < old_changed_end:
+            return None
+
+        in_decls = old_changed_end <= self.begin_index
+        if in_decls:
+            section = self.fragments[:self.decl_count]
+            section_start = HEADER_LENGTH
+            section_end = self.begin_index + shift
+        else:
+            section = self.fragments[self.decl_count:]
+            section_start = self.begin_index + 1
+            section_end = old_end_index + shift
+
+        before = [f for f in section if f.end <= changed_start]
+        after = [f for f in section if f.start >= old_changed_end]
+        lo = before[-1].end if before else section_start
+        hi = after[0].start + shift if after else section_end
+
+        parser = Parser(tokens)
+        parser.position = lo
+        try:
+            middle = self._parse_items(parser, hi, in_decls)
+        except ParserError:
+            return None
+        if parser.position != hi:
+            return None
+
+        if shift:
+            after = [fragment.shifted(shift) for fragment in after]
+        section = before + middle + after
+        if in_decls:
+            fragments = section + self.fragments[self.decl_count:]
+            return fragments, len(section), self.begin_index + shift
+        return self.fragments[:self.decl_count] + section, self.decl_count, self.begin_index
+
+    def _parse_items(self, parser, stop, in_decls):
+        items = []
+        while parser.position < stop:
+            start = parser.position
+            if in_decls:
+                if not parser.match_token("var"):
+                    raise ParserError(f"Expected 'var', got '{parser.current_token().value}'")
+                node = parser.decl()
+            else:
+                node = parser.stmt()
+            if node is None or parser.position == start:
+                token = parser.tokens[start]
+                raise ParserError(f"Unexpected token '{token.value}' in statement on line {token.line_num}")
+            items.append(Fragment(node, start, parser.position, None))
+        return items
+
+    def _parse_all(self, tokens):
+        parser = Parser(tokens)
+        parser.expect_token("procedure")
+        parser.expect_token("main")
+        parser.expect_token("is")
+
+        decls = []
+        while parser.match_token("var"):
+            start = parser.position
+            decls.append(Fragment(parser.decl(), start, parser.position, None))
+
+        begin_index = parser.position
+        parser.expect_token("begin")
+        statements = []
+        while parser.current_token() is not None and not parser.match_token("end"):
+            # an item always consumes at least one token, so this parses exactly one
+            statements.extend(self._parse_items(parser, parser.position + 1, False))
+        parser.expect_token("end")
+
+        if parser.current_token() is not None:
+            raise ParserError(f"Unexpected token '{parser.current_token().value}' after 'end' on line {parser.current_token().line_num}")
+        return decls + statements, len(decls), begin_index
+
+    def _generate(self, node):
+        if isinstance(node, Program):
+            generator = CodeGenerator(verbose=False)
+            generator.generate(Simplifier().simplify(node))
+            return generator.get_code().split("\n")
+        generator = CodeGenerator(verbose=False)
+        generator.start_label_counter = self.label_counter
+        generator.end_label_counter = self.label_counter
+        generator.else_label_counter = self.label_counter
+        # on its own, a fragment may simplify to no statements or to those of a branch
+        for statement in Simplifier().block([node]):
+            generator.generate(statement)
+        generator.propagate_constants()
+        generator.remove_unused_constants()
+        generator.optimize_strength_reduction()
+        self.label_counter = max(generator.start_label_counter,
+                                 generator.end_label_counter,
+                                 generator.else_label_counter)
+        return generator.instructions
+
+
+def watch(path, interval=0.2):
+    compiler = IncrementalCompiler()
+    last_mtime = None
+    print(f"Watching {path} (Ctrl+C to stop)...")
+    try:
+        while True:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime is not None and mtime != last_mtime:
+                last_mtime = mtime
+                with open(path, 'r') as f:
+                    code = f.read()
+                try:
+                    report = compiler.update(code)
+                    print(report)
+                    Execute(compiler.code).run()
+                except Exception as e:
+                    print(f"Error: {e}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
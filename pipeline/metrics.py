@@ -0,0 +1,114 @@
+"""
+Metrics of one pipeline run, for main.py --metrics-out.
+
+Every stage records its wall time and the process's peak resident memory when
+it finished (the high-water mark so far, so the stage that raised it is the
+one whose value jumps). The run also records how many tokens, AST nodes and IR
+instructions it produced, the IR size before and after optimization and the
+number of instructions executed, and for programs that import other files the
+compilation units compiled and reused. write() saves the record as JSON, or as a
+Prometheus textfile when the path ends in .prom.
+"""
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROMETHEUS_SUFFIX = ".prom"
+# (record key, metric name, help text) of the counts
+COUNTS = (("tokens", "numera_tokens", "Tokens produced by the lexer."),
+          ("ast_nodes", "numera_ast_nodes", "Nodes of the simplified and unrolled AST."),
+          ("ir_unoptimized", "numera_ir_unoptimized_instructions", "IR instructions before optimization."),
+          ("ir_optimized", "numera_ir_optimized_instructions", "IR instructions after optimization."),
+          ("constants", "numera_constant_pool_size", "Entries of the constant pool."),
+          ("ir_residual", "numera_ir_residual_instructions", "IR instructions left after partial evaluation."),
+          ("units_compiled", "numera_units_compiled", "Compilation units compiled from source."),
+          ("units_reused", "numera_units_reused", "Compilation units whose saved objects were reused."),
+          ("executed", "numera_executed_instructions", "IR instructions executed."),
+          ("memo_hits", "numera_memo_hits", "Memoized code regions replayed from the cache."),
+          ("memo_misses", "numera_memo_misses", "Memoized code regions run and recorded."))
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def count_nodes(node):
+    # nodes of an ast_node tree
+    if isinstance(node, list):
+        return sum(count_nodes(item) for item in node)
+    fields = getattr(node, "__node_fields__", None)
+    if fields is None:
+        return 0
+    return 1 + sum(count_nodes(getattr(node, name)) for name in fields)
+
+
+class Metrics:
+    def __init__(self):
+        self.stages = []  # {"stage", "seconds", "peak_rss_bytes"} in the order they ran
+        self.counts = dict.fromkeys((key for key, _, _ in COUNTS))
+        self.status = None
+        self.failed_stage = None
+        self.current = None
+        self.started = None
+
+    def start(self, stage):
+        # ends the running stage, if any, and starts timing the next one
+        self.end()
+        self.current = stage
+        self.started = time.perf_counter()
+
+    def end(self):
+        if self.current is None:
+            return
+        self.stages.append({"stage": self.current,
+                            "seconds": time.perf_counter() - self.started,
+                            "peak_rss_bytes": peak_rss_bytes()})
+        self.current = None
+
+    def finish(self, status, failed_stage=None):
+        # status: "ok", "check-only" or "error"
+        self.end()
+        self.status = status
+        self.failed_stage = failed_stage
+
+    def record(self):
+        return {"status": self.status,
+                "failed_stage": self.failed_stage,
+                "total_seconds": sum(stage["seconds"] for stage in self.stages),
+                "stages": self.stages,
+                "counts": self.counts}
+
+    def write(self, path):
+        if path.endswith(PROMETHEUS_SUFFIX):
+            text = self.prometheus()
+        else:
+            import json
+            text = json.dumps(self.record(), indent=2) + "\n"
+        with open(path, "w") as f:
+            f.write(text)
+
+    def prometheus(self):
+        lines = ["# HELP numera_run_success Whether the last run completed without errors.",
+                 "# TYPE numera_run_success gauge",
+                 f"numera_run_success {int(self.status in ('ok', 'check-only'))}",
+                 "# HELP numera_stage_seconds Wall time of each pipeline stage.",
+                 "# TYPE numera_stage_seconds gauge"]
+        lines += [f'numera_stage_seconds{{stage="{stage["stage"]}"}} {stage["seconds"]:.6f}'
+                  for stage in self.stages]
+        if resource is not None:
+            lines += ["# HELP numera_stage_peak_rss_bytes Peak resident memory at the end of each stage.",
+                      "# TYPE numera_stage_peak_rss_bytes gauge"]
+            lines += [f'numera_stage_peak_rss_bytes{{stage="{stage["stage"]}"}} {stage["peak_rss_bytes"]}'
+                      for stage in self.stages]
+        for key, name, description in COUNTS:
+            if self.counts[key] is not None:
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} gauge",
+                          f"{name} {self.counts[key]}"]
+        return "\n".join(lines) + "\n"
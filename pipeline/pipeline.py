@@ -1,49 +1,283 @@
-from parser.parser import Parser
-from tokenizer.scanner import Lexer
-from generator.generator import CodeGenerator
-from executer.executer import Execute
+# Stage modules are imported when their stage runs, so that short invocations
+# (and --check-only, which never reaches code generation) do not pay for them.
+import os
 
 class Pipeline:
-    def __init__(self, source_file):
+    def __init__(self, source_file, check_only=False, profile=False, metrics_out=None,
+                 partial_eval=False, bound_inputs=(), unroll_factor=None, checkpoint=None, source_path=None,
+                 record_profile=None, use_profile=None, stream=False, pipelined=False, memoize=False,
+                 stream_out=None):
         self.source_file = source_file
+        self.source_path = source_path  # file the source was read from; imports are relative to it
+        self.check_only = check_only
+        self.profile = profile
+        # precompute what does not depend on unbound input (executer/partial.py); the
+        # bound inputs answer the first in() calls
+        self.partial_eval = partial_eval
+        self.bound_inputs = bound_inputs
+        self.unroll_factor = unroll_factor  # None: generator/unroll.py's default
+        self.checkpoint = checkpoint  # snapshot file the run is saved to and resumed from
+        self.metrics_out = metrics_out  # path the metrics of the run are written to
+        # profile-guided optimization (generator/pgo.py): the run is recorded to the file
+        # record_profile, and compiled with use_profile, an executer.feedback.Profile
+        self.record_profile = record_profile
+        self.use_profile = use_profile
+        # unoptimized code, run while it is generated (generator/stream.py)
+        self.stream = stream
+        # the same, with lexing, parsing and code generation in threads of their own (pipeline/pipelined.py)
+        self.pipelined = pipelined
+        # the streamed code written to this file instead of being run (generator/stream.py's write_code)
+        self.stream_out = stream_out
+        # cache the results of pure code regions (executer/memo.py)
+        self.memoize = memoize
+        self.metrics = None
         self.tokens = None
         self.ast = None
         self.generated_code = None
-        
+
     def run(self):
+        from .metrics import Metrics, count_nodes
+        self.metrics = metrics = Metrics()
         stage = None
         try:
+            if self.pipelined:
+                print("Starting Pipelined Compilation and Execution...")
+                stage = "Pipelined Execution"
+                metrics.start(stage)
+                from .pipelined import PipelinedRun, StageError
+                pipelined = PipelinedRun(self.source_file, count_instructions=self.metrics_out is not None)
+                print("Executed Code:")
+                try:
+                    pipelined.run()
+                except StageError as e:
+                    stage = e.stage
+                    raise e.error
+                print(pipelined.report())
+                metrics.counts["tokens"] = pipelined.token_count
+                metrics.counts["ir_unoptimized"] = pipelined.generator.emitted
+                metrics.counts["executed"] = pipelined.executer.executed
+                metrics.finish("ok")
+                print("\nPipeline Execution Complete!")
+                return
+
             print("Starting Lexical Analysis...")
             stage = "Lexical Analysis"
+            metrics.start(stage)
+            from tokenizer.scanner import Lexer
             lexer = Lexer()
             self.tokens = lexer.scan(self.source_file)
+            metrics.counts["tokens"] = len(self.tokens)
             print("Tokens Generated:")
             for token in self.tokens:
                 print(f"  {token}")
 
             print("\nStarting Parsing...")
             stage = "Parsing"
+            metrics.start(stage)
+            from parser.parser import Parser
             parser = Parser(self.tokens)
             self.ast = parser.parse()
             print("AST Generated:")
             parser.print_ast(self.ast)
 
-            print("\nStarting Code Generation...")
-            stage = "CodeGenerator"
-            generator = CodeGenerator()
-            generator.generate(self.ast)
-            self.instructions = generator.get_code()
-            print("Generated Code:")
-            print(self.instructions)
+            if self.check_only:
+                if parser.imports:
+                    from .build import Build
+                    Build().check(self.source_path, parser.imports)
+                metrics.counts["ast_nodes"] = count_nodes(self.ast)
+                metrics.finish("check-only")
+                print("\nCheck Complete: no errors found.")
+                return
+
+            if self.stream_out is not None:
+                if parser.imports:
+                    raise ValueError("Streaming does not support imports")
+                print("\nStarting Streaming Code Generation...")
+                stage = "Streaming Code Generation"
+                metrics.start(stage)
+                from generator.stream import StreamingGenerator, write_code
+                generator = StreamingGenerator()
+                with open(self.stream_out, "w") as f:
+                    write_code(generator.chunks(self.ast), f)
+                print(generator.report())
+                print(f"Code written to {self.stream_out}")
+                metrics.counts["ast_nodes"] = count_nodes(self.ast)
+                metrics.counts["ir_unoptimized"] = generator.emitted
+                metrics.finish("ok")
+                print("\nPipeline Execution Complete!")
+                return
+
+            if self.stream:
+                if parser.imports:
+                    raise ValueError("Streaming does not support imports")
+                print("\nStarting Streaming Code Generation and Execution...")
+                stage = "Streaming Execution"
+                metrics.start(stage)
+                from generator.stream import StreamingGenerator
+                from executer.stream import StreamingExecute
+                generator = StreamingGenerator()
+                executer = StreamingExecute(generator.chunks(self.ast),
+                                            count_instructions=self.metrics_out is not None)
+                print("Executed Code:")
+                executer.run()
+                print(generator.report())
+                metrics.counts["ast_nodes"] = count_nodes(self.ast)
+                metrics.counts["ir_unoptimized"] = generator.emitted
+                metrics.counts["executed"] = executer.executed
+                metrics.finish("ok")
+                print("\nPipeline Execution Complete!")
+                return
+
+            profile = self.use_profile
+            if profile is not None:
+                if profile.matches(self.source_file):
+                    print(profile.report())
+                else:
+                    print("Profile was recorded from another version of the program, not using it")
+                    profile = None
+
+            if parser.imports:
+                # compilation units, see pipeline/build.py
+                print("\nStarting Separate Compilation...")
+                stage = "Separate Compilation"
+                metrics.start(stage)
+                from .build import Build
+                build = Build(self.unroll_factor, profile=profile)
+                units = build.build(self.source_path, self.source_file, self.ast, parser.imports)
+                metrics.counts["units_compiled"] = len(build.compiled)
+                metrics.counts["units_reused"] = len(build.reused)
+                print(build.report())
+
+                print("\nStarting Linking...")
+                stage = "Linking"
+                metrics.start(stage)
+                from generator.linker import link
+                linked = link(units)
+                print(linked.report())
+                self.instructions = linked.code
+                source_map = linked.source_map
+                parallel_loops = linked.parallel_loops
+                metrics.counts["ir_optimized"] = len(source_map)
+                metrics.counts["constants"] = linked.constants
+                print("Linked Code:")
+                print(self.instructions)
+            else:
+                print("\nStarting Simplification...")
+                stage = "Simplification"
+                metrics.start(stage)
+                from generator.simplifier import Simplifier
+                simplifier = Simplifier()
+                self.ast = simplifier.simplify(self.ast)
+                print(simplifier.report())
+
+                if profile is not None:
+                    print("\nStarting Inlining...")
+                    stage = "Inlining"
+                    metrics.start(stage)
+                    from generator.pgo import Inliner
+                    inliner = Inliner(profile)
+                    self.ast = inliner.inline(self.ast)
+                    print(inliner.report())
+
+                print("\nStarting Loop Unrolling...")
+                stage = "Loop Unrolling"
+                metrics.start(stage)
+                from generator.unroll import Unroller, UNROLL_FACTOR
+                unroller = Unroller(simplifier, UNROLL_FACTOR if self.unroll_factor is None else self.unroll_factor,
+                                    profile)
+                self.ast = unroller.unroll(self.ast)
+                print(unroller.report())
+                metrics.counts["ast_nodes"] = count_nodes(self.ast)
+
+                print("\nStarting Code Generation...")
+                stage = "CodeGenerator"
+                metrics.start(stage)
+                from generator.generator import CodeGenerator
+                generator = CodeGenerator(profile=profile)
+                generator.generate(self.ast)
+                self.instructions = generator.get_code()
+                metrics.counts["ir_unoptimized"] = generator.unoptimized_size
+                metrics.counts["ir_optimized"] = len(generator.instructions)
+                metrics.counts["constants"] = len(generator.constants)
+                print("Generated Code:")
+                print(self.instructions)
+
+                source_map = generator.source_map()
+                parallel_loops = generator.parallel_loops
+
+            if self.partial_eval:
+                print("\nStarting Partial Evaluation...")
+                stage = "Partial Evaluation"
+                metrics.start(stage)
+                from executer.partial import partial_evaluate
+                residual = partial_evaluate(self.instructions, source_map, self.bound_inputs)
+                print(residual.report())
+                self.instructions = residual.code
+                source_map = residual.source_map
+                metrics.counts["ir_residual"] = len(source_map)
+                print("Residual Code:")
+                print(self.instructions)
 
             print("\nStarting Code Execution...")
             stage = "Execute"
-            executer = Execute(self.instructions)
+            metrics.start(stage)
+            from executer.executer import Execute
+            executer = Execute(self.instructions, source_map=source_map,
+                               parallel_loops=parallel_loops,
+                               count_instructions=self.metrics_out is not None,
+                               memoize=self.memoize)
+            if self.checkpoint is not None and os.path.exists(self.checkpoint):
+                with open(self.checkpoint, "rb") as f:
+                    executer.restore(f.read())
+                print(f"Resuming from checkpoint {self.checkpoint}")
             print("Executed Code:")
-            executer.run()
+            if self.profile:
+                profiler = executer.profile()
+                print("\nLine Profile:")
+                print(profiler.report(executer.source_map, self.source_file))
+                executer.executed = sum(profiler.counts)
+            elif self.record_profile is not None:
+                self.save_profile(executer.record_profile(self.source_file))
+            elif self.checkpoint is not None:
+                from executer.snapshot import run_checkpointed
+                run_checkpointed(executer, self.checkpoint)
+            else:
+                executer.run()
+            metrics.counts["executed"] = executer.executed
+            for label, outcome in executer.parallel_report.items():
+                print(f"Parallel loop {label}: {outcome}")
+            if executer.memo is not None:
+                print(executer.memo.report())
+                stats = executer.memo.stats()
+                metrics.counts["memo_hits"] = stats["hits"]
+                metrics.counts["memo_misses"] = stats["misses"]
 
+            metrics.finish("ok")
 
             print("\nPipeline Execution Complete!")
 
         except Exception as e:
-            print(f"Error during compilation pipeline at stage {stage}: {e}")
\ No newline at end of file
+            metrics.finish("error", stage)
+            print(f"Error during compilation pipeline at stage {stage}: {e}")
+        finally:
+            if self.metrics_out is not None:
+                self.metrics.write(self.metrics_out)
+                print(f"Metrics written to {self.metrics_out}")
+
+    def save_profile(self, profile):
+        # writes the recorded profile, added to the one already in the file if that is of the same source
+        from executer.feedback import load, save
+        merged = False
+        try:
+            with open(self.record_profile, "rb") as f:
+                previous = load(f.read())
+            if previous.source == profile.source:
+                profile.merge(previous)
+                merged = True
+        except (OSError, ValueError):
+            pass  # no profile yet, or one that cannot be read: it is replaced
+        partial = self.record_profile + ".tmp"
+        with open(partial, "wb") as f:
+            f.write(save(profile))
+        os.replace(partial, self.record_profile)
+        print(f"\nProfile written to {self.record_profile}" + (", added to the runs recorded before" if merged else ""))
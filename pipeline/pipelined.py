@@ -0,0 +1,196 @@
+"""
+Pipelined compilation: the stages run at the same time, python3 main.py --pipelined.
+
+The usual pipeline runs one stage after the other over the whole program.
+Here every stage runs in a thread of its own and hands what it produced to the
+next through a bounded Channel as soon as it has it:
+
+    lexer ---> parser ---> code generator ---> executer (the calling thread)
+      batches of lines'   procedures and        chunks of unoptimized code
+      tokens              declarations, then    (generator/stream.py)
+                          one statement at a
+                          time (parser/stream.py)
+
+A stage that is ahead blocks once its channel is full (TOKEN_BATCHES,
+STATEMENTS and CHUNKS items), so it does not run away with the memory, and the
+program starts running as soon as its procedures and first statements are
+generated. Python threads do not run at the same time, so the stages take
+turns rather than overlap; the gain is the time to the first output, not the
+total time.
+
+A stage that fails closes its channel with a StageError naming it, which every
+stage after it passes on when it gets there. The lexer hands on the tokens of
+the lines before the one that failed and the code generator the code of the
+statements before the failed one (generator/stream.py), so the error is raised
+by run() after the output of the code before it, as with --stream, also when
+that code is in the first chunk. When run() returns or raises, the stages still
+running are stopped.
+"""
+import threading
+from queue import Empty, Full, Queue
+
+from parser.ast_node import Program
+from parser.stream import StreamingParser
+from tokenizer.scanner import Lexer
+from generator.stream import StreamingGenerator
+from executer.stream import StreamingExecute
+
+LEX_BATCH_LINES = 256
+TOKEN_BATCHES = 8
+STATEMENTS = 1024
+CHUNKS = 2
+POLL_SECONDS = 0.05  # how often a blocked stage checks whether it was stopped
+
+
+class StageError(Exception):
+    def __init__(self, stage, error):
+        super().__init__(f"{stage}: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class Stopped(Exception):
+    pass
+
+
+class Closed:
+    # the last item of a channel, with the StageError that ended it early if any
+    def __init__(self, failure=None):
+        self.failure = failure
+
+
+class Channel:
+    # bounded queue from one stage to the next; iterating it gets the items until it is closed
+    def __init__(self, size, stop):
+        self.queue = Queue(size)
+        self.stop = stop
+        self.items = 0
+        self.full = 0  # times the producer waited for room
+        self.empty = 0  # times the consumer waited for an item
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            self.full += 1
+            while True:
+                if self.stop.is_set():
+                    raise Stopped()
+                try:
+                    self.queue.put(item, timeout=POLL_SECONDS)
+                    break
+                except Full:
+                    pass
+        self.items += 1
+
+    def close(self, failure=None):
+        self.put(Closed(failure))
+        self.items -= 1
+
+    def get(self):
+        try:
+            return self.queue.get_nowait()
+        except Empty:
+            self.empty += 1
+        while True:
+            if self.stop.is_set():
+                raise Stopped()
+            try:
+                return self.queue.get(timeout=POLL_SECONDS)
+            except Empty:
+                pass
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if isinstance(item, Closed):
+                if item.failure is not None:
+                    raise item.failure
+                return
+            yield item
+
+
+class PipelinedRun:
+    def __init__(self, source, count_instructions=False):
+        self.source = source
+        self.stop = threading.Event()
+        self.tokens = Channel(TOKEN_BATCHES, self.stop)
+        self.statements = Channel(STATEMENTS, self.stop)
+        self.chunks = Channel(CHUNKS, self.stop)
+        self.token_count = 0
+        self.statement_count = 0
+        self.generator = StreamingGenerator()
+        self.executer = StreamingExecute(self.chunks, count_instructions=count_instructions)
+
+    def report(self):
+        channels = (("tokens", self.tokens), ("statements", self.statements), ("code", self.chunks))
+        waits = ", ".join(f"{name} {channel.full} full / {channel.empty} empty" for name, channel in channels)
+        return (f"Pipelined: {self.token_count} tokens, {self.statement_count} statements, "
+                f"{self.chunks.items} chunks; waits: {waits}")
+
+    def run(self):
+        # runs the program; raises the StageError of the first stage that failed
+        stages = (("Lexical Analysis", self.lex, self.tokens),
+                  ("Parsing", self.parse, self.statements),
+                  ("CodeGenerator", self.generate, self.chunks))
+        threads = [threading.Thread(target=self.work, args=stage, name=stage[0], daemon=True)
+                   for stage in stages]
+        for thread in threads:
+            thread.start()
+        try:
+            self.executer.run()
+        except StageError:
+            raise
+        except Exception as e:
+            raise StageError("Execute", e) from e
+        finally:
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+    def work(self, stage, produce, channel):
+        try:
+            produce(channel)
+        except Stopped:
+            return
+        except StageError as e:
+            failure = e  # of a stage before this one
+        except Exception as e:
+            failure = StageError(stage, e)
+        else:
+            failure = None
+        try:
+            channel.close(failure)
+        except Stopped:
+            pass
+
+    def lex(self, channel):
+        lexer = Lexer()
+        lines = self.source.splitlines()
+        for first in range(0, len(lines), LEX_BATCH_LINES):
+            batch = []
+            try:
+                for offset, line in enumerate(lines[first:first + LEX_BATCH_LINES]):
+                    batch.extend(lexer.scan_line(line, first + offset + 1))
+            except Exception:
+                channel.put(batch)  # the lines before the one that failed still run
+                raise
+            self.token_count += len(batch)
+            channel.put(batch)
+
+    def parse(self, channel):
+        parser = StreamingParser(self.tokens)
+        procedures, declarations = parser.header()
+        if parser.imports:
+            raise ValueError("Pipelined stages do not support imports")
+        channel.put((procedures, declarations))
+        for statement in parser.statements():
+            self.statement_count += 1
+            channel.put(statement)
+
+    def generate(self, channel):
+        statements = iter(self.statements)
+        procedures, declarations = next(statements)
+        program = Program(declarations=declarations, statements=statements, procedures=procedures)
+        for chunk in self.generator.chunks(program):
+            channel.put(chunk)
@@ -0,0 +1,163 @@
+"""
+Interactive sessions, python3 main.py repl.
+
+A Session keeps one process warm for the entries typed one after another: one
+lexer, one code generator, whose labels, procedures and arrays carry over from
+entry to entry, and one Execute, whose variables do. An entry, any number of
+declarations, statements and procedure definitions, is lexed, parsed and
+generated on its own, against what the entries before it defined, and without
+optimizing (as generator/stream.py, whose flush() starts every entry afresh).
+Its code is appended to the executer's and run from its start. Procedures are
+generated behind a jump over them, before the statements of their entry, so
+that these and every later entry can call them; none can be defined twice.
+
+An entry whose input ends before it is complete (an if without its end, a
+statement without its semicolon) waits for more lines; an empty line submits
+it as it is. Every entry reports how long it took to compile and to run.
+"""
+import time
+from array import array
+
+from parser.ast_node import Procedure, Program
+from parser.parser import Parser
+from parser.parser_error import ParserError
+from tokenizer.scanner import Lexer
+from generator.stream import StreamingGenerator
+from executer.executer import Execute
+
+PROMPT = "numera> "
+CONTINUATION = "      | "
+
+
+class EntryReport:
+    def __init__(self, instructions, compile_seconds, run_seconds):
+        self.instructions = instructions
+        self.compile_seconds = compile_seconds
+        self.run_seconds = run_seconds
+
+    def __str__(self):
+        plural = "s" if self.instructions != 1 else ""
+        return (f"[{self.instructions} instruction{plural}, compiled in {self.compile_seconds * 1000:.3f} ms, "
+                f"ran in {self.run_seconds * 1000:.3f} ms]")
+
+
+class Session:
+    def __init__(self):
+        self.lexer = Lexer()
+        self.generator = StreamingGenerator()
+        self.executer = Execute("", source_map=array('i'))
+        self.procedures = []  # Procedure nodes of the entries so far
+        self.line = 0  # source lines of the entries so far; an entry's lines are numbered on from it
+
+    def enter(self, source, complete=False):
+        # compiles and runs the entry source; returns an EntryReport, or None if source ends
+        # early and complete is False
+        started = time.perf_counter()
+        items = self.parse(source, complete)
+        if items is None:
+            return None
+        self.line += len(source.splitlines())
+        instructions, lines = self.compile(items)
+        compiled = time.perf_counter()
+        self.run(instructions, lines)
+        return EntryReport(len(instructions), compiled - started, time.perf_counter() - compiled)
+
+    def parse(self, source, complete):
+        # the procedures, declarations and statements of an entry
+        tokens = []
+        for offset, line in enumerate(source.splitlines()):
+            tokens.extend(self.lexer.scan_line(line, self.line + offset + 1))
+        parser = Parser(tokens)
+        items = []
+        try:
+            while parser.current_token() is not None:
+                start = parser.position
+                if parser.match_token("procedure"):
+                    parser.next_token()
+                    items.append(parser.procedure())
+                    continue
+                node = parser.stmt()
+                if node is None:
+                    raise ParserError(f"Unexpected token '{tokens[start].value}' in statement "
+                                      f"on line {tokens[start].line_num}")
+                items.append(node)
+        except ParserError:
+            if not complete and parser.position >= len(tokens):
+                return None
+            raise
+        return items
+
+    def compile(self, items):
+        # (instructions, source lines) of the parsed entry items
+        generator = self.generator
+        procedures = [item for item in items if isinstance(item, Procedure)]
+        try:
+            if procedures:
+                generator.prepare_program(Program(declarations=[], statements=[],
+                                                  procedures=self.procedures + procedures))
+                skip_label = generator.new_end_label()
+                generator.add_instruction(f"JUMP {skip_label}")
+                for procedure in procedures:
+                    generator.generate(procedure)
+                generator.add_instruction(f"LABEL {skip_label}")
+            for item in items:
+                if not isinstance(item, Procedure):
+                    generator.generate(item)
+        except Exception:
+            generator.flush()
+            if procedures:
+                generator.prepare_program(Program(declarations=[], statements=[], procedures=self.procedures))
+            raise
+        self.procedures += procedures
+        return generator.flush()
+
+    def run(self, instructions, lines):
+        executer = self.executer
+        executer.pc = executer.extend(instructions, lines)
+        try:
+            executer.run()
+        except BaseException:
+            self.unwind()
+            raise
+
+    def unwind(self):
+        # back to the main program after an entry failed or was interrupted in a call
+        executer = self.executer
+        if executer.call_stack:
+            executer.variables = executer.globals
+            executer.temp_vars = executer.call_stack[0].caller_temps
+            for frame in reversed(executer.call_stack):
+                executer.frames.release(frame)
+            executer.call_stack.clear()
+
+
+def repl():
+    session = Session()
+    print("Numera REPL: enter declarations, statements and procedures; Ctrl+D to quit.")
+    lines = []
+    while True:
+        try:
+            line = input(CONTINUATION if lines else PROMPT)
+        except EOFError:
+            print()
+            return
+        except KeyboardInterrupt:
+            print()
+            lines = []
+            continue
+        if not lines and not line.strip():
+            continue
+        lines.append(line)
+        try:
+            report = session.enter("\n".join(lines), complete=not line.strip())
+        except KeyboardInterrupt:
+            print("\nInterrupted")
+            lines = []
+            continue
+        except Exception as e:
+            print(f"Error: {e}")
+            lines = []
+            continue
+        if report is not None:
+            lines = []
+            print(report)
@@ -0,0 +1,49 @@
+"""
+What the tests share: compiling a program the way main.py does, and running
+code with its output captured, so that every path through the pipeline can be
+checked against the plain one.
+"""
+import contextlib
+import io
+
+from tokenizer.scanner import Lexer
+from parser.parser import Parser
+from generator.simplifier import Simplifier
+from generator.unroll import Unroller, UNROLL_FACTOR
+from generator.generator import CodeGenerator
+from executer.executer import Execute
+
+
+def parse(source):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Parser(Lexer().scan(source)).parse()
+
+def compile_program(source, unroll_factor=UNROLL_FACTOR, profile=None):
+    # the CodeGenerator of source after the stages of Pipeline.run, optimized
+    with contextlib.redirect_stdout(io.StringIO()):
+        simplifier = Simplifier()
+        tree = simplifier.simplify(parse(source))
+        if profile is not None:
+            from generator.pgo import Inliner
+            tree = Inliner(profile).inline(tree)
+        tree = Unroller(simplifier, unroll_factor, profile).unroll(tree)
+        generator = CodeGenerator(verbose=False, profile=profile)
+        generator.generate(tree)
+    return generator
+
+def output_of(run):
+    # what run() prints
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        run()
+    return output.getvalue()
+
+def execute(code, source_map=None, inputs=None, **options):
+    # the output of running code; options go to Execute
+    return output_of(Execute(code, source_map=source_map, inputs=inputs, **options).run)
+
+def run_plain(source, inputs=None):
+    # the output of source through the plain pipeline
+    generator = compile_program(source)
+    return execute(generator.get_code(), generator.source_map(), inputs,
+                   parallel_loops=generator.parallel_loops)
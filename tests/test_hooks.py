@@ -0,0 +1,101 @@
+import pytest
+
+from executer.executer import DONE, Execute
+from executer.hooks import BREAKPOINT, EVENTS
+from tests.support import compile_program, output_of, run_plain
+
+PROGRAM = """procedure bump(v) is
+begin
+    return v + 1;
+end
+procedure main is
+    var i = 0;
+    var s = "";
+    var a[4];
+    var t = 0;
+begin
+    while i < 4 do
+        a[i] = bump(i) * 10;
+        s = s + "ab";
+        i = i + 1;
+    end
+    fill(a, 7);
+    t = sum(a);
+    print(s);
+    print(t);
+end
+"""
+
+
+def executer_of(source):
+    generator = compile_program(source, unroll_factor=0)
+    return Execute(generator.get_code(), generator.source_map())
+
+def line_of(text):
+    return PROGRAM.splitlines().index(text) + 1
+
+
+def test_store_events_follow_every_write():
+    executer = executer_of(PROGRAM)
+    stores = []
+    executer.add_hook("store", lambda executer, pc, name, value: stores.append((name, value)))
+    assert output_of(executer.run) == run_plain(PROGRAM)
+    assert [value for name, value in stores if name == "s"] == ["", "ab", "abab", "ababab", "abababab"]
+    assert [value for name, value in stores if name.startswith("a[")] == [10, 20, 30, 40]
+    filled = [value for name, value in stores if name == "a"]
+    assert len(filled) == 1 and list(filled[0]) == [7, 7, 7, 7]
+    assert stores[-1] == ("t", 28)
+
+def test_print_branch_and_back_edge_events():
+    executer = executer_of(PROGRAM)
+    seen = {event: [] for event in EVENTS}
+    for event in EVENTS:
+        executer.add_hook(event, lambda executer, pc, *values, event=event: seen[event].append(values))
+    output = output_of(executer.run)
+    assert [str(value) for value, in seen["print"]] == output.splitlines()
+    assert [jumped for jumped, in seen["branch"]].count(True) == 1  # the loop leaves once
+    assert len(seen["back_edge"]) == 4
+    assert len(seen["instruction"]) > len(seen["store"]) > 0
+
+def test_breakpoints_stop_and_resume():
+    executer = executer_of(PROGRAM)
+    executer.add_breakpoint(line=line_of("        s = s + \"ab\";"))
+    stops = []
+
+    def run():
+        while executer.run() == BREAKPOINT:
+            stops.append(executer.variables["i"])
+    assert output_of(run) == run_plain(PROGRAM)
+    assert stops == [0, 1, 2, 3]
+
+def test_breakpoint_on_an_instruction():
+    executer = executer_of(PROGRAM)
+    pc = executer.instructions.index(next(instr for instr in executer.instructions if instr.startswith("PRINT")))
+    executer.add_breakpoint(pc=pc)
+    assert output_of(executer.run) == "" and executer.pc == pc
+    assert output_of(executer.run) == run_plain(PROGRAM)
+
+def test_removed_hooks_leave_the_usual_run():
+    executer = executer_of(PROGRAM)
+    nothing = lambda *args: None
+    executer.remove_breakpoint(line=3)  # none set: nothing to do
+    executer.add_hook("instruction", nothing)
+    executer.add_breakpoint(line=3)
+    executer.remove_hook("instruction", nothing)
+    executer.remove_breakpoint(line=3)
+    assert executer.hooks is None
+    with pytest.raises(ValueError):
+        executer.remove_hook("instruction", nothing)
+    with pytest.raises(ValueError):
+        executer.add_hook("no such event", nothing)
+    status = []
+    assert output_of(lambda: status.append(executer.run())) == run_plain(PROGRAM)
+    assert status == [DONE]
+
+def test_hooked_run_returns_done_and_restores_compilation():
+    executer = executer_of(PROGRAM)
+    threshold = executer.jit_threshold
+    executer.add_hook("back_edge", lambda *args: None)
+    status = []
+    assert output_of(lambda: status.append(executer.run())) == run_plain(PROGRAM)
+    assert status == [DONE] and executer.jit_threshold == threshold
@@ -0,0 +1,130 @@
+import contextlib
+import io
+
+import pytest
+
+from parser.parser import Parser
+from tokenizer.scanner import Lexer
+from generator.linker import link
+from pipeline.build import Build
+from tests.support import execute, run_plain
+
+# every unit has loops and ifs, so its labels and constants collide with the others' until relabeled
+SHAPES = """procedure area(w, h) is
+begin
+    if w < 0 then
+        return 0;
+    end
+    return w * h;
+end
+procedure perimeter(w, h) is
+    var s = 0;
+    var i = 0;
+begin
+    while i < 2 do
+        s = s + w + h;
+        i = i + 1;
+    end
+    return s;
+end
+"""
+NUMBERS = """import "shapes.num";
+procedure triangle(n) is
+    var s = 0;
+    var i = 1;
+begin
+    while i <= n do
+        s = s + i;
+        i = i + 1;
+    end
+    return s + area(0, 7);
+end
+procedure label(v) is
+begin
+    if v > 10 then
+        return "big";
+    end
+    return "small";
+end
+"""
+MAIN = """import "numbers.num";
+import "shapes.num";
+procedure twice(v) is
+begin
+    return v * 2;
+end
+procedure main is
+    var i = 0;
+    var t = 0;
+begin
+    while i < 6 do
+        t = triangle(i);
+        if t > 5 then
+            print(label(area(t, i)));
+        else
+            print(perimeter(t, twice(i)));
+        end
+        i = i + 1;
+    end
+    print(t);
+end
+"""
+
+
+def without_imports(source):
+    return "\n".join(line for line in source.splitlines() if not line.startswith("import "))
+
+def write(directory, files):
+    for name, source in files.items():
+        (directory / name).write_text(source)
+
+def build_and_run(directory):
+    path = str(directory / "main.num")
+    source = (directory / "main.num").read_text()
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser = Parser(Lexer().scan(source))
+        program = parser.parse()
+    build = Build()
+    linked = link(build.build(path, source, program, parser.imports))
+    output = execute(linked.code, linked.source_map, parallel_loops=linked.parallel_loops)
+    return output, build
+
+
+def test_linked_program_prints_what_one_file_does(tmp_path):
+    write(tmp_path, {"shapes.num": SHAPES, "numbers.num": NUMBERS, "main.num": MAIN})
+    expected = run_plain(without_imports(SHAPES + NUMBERS + MAIN))
+    output, build = build_and_run(tmp_path)
+    assert output == expected
+    assert sorted(build.compiled) == ["main.num", "numbers.num", "shapes.num"]
+
+def test_saved_units_are_reused(tmp_path):
+    write(tmp_path, {"shapes.num": SHAPES, "numbers.num": NUMBERS, "main.num": MAIN})
+    expected, _ = build_and_run(tmp_path)
+    output, build = build_and_run(tmp_path)
+    assert output == expected
+    assert build.compiled == [] and len(build.reused) == 3
+
+def test_body_edit_recompiles_its_unit_only(tmp_path):
+    write(tmp_path, {"shapes.num": SHAPES, "numbers.num": NUMBERS, "main.num": MAIN})
+    build_and_run(tmp_path)
+    edited = SHAPES.replace("return w * h;", "return w * h + 1;")
+    write(tmp_path, {"shapes.num": edited})
+    output, build = build_and_run(tmp_path)
+    assert output == run_plain(without_imports(edited + NUMBERS + MAIN))
+    assert build.compiled == ["shapes.num"]
+
+def test_interface_change_recompiles_importers(tmp_path):
+    write(tmp_path, {"shapes.num": SHAPES, "numbers.num": NUMBERS, "main.num": MAIN})
+    build_and_run(tmp_path)
+    # area prints now, so it is no longer pure
+    edited = SHAPES.replace("return w * h;", "print(w);\n    return w * h;")
+    write(tmp_path, {"shapes.num": edited})
+    output, build = build_and_run(tmp_path)
+    assert output == run_plain(without_imports(edited + NUMBERS + MAIN))
+    assert sorted(build.compiled) == ["main.num", "numbers.num", "shapes.num"]
+
+def test_import_cycle_is_reported(tmp_path):
+    write(tmp_path, {"shapes.num": 'import "numbers.num";\n' + SHAPES, "numbers.num": NUMBERS,
+                     "main.num": MAIN})
+    with pytest.raises(ValueError, match="Import cycle"):
+        build_and_run(tmp_path)
@@ -0,0 +1,85 @@
+from executer.executer import PAUSED, Execute
+from tests.support import compile_program, output_of, run_plain
+
+# the region computing y reads c, which goes round 0..4 as an int, then as a float
+PROGRAM = """procedure note(v) is
+begin
+    print(v);
+    return 0;
+end
+procedure shape(c) is
+    var y = 0;
+begin
+    if c < 2 then
+        y = (c * 7 - 3) * (c + 11) - c;
+    else
+        y = c * c * c - 5 * c + 1;
+    end
+    return y;
+end
+procedure main is
+    var i = 0;
+    var c = 0;
+    var y = 0;
+    var s = 0;
+    var z = 0;
+begin
+    while i < 300 do
+        c = c + 1;
+        if c == 5 then
+            c = z;
+        end
+        if c < 2 then
+            y = (c * 7 - 3) * (c + 11) - c;
+        else
+            if c < 4 then
+                y = (c + 4) * (c - 9) + 2 * c;
+            else
+                y = c * c * c - 5 * c + 1;
+            end
+        end
+        s = s + y + shape(c);
+        i = i + 1 + note(y);
+        if i == 150 then
+            z = 0 / 2;
+        end
+    end
+    print(s);
+end
+"""
+DISTINCT = PROGRAM.replace("if c == 5 then", "if c == 5000 then")
+
+
+def memoized(source):
+    # the interpreter alone, as compiled loops do not use the regions
+    executer = Execute(compile_program(source).get_code(), jit_threshold=None, memoize=True)
+    return output_of(executer.run), executer.memo.stats()
+
+
+def test_memoized_run_prints_what_the_plain_one_does():
+    output, stats = memoized(PROGRAM)
+    assert output == run_plain(PROGRAM)
+    assert stats["regions"] >= 1 and stats["hits"] > stats["misses"]
+    assert "-33\n" in output and "-33.0\n" in output  # c = 0.0 was not answered from c = 0
+
+def test_regions_that_miss_are_turned_off():
+    output, stats = memoized(DISTINCT)
+    assert output == run_plain(DISTINCT)
+    assert stats["hits"] == 0 and stats["turned_off"] >= 1
+
+def test_slices_run_regions_uncached():
+    code = compile_program(PROGRAM).get_code()
+    counts = []
+    for memoize in (False, True):
+        executer = Execute(code, jit_threshold=None, memoize=memoize, count_instructions=True)
+        slices = 0
+
+        def run():
+            nonlocal slices
+            while executer.run_for(100) == PAUSED:
+                slices += 1
+        assert output_of(run) == run_plain(PROGRAM)
+        counts.append((slices, executer.executed))
+    # every instruction of a region counts against the slice
+    assert counts[0] == counts[1]
+    assert executer.memo.stats()["hits"] == 0
@@ -0,0 +1,91 @@
+import pytest
+
+from executer.execution_error import ExecutionError
+from executer.partial import RESUME_LABEL, partial_evaluate
+from tests.support import compile_program, execute, run_plain
+
+PROGRAM = """procedure scale(v, by) is
+begin
+    return v * by;
+end
+procedure main is
+    var n = in();
+    var i = 0;
+    var s = 0;
+    var name = "total";
+    var a[5];
+begin
+    while i < 5 do
+        a[i] = scale(i, n);
+        i = i + 1;
+    end
+    print(name);
+    print(sum(a));
+    s = in();
+    while s > 0 do
+        print(scale(s, 2));
+        s = s - 1;
+    end
+    print(a[4] + s);
+end
+"""
+
+CONSTANT = """procedure main is
+    var i = 0;
+    var s = "";
+begin
+    while i < 4 do
+        s = s + "ab";
+        i = i + 1;
+    end
+    print(s);
+    print(i / 8);
+end
+"""
+
+
+def residual_of(source, bound, budget=None):
+    generator = compile_program(source)
+    options = {} if budget is None else {"budget": budget}
+    return partial_evaluate(generator.get_code(), generator.source_map(), bound, **options)
+
+def test_residual_prints_what_the_program_prints():
+    inputs = ["3", "4"]
+    expected = run_plain(PROGRAM, inputs)
+    for bound in range(len(inputs) + 1):
+        residual = residual_of(PROGRAM, inputs[:bound])
+        assert execute(residual.code, residual.source_map, inputs[bound:]) == expected, bound
+
+def test_program_without_input_compiles_to_its_output():
+    residual = residual_of(CONSTANT, [])
+    assert residual.stopped is None
+    assert residual.output == ["abababab", "0.5"]
+    assert execute(residual.code, residual.source_map) == run_plain(CONSTANT)
+
+def test_budget_leaves_the_rest_to_run():
+    expected = run_plain(CONSTANT)
+    for budget in (1, 3, 6):
+        residual = residual_of(CONSTANT, [], budget)
+        assert residual.stopped is not None
+        assert execute(residual.code, residual.source_map) == expected, budget
+
+def test_stop_inside_a_call_undoes_the_call():
+    inputs = ["3", "4"]
+    expected = run_plain(PROGRAM, inputs)
+    for budget in (10, 20, 30):
+        # the first in() is evaluated, the second one is left to run time
+        residual = residual_of(PROGRAM, inputs, budget)
+        assert residual.stopped.startswith("budget")
+        assert execute(residual.code, residual.source_map, inputs[1:]) == expected, budget
+
+def test_failure_is_left_to_run_time():
+    source = PROGRAM.replace("print(a[4] + s);", "print(a[4] / s);")
+    residual = residual_of(source, ["3", "4"])
+    assert residual.stopped.startswith("fails at run time")
+    with pytest.raises(ExecutionError):
+        execute(residual.code, residual.source_map)
+
+def test_no_jump_to_a_resume_label_that_comes_next():
+    residual = residual_of(PROGRAM, [])
+    assert f"JUMP {RESUME_LABEL}" not in residual.code
+    assert f"LABEL {RESUME_LABEL}" in residual.code
@@ -0,0 +1,67 @@
+import contextlib
+import io
+
+from executer.executer import Execute
+from executer.feedback import load, save
+from tests.support import compile_program, execute, run_plain
+
+# a hot call of a one-line procedure, a hot loop over a counter read from input
+# and a loop that hardly runs
+PROGRAM = """procedure scaled(v, k) is
+begin
+    return v * k + 1;
+end
+procedure main is
+    var i = in();
+    var j = 0;
+    var s = 0;
+begin
+    while i < 3000 do
+        s = s + scaled(i, 3);
+        i = i + 1;
+    end
+    while j < 2 do
+        s = s - j;
+        j = j + 1;
+    end
+    print(s);
+    print(i);
+end
+"""
+
+
+def recorded(source, inputs):
+    generator = compile_program(source)
+    executer = Execute(generator.get_code(), generator.source_map(), inputs=inputs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return executer.record_profile(source)
+
+def run_with_profile(source, profile, inputs):
+    generator = compile_program(source, profile=profile)
+    return execute(generator.get_code(), generator.source_map(), inputs), generator.get_code()
+
+
+def test_profiled_build_prints_what_the_plain_one_does():
+    profile = recorded(PROGRAM, ["0"])
+    # also for inputs other than the recorded one, a float failing the integer guard among them
+    for value in ("0", "17", "2999", "5000", "0.5"):
+        output, _ = run_with_profile(PROGRAM, profile, [value])
+        assert output == run_plain(PROGRAM, [value]), value
+
+def test_profile_changes_the_code():
+    profile = recorded(PROGRAM, ["0"])
+    _, code = run_with_profile(PROGRAM, profile, ["0"])
+    plain = compile_program(PROGRAM).get_code()
+    assert "CALL scaled" in plain and "CALL scaled" not in code  # inlined
+    assert "IS_INT" in code  # unrolled behind an integer guard
+
+def test_profile_round_trip_and_merge():
+    profile = recorded(PROGRAM, ["0"])
+    copy = load(save(profile))
+    assert copy.matches(PROGRAM) and not copy.matches(PROGRAM + "\n")
+    assert (copy.branches, copy.calls, copy.types) == (profile.branches, profile.calls, profile.types)
+    other = recorded(PROGRAM, ["1000"])
+    calls = sum(profile.calls.values()) + sum(other.calls.values())
+    profile.merge(other)
+    assert sum(profile.calls.values()) == calls
+    assert run_with_profile(PROGRAM, profile, ["7"])[0] == run_plain(PROGRAM, ["7"])
@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+import generator.stream
+import pipeline.pipelined
+from pipeline.pipelined import PipelinedRun, StageError
+from tests.support import output_of, run_plain
+
+PROGRAM = """procedure gcd(a, b) is
+begin
+    while b > 0 do
+        if a > b then
+            a = a - b;
+        else
+            b = b - a;
+        end
+    end
+    return a + b;
+end
+procedure main is
+    var i = 1;
+    var s = "";
+    var a[10];
+begin
+    while i < 10 do
+        a[i] = gcd(i * 6, 84);
+        s = s + "x";
+        i = i + 1;
+    end
+    print(sum(a));
+{statements}
+    print(s);
+end
+"""
+LINES = "\n".join(f"    print(gcd(a[{k % 9 + 1}], {k + 2}));" for k in range(60))
+SOURCE = PROGRAM.format(statements=LINES)
+
+
+@pytest.fixture(params=("small", "default"))
+def buffers(request, monkeypatch):
+    # tiny batches and channels make every stage wait for the others
+    if request.param == "small":
+        monkeypatch.setattr(pipeline.pipelined, "LEX_BATCH_LINES", 3)
+        monkeypatch.setattr(pipeline.pipelined, "TOKEN_BATCHES", 1)
+        monkeypatch.setattr(pipeline.pipelined, "STATEMENTS", 1)
+        monkeypatch.setattr(pipeline.pipelined, "CHUNKS", 1)
+        monkeypatch.setattr(generator.stream, "CHUNK_INSTRUCTIONS", 4)
+    return request.param
+
+def failure(source):
+    # (what was printed, the StageError)
+    run = PipelinedRun(source)
+    printed = []
+
+    def go():
+        with pytest.raises(StageError) as raised:
+            run.run()
+        printed.append(raised.value)
+    output = output_of(go)
+    return output, printed[0]
+
+
+def test_pipelined_run_prints_what_the_plain_one_does(buffers):
+    run = PipelinedRun(SOURCE)
+    assert output_of(run.run) == run_plain(SOURCE)
+    assert run.statement_count == 63
+    assert threading.active_count() == 1
+
+@pytest.mark.parametrize("stage, line", [("Lexical Analysis", "    i = i $ 1;"),
+                                         ("Parsing", "    i = i + ;"),
+                                         ("CodeGenerator", "    i = nope(1);"),
+                                         ("Execute", "    i = i / 0;")])
+def test_error_comes_after_the_output_before_it(buffers, stage, line):
+    for where in (1, 30, 60):
+        lines = LINES.splitlines()
+        source = PROGRAM.format(statements="\n".join(lines[:where] + [line] + lines[where:]))
+        expected = run_plain(PROGRAM.format(statements="\n".join(lines[:where])))
+        output, error = failure(source)
+        assert error.stage == stage
+        # everything up to the failing line, without the print(s) after it
+        assert output == "".join(expected.splitlines(True)[:-1]), where
+        assert threading.active_count() == 1
+
+def test_error_in_the_first_statement():
+    output, error = failure("procedure main is\n    var x = 1;\nbegin\n    print(x);\n    x = x + ;\nend\n")
+    assert error.stage == "Parsing" and output == "1\n"
+
+def test_imports_are_refused():
+    _, error = failure('import "lib.num";\n' + SOURCE)
+    assert error.stage == "Parsing" and "imports" in str(error.error)
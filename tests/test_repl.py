@@ -0,0 +1,72 @@
+import pytest
+
+from executer.execution_error import ExecutionError
+from pipeline.repl import Session
+from tests.support import output_of, run_plain
+
+ENTRIES = ["var x = 3;\nvar a[4];",
+           "procedure square(v) is\nbegin\n    return v * v;\nend",
+           "var s = \"\";\nvar i = 0;",
+           "while i < 4 do\n    a[i] = square(i + x);\n    s = s + \"ab\";\n    i = i + 1;\nend",
+           "print(sum(a));",
+           "procedure describe(v) is\nbegin\n    if v > 50 then\n        return \"big\";\n    end\n"
+           "    return \"small\";\nend\nprint(describe(a[3]));",
+           "x = x + square(2);\nprint(s);\nprint(x);"]
+# the same, as one program
+PROGRAM = """procedure square(v) is
+begin
+    return v * v;
+end
+procedure describe(v) is
+begin
+    if v > 50 then
+        return "big";
+    end
+    return "small";
+end
+procedure main is
+    var x = 3;
+    var a[4];
+    var s = "";
+    var i = 0;
+begin
+    while i < 4 do
+        a[i] = square(i + x);
+        s = s + "ab";
+        i = i + 1;
+    end
+    print(sum(a));
+    print(describe(a[3]));
+    x = x + square(2);
+    print(s);
+    print(x);
+end
+"""
+
+
+def enter_all(session, entries):
+    def run():
+        for entry in entries:
+            assert session.enter(entry) is not None
+    return output_of(run)
+
+
+def test_entries_print_what_the_program_does():
+    assert enter_all(Session(), ENTRIES) == run_plain(PROGRAM)
+
+def test_incomplete_entry_waits_for_more():
+    session = Session()
+    assert session.enter("var n = 2;\nif n > 1 then\n    print(n);") is None
+    assert output_of(lambda: session.enter("var n = 2;\nif n > 1 then\n    print(n);\nend")) == "2\n"
+
+def test_failed_entry_keeps_the_session():
+    session = Session()
+    enter_all(session, ENTRIES[:2])
+    with pytest.raises(ExecutionError):
+        output_of(lambda: session.enter("x = square(1) / 0;"))
+    session.enter("procedure boom(v) is\nbegin\n    return v / 0;\nend")
+    with pytest.raises(ExecutionError):
+        output_of(lambda: session.enter("x = boom(1);"))  # fails inside the call
+    with pytest.raises(ValueError):
+        session.enter(ENTRIES[1])  # square is already defined
+    assert enter_all(session, ENTRIES[2:]) == run_plain(PROGRAM)
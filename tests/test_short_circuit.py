@@ -0,0 +1,80 @@
+from itertools import product
+
+from tests.support import compile_program, run_plain
+
+# and and or have the same precedence and group to the left; not takes the rest of the condition
+CONDITIONS = (("a == 1 and b == 1", lambda a, b, c: a and b),
+              ("a == 1 or b == 1", lambda a, b, c: a or b),
+              ("a == 1 and b == 1 or c == 1", lambda a, b, c: (a and b) or c),
+              ("a == 1 or b == 1 and c == 1", lambda a, b, c: (a or b) and c),
+              ("not a == 1 and b == 1 or c == 1", lambda a, b, c: not ((a and b) or c)),
+              ("not a == 0 or b == 1 and c == 1", lambda a, b, c: not ((not a or b) and c)))
+
+PROGRAM = """procedure check(a, b, c) is
+begin
+    if {condition} then
+        return 1;
+    end
+    return 0;
+end
+procedure main is
+    var a = 0;
+    var b = 0;
+    var c = 0;
+    var r = 0;
+begin
+    while a < 2 do
+        b = 0;
+        while b < 2 do
+            c = 0;
+            while c < 2 do
+                r = check(a, b, c);
+                print(r);
+                c = c + 1;
+            end
+            b = b + 1;
+        end
+        a = a + 1;
+    end
+end
+"""
+
+SIDE_EFFECTS = """procedure noisy(v) is
+begin
+    print(v);
+    return v;
+end
+procedure main is
+    var x = 0;
+    var n = 0;
+begin
+    if x == 1 and noisy(10) == 10 then
+        print(1);
+    end
+    if x == 0 or noisy(20) == 20 then
+        print(2);
+    end
+    if x == 0 and noisy(30) == 30 then
+        print(3);
+    end
+    while n < 3 and noisy(n) < 2 do
+        n = n + 1;
+    end
+    print(n);
+end
+"""
+
+
+def test_conditions_follow_their_truth_table():
+    for condition, holds in CONDITIONS:
+        expected = "".join(f"{int(bool(holds(*values)))}\n" for values in product((0, 1), repeat=3))
+        assert run_plain(PROGRAM.format(condition=condition)) == expected, condition
+
+def test_right_operand_runs_only_when_the_left_does_not_decide():
+    # noisy(10) and noisy(20) are skipped; the loop stops at noisy(2)
+    assert run_plain(SIDE_EFFECTS) == "2\n30\n3\n0\n1\n2\n2\n"
+
+def test_conditions_branch_instead_of_computing_and_or():
+    code = compile_program(PROGRAM.format(condition=CONDITIONS[2][0])).get_code()
+    assert "JUMP_IF_TRUE" in code
+    assert "BINOP and" not in code and "BINOP or" not in code
@@ -0,0 +1,114 @@
+import pytest
+
+from executer.executer import DONE, PAUSED, WAITING_FOR_INPUT, Execute
+from executer.snapshot import run_checkpointed
+from tests.support import compile_program, execute, output_of
+
+# recursion, pure calls, arrays, a string built in place, a hot loop and input
+PROGRAM = """procedure fib(n) is
+begin
+    if n < 2 then
+        return n;
+    end
+    return fib(n - 1) + fib(n - 2);
+end
+procedure note(v) is
+begin
+    print(v);
+    return v;
+end
+procedure main is
+    var a[16];
+    var i = 0;
+    var s = "";
+    var t = 0;
+    var j = 0;
+    var k = in();
+begin
+    while i < 16 do
+        a[i] = fib(i) + note(i * k);
+        s = s + "ab";
+        i = i + 1;
+    end
+    while t < 300 do
+        a[j] = a[j] + t / 4;
+        j = j + 1;
+        if j == 16 then
+            j = 0;
+        end
+        t = t + 1;
+    end
+    print(s);
+    print(sum(a));
+    k = in();
+    print(fib(k));
+end
+"""
+INPUTS = ["3", "12"]
+
+
+def test_run_for_prints_what_run_does():
+    code = compile_program(PROGRAM).get_code()
+    expected = execute(code, inputs=INPUTS)
+    for size in (1, 7, 100, 5000):
+        executer = Execute(code, inputs=INPUTS)
+        assert output_of(lambda: _run_in_slices(executer, size)) == expected, size
+
+def _run_in_slices(executer, size):
+    while executer.run_for(size) == PAUSED:
+        pass
+
+def test_snapshot_round_trip_between_slices():
+    generator = compile_program(PROGRAM)
+    code = generator.get_code()
+    expected = execute(code, inputs=INPUTS)
+    for size in (11, 50, 997):
+        executer = Execute(code, generator.source_map(), inputs=INPUTS, count_instructions=True)
+
+        def run():
+            nonlocal executer
+            while executer.run_for(size) == PAUSED:
+                # every slice carries on in a new executer
+                restored = Execute(code, generator.source_map(), count_instructions=True)
+                restored.restore(executer.snapshot())
+                executer = restored
+        assert output_of(run) == expected, size
+        assert executer.executed > 0
+
+def test_waiting_for_input():
+    code = compile_program(PROGRAM).get_code()
+    def chained():
+        current = Execute(code, inputs=[])
+        for value in INPUTS:
+            assert current.run_for(10 ** 9) == WAITING_FOR_INPUT
+            current.provide_input(value)
+            restored = Execute(code)
+            restored.restore(current.snapshot())
+            current = restored
+        assert current.run_for(10 ** 9) == DONE
+    assert output_of(chained) == execute(code, inputs=INPUTS)
+
+def test_snapshot_of_another_program_is_refused():
+    executer = Execute(compile_program(PROGRAM).get_code(), inputs=INPUTS)
+    output_of(lambda: executer.run_for(100))
+    other = Execute(compile_program(PROGRAM.replace("300", "301")).get_code())
+    with pytest.raises(ValueError):
+        other.restore(executer.snapshot())
+    with pytest.raises(ValueError):
+        other.restore(b"not a snapshot")
+
+def test_checkpointed_run_resumes_from_its_file(tmp_path):
+    code = compile_program(PROGRAM).get_code()
+    path = str(tmp_path / "run.snapshot")
+    expected = execute(code, inputs=INPUTS)
+    first = Execute(code, inputs=INPUTS)
+    before = output_of(lambda: first.run_for(2000))
+    with open(path, "wb") as f:
+        f.write(first.snapshot())
+    # the process is gone; a new one resumes from the file
+    resumed = Execute(code)
+    with open(path, "rb") as f:
+        resumed.restore(f.read())
+    after = output_of(lambda: run_checkpointed(resumed, path, interval=500))
+    assert before + after == expected
+    assert not (tmp_path / "run.snapshot").exists()
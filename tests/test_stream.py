@@ -0,0 +1,82 @@
+import contextlib
+import io
+
+import pytest
+
+import generator.stream
+from executer.stream import StreamingExecute
+from generator.stream import StreamingGenerator, write_code
+from tests.support import execute, output_of, parse, run_plain
+
+PROGRAM = """procedure gcd(a, b) is
+begin
+    while b > 0 do
+        if a > b then
+            a = a - b;
+        else
+            b = b - a;
+        end
+    end
+    return a + b;
+end
+procedure main is
+    var i = 1;
+    var s = "";
+    var a[10];
+    var t = 0;
+begin
+    while i < 10 do
+        a[i] = gcd(i * 6, 84);
+        s = s + "x";
+        i = i + 1;
+    end
+    print(sum(a));
+    print(s);
+    t = in();
+    if t > 4 and a[3] == 6 then
+        print(t * 2);
+    end
+    i = 0;
+    while i < 200 do
+        t = t + i / 2;
+        i = i + 1;
+    end
+    print(t);
+    print(gcd(t, 6));
+    print(len(a));
+end
+"""
+INPUTS = ["5"]
+
+
+@pytest.fixture(params=(1, 5, 1000))
+def chunk_size(request, monkeypatch):
+    # small chunks split the main program between every statement or few
+    monkeypatch.setattr(generator.stream, "CHUNK_INSTRUCTIONS", request.param)
+    return request.param
+
+def streamed(source, inputs=None):
+    generator = StreamingGenerator()
+    return output_of(StreamingExecute(generator.chunks(parse(source)), inputs=inputs).run), generator
+
+
+def test_streamed_run_prints_what_the_plain_one_does(chunk_size):
+    output, generator = streamed(PROGRAM, INPUTS)
+    assert output == run_plain(PROGRAM, INPUTS)
+    if chunk_size == 1:
+        assert generator.chunks_emitted > 10  # one per statement
+
+def test_written_code_runs_like_the_stream(chunk_size):
+    file = io.StringIO()
+    written = write_code(StreamingGenerator().chunks(parse(PROGRAM)), file)
+    assert written == len(file.getvalue().splitlines())
+    assert execute(file.getvalue(), inputs=INPUTS) == run_plain(PROGRAM, INPUTS)
+
+def test_code_before_a_failing_statement_runs(chunk_size):
+    source = PROGRAM.replace("print(t);", "print(t);\n    t = nope(t);")
+    executer = StreamingExecute(StreamingGenerator().chunks(parse(source)), inputs=INPUTS)
+    output = io.StringIO()
+    with pytest.raises(ValueError, match="nope"), contextlib.redirect_stdout(output):
+        executer.run()
+    # everything up to the print(t) before it, without the last two lines
+    assert output.getvalue() == "".join(run_plain(PROGRAM, INPUTS).splitlines(True)[:-2])
@@ -0,0 +1,126 @@
+import pytest
+
+from tests.support import compile_program, execute
+
+FACTORS = (2, 3, 4, 8)
+
+PROGRAMS = {
+    "full unroll of a short inner loop": """
+procedure main is
+    var a[8];
+    var i = 0;
+    var r = 0;
+begin
+    while r < 30 do
+        i = 0;
+        while i < 8 do
+            a[i] = a[i] + i * r;
+            i = i + 1;
+        end
+        r = r + 1;
+    end
+    print(sum(a));
+    print(i);
+end
+""",
+    "remainder loop": """
+procedure main is
+    var i = 0;
+    var s = 0;
+begin
+    while i < 1003 do
+        s = s + i * i;
+        i = i + 1;
+    end
+    print(s);
+    print(i);
+end
+""",
+    "strided loop counting down in a procedure": """
+procedure total(n) is
+    var i = 0;
+    var s = 0;
+begin
+    i = n;
+    while i > 0 do
+        s = s + i;
+        i = i - 3;
+    end
+    return s * 1000 + i;
+end
+procedure main is
+    var k = 0;
+begin
+    while k < 12 do
+        print(total(k));
+        k = k + 1;
+    end
+end
+""",
+    "inclusive bound, loop never entered": """
+procedure main is
+    var i = 5;
+    var j = 9;
+    var s = "";
+begin
+    while i <= 20 do
+        s = s + "x";
+        i = i + 2;
+    end
+    while j < 3 do
+        s = s + "y";
+        j = j + 1;
+    end
+    print(s);
+    print(i);
+    print(j);
+end
+""",
+    "counter from input": """
+procedure main is
+    var i = in();
+    var s = 0;
+begin
+    while i < 50 do
+        s = s + i;
+        i = i + 1;
+    end
+    print(s);
+    print(i);
+end
+""",
+}
+INPUTS = ["7"]
+NOT_UNROLLED = {"counter from input"}  # not known to hold an integer without a profile
+
+
+def output(source, factor):
+    generator = compile_program(source, unroll_factor=factor)
+    return execute(generator.get_code(), generator.source_map(), list(INPUTS)), generator.get_code()
+
+
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_unrolled_loops_print_what_rolled_ones_do(name):
+    expected, rolled = output(PROGRAMS[name], 0)
+    for factor in FACTORS:
+        printed, code = output(PROGRAMS[name], factor)
+        assert printed == expected, factor
+        assert (code == rolled) == (name in NOT_UNROLLED), factor
+
+def test_constant_trip_count_loop_is_fully_unrolled():
+    source = """
+procedure main is
+    var a[4];
+    var i = 0;
+begin
+    while i < 4 do
+        a[i] = i * i;
+        i = i + 1;
+    end
+    print(a[3]);
+    print(i);
+end
+"""
+    printed, code = output(source, 4)
+    assert printed == output(source, 0)[0] == "9\n4\n"
+    assert "JUMP" not in code
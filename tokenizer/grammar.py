@@ -24,6 +24,8 @@ class Keyword(Enum):
     MAIN = "main"
     IS = "is"
     IN = "in"
+    RETURN = "return"
+    IMPORT = "import"
 
 class Operator(Enum):
     ASSIGN = '='
@@ -49,15 +51,22 @@ class Separator(Enum):
 class Parenthesis(Enum):
     LPAR = '('
     RPAR = ')'
+    LBRACKET = '['
+    RBRACKET = ']'
 
 class String_literal(Enum):
     STRING = '"'
 
 token_specification = {
-    TokenType.KEYWORD: set([kw.value for kw in Keyword]),
-    TokenType.OPERATOR: set([op.value for op in Operator]),
-    TokenType.SEPARATOR: set([sep.value for sep in Separator]),
-    TokenType.LPAR: {Parenthesis.LPAR.value},
-    TokenType.RPAR: {Parenthesis.RPAR.value},
+    TokenType.KEYWORD: {keyword.value for keyword in Keyword},
+    TokenType.OPERATOR: {operator.value for operator in Operator},
+    TokenType.SEPARATOR: {separator.value for separator in Separator},
+    TokenType.LPAR: {Parenthesis.LPAR.value, Parenthesis.LBRACKET.value},
+    TokenType.RPAR: {Parenthesis.RPAR.value, Parenthesis.RBRACKET.value},
     TokenType.STRING: {String_literal.STRING.value}
-}
\ No newline at end of file
+}
+
+# non-alphabetic operators, longest first so that e.g. '<=' wins over '<'
+sorted_operators = sorted((operator.value for operator in Operator if not operator.value.isalpha()),
+                          key=len, reverse=True)
+symbols = token_specification[TokenType.SEPARATOR] | token_specification[TokenType.LPAR] | token_specification[TokenType.RPAR]
@@ -0,0 +1,85 @@
+"""
+Lexing of large sources across a process pool.
+
+No token spans lines, so the lines of a source can be scanned in any order.
+scan_parallel splits them into one contiguous range per worker and every
+worker scans its range with Lexer.scan_line. Tokens cross the process boundary
+as a compact buffer instead of pickled Token objects:
+
+    types   bytes, the TokenType value of every token
+    values  the token texts joined by newlines (no token contains one)
+    lines   (absolute line number, tokens on that line) for every line with tokens
+
+The parent decodes the buffers in range order, so the tokens come out in the
+order Lexer.scan gives them. A shard stops at its first error and reports it
+with the tokens before it; the first shard, in line order, with an error
+raises it, which is the error the serial scan would have raised.
+"""
+import gc
+from .grammar import TokenType
+from .token import Token
+
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024  # smaller sources are scanned faster than a pool starts
+TYPES = {token_type.value: token_type for token_type in TokenType}
+
+
+def scan_shard(text, first_line):
+    # worker: scans the newline-joined lines of a range starting at line first_line
+    from .scanner import Lexer
+    lexer = Lexer()
+    types = bytearray()
+    values = []
+    lines = []
+    error = None
+    for line_num, line in enumerate(text.split("\n"), first_line):
+        try:
+            tokens = lexer.scan_line(line, line_num)
+        except ValueError as e:
+            error = str(e)
+            break
+        if tokens:
+            types.extend(token.type.value for token in tokens)
+            values.extend(token.value for token in tokens)
+            lines.append((line_num, len(tokens)))
+    return bytes(types), "\n".join(values), lines, error
+
+def decode(buffer, tokens):
+    # appends the tokens of a shard's buffer to tokens
+    types, values, lines, _ = buffer
+    if not types:
+        return
+    line_nums = []
+    for line_num, count in lines:
+        line_nums.extend([str(line_num)] * count)
+    tokens.extend(map(Token, [TYPES[value] for value in types], values.split("\n"), line_nums))
+
+def scan_parallel(code, workers):
+    # the tokens of code, scanned in workers processes
+    lines = code.splitlines()
+    bounds = [len(lines) * worker // workers for worker in range(workers + 1)]
+    shards = [("\n".join(lines[bounds[i]:bounds[i + 1]]), bounds[i] + 1)
+              for i in range(workers) if bounds[i] < bounds[i + 1]]
+    del lines
+    if not shards:
+        return []
+
+    # imported here: concurrent.futures takes longer to load than a small source takes to scan
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(len(shards)) as pool:
+        futures = [pool.submit(scan_shard, text, first_line) for text, first_line in shards]
+        del shards
+        tokens = []
+        # millions of new tokens, none of them in a cycle, would make the collector
+        # run over and over: it is paused while they are created
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            for future in futures:
+                buffer = future.result()
+                if buffer[3] is not None:
+                    raise ValueError(buffer[3])
+                decode(buffer, tokens)
+        finally:
+            if collecting:
+                gc.enable()
+    return tokens
@@ -1,106 +1,113 @@
+import os
 from .grammar import *
 from .token import Token
 
 class Lexer:
-    def __init__(self):
-        pass
+    def __init__(self, workers=None):
+        # processes large sources are scanned in (see tokenizer/parallel.py), default one per CPU
+        self.workers = workers or os.cpu_count() or 1
 
     def scan(self, code):
         print("scanner start...")
+        from .parallel import PARALLEL_MIN_BYTES
+        if self.workers > 1 and len(code) >= PARALLEL_MIN_BYTES:
+            from .parallel import scan_parallel
+            tokens = scan_parallel(code, self.workers)
+        else:
+            tokens = []
+            for line_num, line in enumerate(code.splitlines()):
+                tokens.extend(self.scan_line(line, line_num + 1))
+        print("scanner end")
+        return tokens
+
+    def scan_line(self, line, line_num):
+        # no token spans lines, so every line can be scanned on its own
         tokens = []
+        line_num = str(line_num)
+        input_string = line.strip()
+        i = 0
+        while i < len(input_string):
+            c = input_string[i]
+            start = i
 
-        sorted_operators = sorted([op for op in token_specification[TokenType.OPERATOR] if not op.isalpha()],
-                        key=lambda x: -len(x))
-        symbols = token_specification[TokenType.SEPARATOR] | token_specification[TokenType.LPAR] | \
-                    token_specification[TokenType.RPAR]
-        
-        for line_num, line in enumerate(code.splitlines()):
-            line_num = str(int(line_num) + 1)
-            input_string = line.strip()
-            i = 0
-            while i < len(input_string):
-                c = input_string[i]
-                start = i
+            # ignore whitespace
+            if c.isspace():
+                i += 1
+                continue
 
-                # ignore whitespace
-                if c.isspace():
+            # keyword or identifier or operator (and, not, or) state
+            elif c.isalpha():
+                word = ""
+                while i < len(input_string) and (input_string[i].isalnum() or input_string[i] == '_'):
+                    word += input_string[i]
                     i += 1
-                    continue
 
-                # keyword or identifier or operator (and, not, or) state
-                elif c.isalpha():
-                    word = ""
-                    while i < len(input_string) and (input_string[i].isalnum() or input_string[i] == '_'):
+                if word in token_specification[TokenType.KEYWORD]:
+                    tokens.append(Token(TokenType.KEYWORD, word, line_num))
+                elif word in token_specification[TokenType.OPERATOR]:
+                    tokens.append(Token(TokenType.OPERATOR, word, line_num))
+                else:
+                    tokens.append(Token(TokenType.IDENTIFIER, word, line_num))
+
+            # String literal state
+            elif c in token_specification[TokenType.STRING]:
+                if c == '"':
+                    word = '"'
+                    i += 1 
+                    start = i
+                    
+                    while i < len(input_string) and input_string[i] != '"':
                         word += input_string[i]
                         i += 1
+                    
+                    if i >= len(input_string) or input_string[i] != '"':
+                        raise ValueError(f"Unterminated string literal at line {line_num} position {start}")
+                    
+                    word += '"'
+                    
+                    i += 1
+                    tokens.append(Token(TokenType.STRING, word, line_num))
 
-                    if word in token_specification[TokenType.KEYWORD]:
-                        tokens.append(Token(TokenType.KEYWORD, word, line_num))
-                    elif word in token_specification[TokenType.OPERATOR]:
-                        tokens.append(Token(TokenType.OPERATOR, word, line_num))
-                    else:
-                        tokens.append(Token(TokenType.IDENTIFIER, word, line_num))
 
-                # String literal state
-                elif c in token_specification[TokenType.STRING]:
-                    if c == '"':
-                        word = '"'
-                        i += 1 
-                        start = i
-                        
-                        while i < len(input_string) and input_string[i] != '"':
-                            word += input_string[i]
-                            i += 1
-                        
-                        if i >= len(input_string) or input_string[i] != '"':
-                            raise ValueError(f"Unterminated string literal at line {line_num} position {start}")
-                        
-                        word += '"'
-                        
-                        i += 1
-                        tokens.append(Token(TokenType.STRING, word, line_num))
+            # operator (everything other than and, or, not) state
+            elif c in token_specification[TokenType.OPERATOR]:
+                for op in sorted_operators:
+                    if input_string.startswith(op, i):
+                        tokens.append(Token(TokenType.OPERATOR, op, line_num))
+                        i += len(op)
+                        break
 
+            # symbol (separator, lpar and rpar) state
+            elif c in symbols:
+                if c in token_specification[TokenType.SEPARATOR]:
+                    tokens.append(Token(TokenType.SEPARATOR, c, line_num))
+                elif c in token_specification[TokenType.LPAR]:
+                    tokens.append(Token(TokenType.LPAR, c, line_num))
+                else:
+                    tokens.append(Token(TokenType.RPAR, c, line_num))
+                i += 1
 
-                # operator (everything other than and, or, not) state
-                elif c in token_specification[TokenType.OPERATOR]:
-                    for op in sorted_operators:
-                        if input_string.startswith(op, i):
-                            tokens.append(Token(TokenType.OPERATOR, op, line_num))
-                            i += len(op)
-                            break
-
-                # symbol (separator, lpar and rpar) state
-                elif c in symbols:
-                    if c in token_specification[TokenType.SEPARATOR]:
-                        tokens.append(Token(TokenType.SEPARATOR, c, line_num))
-                    elif c in token_specification[TokenType.LPAR]:
-                        tokens.append(Token(TokenType.LPAR, c, line_num))
-                    else:
-                        tokens.append(Token(TokenType.RPAR, c, line_num))
+            # number state
+            elif c.isdigit():
+                num = ''
+                seen_dot = False
+                while i < len(input_string) and (input_string[i].isdigit() or
+                                                (input_string[i] == '.' and not seen_dot)):
+                    if input_string[i] == '.':
+                        seen_dot = True
+                    num += input_string[i]
                     i += 1
 
-                # number state
-                elif c.isdigit():
-                    num = ''
-                    seen_dot = False
-                    while i < len(input_string) and (input_string[i].isdigit() or
-                                                    (input_string[i] == '.' and not seen_dot)):
-                        if input_string[i] == '.':
-                            seen_dot = True
-                        num += input_string[i]
+                # check for invalid identifier starting with a digit
+                if i < len(input_string) and (input_string[i].isalpha() or input_string[i] == '_'):
+                    while i < len(input_string) and (input_string[i].isalnum() or input_string[i] == '_'):
                         i += 1
+                    invalid_identifier = input_string[start:i]
+                    raise ValueError(f"Invalid identifier starting with digit: '{invalid_identifier}' "
+                                    f"at line {line_num} position {start}")
+                tokens.append(Token(TokenType.NUMBER, num, line_num))
 
-                    # check for invalid identifier starting with a digit
-                    if i < len(input_string) and (input_string[i].isalpha() or input_string[i] == '_'):
-                        while i < len(input_string) and (input_string[i].isalnum() or input_string[i] == '_'):
-                            i += 1
-                        invalid_identifier = input_string[start:i]
-                        raise ValueError(f"Invalid identifier starting with digit: '{invalid_identifier}' "
-                                        f"at line {line_num} position {start}")
-                    tokens.append(Token(TokenType.NUMBER, num, line_num))
-
-                # error state
-                else:
-                    raise ValueError(f"Unrecognized character at line {line_num}, position {i}: {c}")
-        print("scanner end")
+            # error state
+            else:
+                raise ValueError(f"Unrecognized character at line {line_num}, position {i}: {c}")
         return tokens
\ No newline at end of file